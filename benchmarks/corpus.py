@@ -0,0 +1,150 @@
+"""
+Генератор синтетического корпуса для бенчмарков
+
+Создает каталог со случайными файлами заданного размера, базу сигнатур и
+описание корпуса corpus.json. В файлы вставляются вхождения первой
+сигнатуры базы с заданной плотностью (вхождений на МиБ), чтобы бенчмарки
+измеряли не только поиск без совпадений, но и сбор офсетов.
+
+Пример:
+    python benchmarks/corpus.py --output-dir ./corpus --files 64 --file-size 1048576 --hits-per-mb 4
+"""
+import argparse
+import json
+import os
+import random
+from typing import Any, Dict, List
+
+CORPUS_DESCRIPTION = "corpus.json"
+SIGNATURES_FILE = "signatures.json"
+# Сигнатура с масками, совпадающая с вставляемой в файлы
+HIT_SIGNATURE_ID = "hit"
+MASKED_SIGNATURE_ID = "hit_masked"
+
+def parse_sizes(value: str) -> List[int]:
+    """Разбирает список размеров через запятую с суффиксами K/M/G"""
+    multipliers = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    sizes = []
+    for item in value.split(","):
+        item = item.strip().upper()
+        multiplier = multipliers.get(item[-1:], 1)
+        sizes.append(int(item.rstrip("KMG")) * multiplier)
+    return sizes
+
+def make_signatures(rng: random.Random, count: int) -> Dict[str, str]:
+    """
+    Создает базу сигнатур: сигнатуру вхождений, ее вариант с масками и
+    count случайных сигнатур длиной 8-32 байта
+    """
+    hit = rng.randbytes(16)
+    # Вариант с масками: средние байты заменены на ?? и пропуск
+    masked = f"{hit[:6].hex()} ?? [2-4] {hit[10:].hex()}"
+    signatures = {HIT_SIGNATURE_ID: hit.hex(), MASKED_SIGNATURE_ID: masked}
+    for index in range(count):
+        signatures[f"sig{index}"] = rng.randbytes(rng.randint(8, 32)).hex()
+    return signatures
+
+def write_file(path: str, size: int, hit: bytes, hits_per_mb: float, rng: random.Random) -> List[int]:
+    """
+    Записывает случайный файл со вставленными вхождениями hit
+
+    Returns:
+        List[int]: Офсеты вставленных вхождений
+    """
+    data = bytearray(rng.randbytes(size))
+    count = int(size / (1024 * 1024) * hits_per_mb + rng.random()) if size >= len(hit) else 0
+    offsets = sorted(rng.sample(range(0, size - len(hit) + 1), min(count, size - len(hit) + 1))) if count else []
+    placed = []
+    for offset in offsets:
+        # Вхождения не перекрываются, чтобы ожидаемый результат был однозначным
+        if placed and offset < placed[-1] + len(hit):
+            continue
+        data[offset:offset + len(hit)] = hit
+        placed.append(offset)
+    with open(path, "wb") as file:
+        file.write(data)
+    return placed
+
+def generate_corpus(
+    directory: str,
+    files: int,
+    sizes: List[int],
+    hits_per_mb: float = 1.0,
+    signatures: int = 100,
+    seed: int = 1
+) -> Dict[str, Any]:
+    """
+    Создает корпус в каталоге directory
+
+    Args:
+        directory (str): Каталог корпуса (создается при необходимости)
+        files (int): Число файлов каждого размера
+        sizes (List[int]): Размеры файлов в байтах
+        hits_per_mb (float): Среднее число вхождений сигнатуры hit на МиБ
+        signatures (int): Число случайных сигнатур в базе
+        seed (int): Начальное значение генератора случайных чисел
+
+    Returns:
+        Dict[str, Any]: Описание корпуса (оно же записывается в corpus.json)
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    signature_map = make_signatures(rng, signatures)
+    database_path = os.path.join(directory, SIGNATURES_FILE)
+    with open(database_path, "w") as file:
+        json.dump({"signatures": signature_map}, file)
+
+    hit = bytes.fromhex(signature_map[HIT_SIGNATURE_ID])
+    entries = []
+    for size in sizes:
+        for index in range(files):
+            path = os.path.join(directory, f"file_{size}_{index}.bin")
+            offsets = write_file(path, size, hit, hits_per_mb, rng)
+            entries.append({"path": os.path.abspath(path), "size": size, "hits": offsets})
+
+    description = {
+        "parameters": {
+            "files": files,
+            "sizes": sizes,
+            "hits_per_mb": hits_per_mb,
+            "signatures": signatures,
+            "seed": seed
+        },
+        "signatures_path": os.path.abspath(database_path),
+        "hit_signature": signature_map[HIT_SIGNATURE_ID],
+        "masked_signature": signature_map[MASKED_SIGNATURE_ID],
+        "files": entries
+    }
+    with open(os.path.join(directory, CORPUS_DESCRIPTION), "w") as file:
+        json.dump(description, file, indent=2)
+    return description
+
+def add_corpus_arguments(parser: argparse.ArgumentParser) -> None:
+    """Добавляет параметры корпуса в парсер аргументов бенчмарка"""
+    parser.add_argument('--files', type=int, default=8, help='Number of files of each size')
+    parser.add_argument('--sizes', type=parse_sizes, default=parse_sizes("64K,1M,16M"),
+                        help='Comma-separated file sizes, K/M/G suffixes allowed')
+    parser.add_argument('--hits-per-mb', type=float, default=1.0,
+                        help='Average number of planted signature hits per MiB')
+    parser.add_argument('--signatures', type=int, default=100, help='Number of random signatures in the database')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the corpus')
+
+def corpus_from_arguments(directory: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Создает корпус по параметрам, добавленным add_corpus_arguments"""
+    return generate_corpus(directory, args.files, args.sizes, args.hits_per_mb, args.signatures, args.seed)
+
+def main() -> None:
+    """Главная функция генератора"""
+    parser = argparse.ArgumentParser(description='Synthetic corpus generator')
+    parser.add_argument('--output-dir', type=str, required=True, help='Directory to write the corpus to')
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    description = corpus_from_arguments(args.output_dir, args)
+    total = sum(entry["size"] for entry in description["files"])
+    hits = sum(len(entry["hits"]) for entry in description["files"])
+    print(f"Wrote {len(description['files'])} files ({total / (1024 * 1024):.1f} MiB, {hits} hits) to {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Микробенчмарк движков проверки сигнатур
+
+Измеряет пропускную способность (МБ/с) SignatureChecker на синтетическом
+корпусе отдельно для каждого размера файла и движка:
+    chunked - одна сигнатура, чтение блоками;
+    mmap    - одна сигнатура, отображение файла в память;
+    masked  - сигнатура с масками;
+    multi   - все сигнатуры базы за один проход (find по каждой сигнатуре
+              или автомат Ахо-Корасик для больших наборов);
+    first   - одна сигнатура с first_only (ранняя остановка).
+Кэш результатов отключен, каждый замер - лучший из --repeats проходов.
+Найденные вхождения сверяются с вставленными в корпус.
+
+Пример:
+    python benchmarks/engine_bench.py --sizes 1M,64M --files 4 --output engines.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from corpus import add_corpus_arguments, corpus_from_arguments, HIT_SIGNATURE_ID
+from server.signature_checker import ScanOptions, SignatureChecker, parse_signature
+from server.signature_db import ALL_SIGNATURES_SET, SignatureDatabase
+
+ENGINES = ("chunked", "mmap", "masked", "multi", "first")
+
+def parse_arguments() -> argparse.Namespace:
+    """Парсит аргументы командной строки"""
+    parser = argparse.ArgumentParser(description='Signature scan engine benchmark')
+    add_corpus_arguments(parser)
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=list(ENGINES), help='Engines to measure')
+    parser.add_argument('--repeats', type=int, default=3, help='Number of passes per measurement (best is kept)')
+    parser.add_argument('--chunk-size', type=int, default=None, help='Read chunk size for the chunked engines')
+    parser.add_argument('--output', type=str, default=None, help='Write results as JSON to this file')
+    return parser.parse_args()
+
+def make_scanners(corpus: Dict[str, Any], chunk_size) -> Dict[str, Callable[[str], dict]]:
+    """Создает функции проверки одного файла для каждого движка"""
+    kwargs = {"chunk_size": chunk_size} if chunk_size else {}
+    # Отрицательный порог отключает mmap, нулевой включает его для всех файлов
+    chunked = SignatureChecker(mmap_threshold=-1, **kwargs)
+    mapped = SignatureChecker(mmap_threshold=0)
+    hit = parse_signature(corpus["hit_signature"])
+    masked = parse_signature(corpus["masked_signature"])
+    matcher = SignatureDatabase(corpus["signatures_path"]).index.get_matcher(ALL_SIGNATURES_SET)
+    first_only = ScanOptions(max_offsets=1)
+
+    return {
+        "chunked": lambda path: chunked.check_file_signature(path, hit),
+        "mmap": lambda path: mapped.check_file_signature(path, hit),
+        "masked": lambda path: chunked.check_file_signature(path, masked),
+        "multi": lambda path: chunked.check_file_signatures(path, matcher),
+        "first": lambda path: chunked.check_file_signature(path, hit, first_only)
+    }
+
+def expected_offsets(engine: str, hits: List[int]) -> Any:
+    """Возвращает ожидаемые офсеты вхождения hit для движка"""
+    if engine == "first":
+        hits = hits[:1]
+    return hits or "not found"
+
+def verify(engine: str, result: dict, hits: List[int], path: str) -> None:
+    """Сверяет результат проверки с вставленными вхождениями"""
+    if "error" in result:
+        raise RuntimeError(f"{engine}: {path}: {result['error']}")
+    offsets = result["offsets"]
+    if engine == "multi":
+        offsets = offsets.get(HIT_SIGNATURE_ID, "not found") if isinstance(offsets, dict) else offsets
+    if offsets != expected_offsets(engine, hits):
+        raise RuntimeError(f"{engine}: {path}: unexpected offsets {str(offsets)[:200]}")
+
+def measure(engine: str, scan: Callable[[str], dict], entries: List[dict], repeats: int) -> Dict[str, Any]:
+    """Измеряет пропускную способность движка на файлах одного размера"""
+    total_bytes = sum(entry["size"] for entry in entries)
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        results = [scan(entry["path"]) for entry in entries]
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+        for entry, result in zip(entries, results):
+            verify(engine, result, entry["hits"], entry["path"])
+
+    return {
+        "engine": engine,
+        "file_size": entries[0]["size"],
+        "files": len(entries),
+        "seconds": best,
+        "mb_per_second": total_bytes / best / (1024 * 1024) if best else 0.0,
+        "files_per_second": len(entries) / best if best else 0.0
+    }
+
+def main() -> None:
+    """Главная функция бенчмарка"""
+    args = parse_arguments()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = corpus_from_arguments(directory, args)
+        scanners = make_scanners(corpus, args.chunk_size)
+        for size in args.sizes:
+            entries = [entry for entry in corpus["files"] if entry["size"] == size]
+            for engine in args.engines:
+                result = measure(engine, scanners[engine], entries, args.repeats)
+                results.append(result)
+                print(f"{engine:>8} size={size:<10} {result['mb_per_second']:9.2f} MB/s "
+                      f"{result['files_per_second']:9.1f} files/s")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"benchmark": "engines", "parameters": vars(args), "results": results}, file, indent=2)
+
+if __name__ == "__main__":
+    main()
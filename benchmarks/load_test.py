@@ -0,0 +1,250 @@
+"""
+Нагрузочный тест сервера
+
+Запускает сервер (python -m server.app) на localhost для каждого сочетания
+режима ввода-вывода (--io-modes) и числа рабочих потоков (--threads),
+нагружает его --clients параллельными клиентами в течение --duration
+секунд и измеряет пропускную способность и задержки (p50/p90/p99) для
+каждого режима соединения:
+    single     - новое соединение на каждый запрос, запрос без кадрирования;
+    persistent - постоянное соединение, следующий запрос после ответа;
+    pipelined  - постоянное соединение, по --pipeline-depth запросов без
+                 ожидания ответов (задержка считается от отправки пачки).
+Клиенты работают потоками в процессе бенчмарка, поэтому при большом числе
+клиентов предел может определяться самим генератором нагрузки; для оценки
+сравнивайте прогоны с одинаковыми параметрами.
+
+Пример:
+    python benchmarks/load_test.py --threads 1 4 8 --clients 16 --duration 5 --output load.json
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from client import Connection, read_message, read_until_closed, write_message
+from corpus import add_corpus_arguments, corpus_from_arguments
+
+CONNECTION_MODES = ("single", "persistent", "pipelined")
+IO_MODES = ("threads", "asyncio")
+COMMANDS = ("CheckLocalFile", "CheckLocalFileMulti")
+
+def parse_arguments() -> argparse.Namespace:
+    """Парсит аргументы командной строки"""
+    parser = argparse.ArgumentParser(description='Server load test')
+    add_corpus_arguments(parser)
+    parser.set_defaults(files=32, sizes=[64 * 1024])
+    parser.add_argument('--threads', nargs='+', type=int, default=[1, 4, 8], help='Server thread counts to measure')
+    parser.add_argument('--io-modes', nargs='+', choices=IO_MODES, default=[IO_MODES[0]],
+                        help='Server --io-mode values to measure')
+    parser.add_argument('--connection-modes', nargs='+', choices=CONNECTION_MODES, default=list(CONNECTION_MODES),
+                        help='Client connection modes to measure')
+    parser.add_argument('--command', choices=COMMANDS, default=COMMANDS[0],
+                        help='Request to send: one signature or the whole signature database')
+    parser.add_argument('--clients', type=int, default=16, help='Number of concurrent clients')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds to run each measurement')
+    parser.add_argument('--pipeline-depth', type=int, default=8, help='Requests in flight per pipelined connection')
+    parser.add_argument('--port', type=int, default=18888, help='Port for the server under test')
+    parser.add_argument('--cache', action='store_true',
+                        help='Keep the server result cache enabled (by default every request scans the file)')
+    parser.add_argument('--server-args', nargs=argparse.REMAINDER, default=[],
+                        help='Extra arguments for server.app (must be last)')
+    parser.add_argument('--output', type=str, default=None, help='Write results as JSON to this file')
+    return parser.parse_args()
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Возвращает квантиль отсортированного списка (ближайший ранг)"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class ServerProcess:
+    """Сервер, запущенный отдельным процессом на время одного замера"""
+
+    def __init__(self, args: argparse.Namespace, corpus: Dict[str, Any], io_mode: str, threads: int, directory: str) -> None:
+        self.port = args.port
+        command = [
+            sys.executable, "-m", "server.app",
+            "--port", str(args.port),
+            "--threads", str(threads),
+            "--io-mode", io_mode,
+            "--signatures", corpus["signatures_path"],
+            "--quarantine", os.path.join(directory, "quarantine"),
+            # Очередь вмещает всех клиентов: отказы из-за перегрузки не должны искажать задержки
+            "--queue-size", str(max(128, args.clients * args.pipeline_depth)),
+            "--quiet"
+        ]
+        if not args.cache:
+            command += ["--cache-entries", "0"]
+        self.process = subprocess.Popen(command + args.server_args, cwd=os.path.join(ROOT, "src"))
+
+    def wait_ready(self, timeout: float = 10.0) -> None:
+        """Ожидает, пока сервер начнет принимать соединения"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {self.process.returncode}")
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.5).close()
+                return
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError("Server did not start in time")
+
+    def stop(self) -> None:
+        """Останавливает сервер сигналом SIGINT"""
+        if self.process.poll() is None:
+            self.process.send_signal(signal.SIGINT)
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+class ClientStats:
+    """Результаты одного клиента"""
+
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.busy = 0
+        self.scanned_bytes = 0
+
+    def record(self, response: dict, latency: float, size: int) -> None:
+        if response.get("busy"):
+            self.busy += 1
+        elif "error" in response:
+            self.errors += 1
+        else:
+            self.latencies.append(latency)
+            self.scanned_bytes += size
+
+def make_requests(corpus: Dict[str, Any], command: str) -> List[tuple]:
+    """Создает запросы к файлам корпуса: (команда, параметры, размер файла)"""
+    requests = []
+    for entry in corpus["files"]:
+        if command == "CheckLocalFile":
+            params = {"file_path": entry["path"], "signature": corpus["hit_signature"]}
+        else:
+            params = {"file_path": entry["path"]}
+        requests.append((command, params, entry["size"]))
+    return requests
+
+def run_client(mode: str, port: int, requests: List[tuple], offset: int, deadline: float,
+               depth: int, stats: ClientStats) -> None:
+    """Отправляет запросы до истечения срока и собирает задержки"""
+    index = offset
+    connection = None if mode == "single" else Connection(port=port)
+    try:
+        while time.perf_counter() < deadline:
+            if mode == "single":
+                command, params, size = requests[index % len(requests)]
+                index += 1
+                started = time.perf_counter()
+                with socket.create_connection(("127.0.0.1", port)) as sock:
+                    sock.sendall(json.dumps({command: params}).encode('utf-8'))
+                    response = json.loads(read_until_closed(sock).decode('utf-8'))
+                stats.record(response, time.perf_counter() - started, size)
+            elif mode == "persistent":
+                command, params, size = requests[index % len(requests)]
+                index += 1
+                started = time.perf_counter()
+                response = connection.request(command, params)
+                stats.record(response, time.perf_counter() - started, size)
+            else:
+                batch = [requests[(index + i) % len(requests)] for i in range(depth)]
+                index += depth
+                started = time.perf_counter()
+                # Запросы малы и помещаются в буфер сокета, поэтому пачку
+                # можно отправить целиком до чтения ответов
+                for command, params, _ in batch:
+                    write_message(connection.sock, json.dumps({command: params}).encode('utf-8'))
+                for _, _, size in batch:
+                    response = json.loads(read_message(connection.sock).decode('utf-8'))
+                    stats.record(response, time.perf_counter() - started, size)
+    finally:
+        if connection is not None:
+            connection.close()
+
+def measure(args: argparse.Namespace, requests: List[tuple], mode: str) -> Dict[str, Any]:
+    """Нагружает запущенный сервер в одном режиме соединения"""
+    clients = [ClientStats() for _ in range(args.clients)]
+    errors: List[BaseException] = []
+    started = time.perf_counter()
+    deadline = started + args.duration
+
+    def target(number: int) -> None:
+        try:
+            run_client(mode, args.port, requests, number * 7, deadline, args.pipeline_depth, clients[number])
+        except (OSError, ValueError) as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=target, args=(number,), daemon=True) for number in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        raise RuntimeError(f"Client failed: {errors[0]}")
+
+    latencies = sorted(latency for client in clients for latency in client.latencies)
+    scanned = sum(client.scanned_bytes for client in clients)
+    return {
+        "connection_mode": mode,
+        "requests": len(latencies),
+        "errors": sum(client.errors for client in clients),
+        "busy": sum(client.busy for client in clients),
+        "seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed,
+        "mb_per_second": scanned / elapsed / (1024 * 1024),
+        "latency_ms": {
+            "p50": percentile(latencies, 0.5) * 1000,
+            "p90": percentile(latencies, 0.9) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "max": (latencies[-1] if latencies else 0.0) * 1000
+        }
+    }
+
+def main() -> None:
+    """Главная функция нагрузочного теста"""
+    args = parse_arguments()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = corpus_from_arguments(directory, args)
+        requests = make_requests(corpus, args.command)
+        for io_mode in args.io_modes:
+            for threads in args.threads:
+                server = ServerProcess(args, corpus, io_mode, threads, directory)
+                try:
+                    server.wait_ready()
+                    for mode in args.connection_modes:
+                        result = measure(args, requests, mode)
+                        result.update({"io_mode": io_mode, "threads": threads, "clients": args.clients})
+                        results.append(result)
+                        latency = result["latency_ms"]
+                        print(f"{io_mode:>8} threads={threads:<3} {mode:>10} "
+                              f"{result['requests_per_second']:9.1f} req/s "
+                              f"p50={latency['p50']:7.2f}ms p99={latency['p99']:7.2f}ms "
+                              f"errors={result['errors']} busy={result['busy']}")
+                finally:
+                    server.stop()
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"benchmark": "load", "parameters": vars(args), "results": results}, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Бенчмарк масштабирования проверки сигнатур по числу исполнителей
+
+Сравнивает пропускную способность (МБ/с) сканирования набором сигнатур
+из базы в пуле потоков (--workers-mode threads) и в пуле процессов
+(--workers-mode processes) при числе исполнителей от 1 до числа ядер.
+
+Пример:
+    python benchmarks/scan_scaling.py --files 32 --file-size 4194304 --output scaling.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from server.scan_pool import ProcessSignatureChecker, WORKERS_MODE_PROCESSES, WORKERS_MODE_THREADS
+from server.signature_checker import SignatureChecker
+from server.signature_db import ALL_SIGNATURES_SET, SignatureDatabase
+
+def parse_arguments() -> argparse.Namespace:
+    """Парсит аргументы командной строки"""
+    parser = argparse.ArgumentParser(description='Signature scan scaling benchmark')
+    parser.add_argument('--files', type=int, default=16, help='Number of files in the corpus')
+    parser.add_argument('--file-size', type=int, default=2 * 1024 * 1024, help='Size of each file in bytes')
+    parser.add_argument('--signatures', type=int, default=200, help='Number of signatures in the database')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1,
+                        help='Largest number of workers to measure')
+    parser.add_argument('--modes', nargs='+', choices=[WORKERS_MODE_THREADS, WORKERS_MODE_PROCESSES],
+                        default=[WORKERS_MODE_THREADS, WORKERS_MODE_PROCESSES], help='Backends to measure')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the corpus')
+    parser.add_argument('--output', type=str, default=None, help='Write results as JSON to this file')
+    return parser.parse_args()
+
+def create_corpus(directory: str, args: argparse.Namespace) -> tuple[list[str], str]:
+    """Создает файлы корпуса и базу сигнатур"""
+    rng = random.Random(args.seed)
+    paths = []
+    for index in range(args.files):
+        path = os.path.join(directory, f"file_{index}.bin")
+        with open(path, "wb") as file:
+            file.write(rng.randbytes(args.file_size))
+        paths.append(path)
+
+    signatures = {f"sig{index}": rng.randbytes(rng.randint(8, 32)).hex() for index in range(args.signatures)}
+    database_path = os.path.join(directory, "signatures.json")
+    with open(database_path, "w") as file:
+        json.dump({"signatures": signatures}, file)
+    return paths, database_path
+
+def run_scan(checker: SignatureChecker, matcher, paths: list[str], workers: int) -> float:
+    """Сканирует все файлы корпуса workers параллельными запросами и возвращает время"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda path: checker.check_file_signatures(path, matcher), paths))
+    elapsed = time.perf_counter() - started
+
+    errors = [result["error"] for result in results if "error" in result]
+    if errors:
+        raise RuntimeError(errors[0])
+    return elapsed
+
+def measure(mode: str, workers: int, paths: list[str], database_path: str, total_bytes: int) -> dict:
+    """Измеряет пропускную способность одного бэкенда"""
+    matcher = SignatureDatabase(database_path).index.get_matcher(ALL_SIGNATURES_SET)
+    if mode == WORKERS_MODE_PROCESSES:
+        checker = ProcessSignatureChecker(workers=workers, signatures_path=database_path)
+        checker.start()
+    else:
+        checker = SignatureChecker()
+
+    try:
+        elapsed = run_scan(checker, matcher, paths, workers)
+    finally:
+        checker.close()
+
+    return {
+        "mode": mode,
+        "workers": workers,
+        "seconds": elapsed,
+        "mb_per_second": total_bytes / elapsed / (1024 * 1024)
+    }
+
+def main() -> None:
+    """Главная функция бенчмарка"""
+    args = parse_arguments()
+    total_bytes = args.files * args.file_size
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        paths, database_path = create_corpus(directory, args)
+        for mode in args.modes:
+            baseline = None
+            for workers in range(1, args.max_workers + 1):
+                result = measure(mode, workers, paths, database_path, total_bytes)
+                baseline = baseline or result["mb_per_second"]
+                result["speedup"] = result["mb_per_second"] / baseline
+                results.append(result)
+                print(f"{mode:>9} workers={workers:<3} {result['mb_per_second']:8.2f} MB/s  x{result['speedup']:.2f}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"parameters": vars(args), "results": results}, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,592 @@
-import socket
+import argparse
+import asyncio
 import json
+import random
+import socket
+import struct
 import sys
+import threading
+import time
+from array import array
+from collections import deque
+
+HOST = "127.0.0.1"
+PORT = 8888
+
+# Заголовок кадра: длина тела (4 байта big-endian), старший бит означает,
+# что сообщение продолжается в следующем кадре
+FRAME_HEADER = struct.Struct("!I")
+FRAME_MORE = 0x80000000
+FRAME_SIZE_MASK = 0x7FFFFFFF
+FRAGMENT_SIZE = 1024 * 1024
+
+# Команды, на которые сервер отвечает потоком сообщений, завершающимся {"done": true, ...}
+STREAMING_COMMANDS = ("CheckDirectory", "CheckPaths")
+
+# Двоичный ответ со списком офсетов ("format": "binary"): заголовок из
+# сигнатуры формата, флагов и числа офсетов, затем офсеты uint64 little-endian
+BINARY_OFFSETS_MAGIC = b"\x00OF1"
+BINARY_OFFSETS_HEADER = struct.Struct("<4sB3xQ")
+BINARY_FLAG_TRUNCATED = 0x01
+# Команды, для которых сервер поддерживает двоичный ответ
+BINARY_RESPONSE_COMMANDS = ("CheckLocalFile",)
+
+# Команды, которые нельзя безопасно повторить после обрыва соединения
+# (запрос мог быть выполнен): их повторяем только после ответа о перегрузке
+NON_IDEMPOTENT_COMMANDS = ("QuarantineLocalFile", "QuarantineBatch", "QuarantineRestore", "CheckAndQuarantine")
+
+def recv_exact(sock, size):
+    # Чтение ровно size байт из сокета
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if not count:
+            raise ConnectionError("Connection closed by server")
+        received += count
+    return buffer
+
+def read_until_closed(sock):
+    data = bytearray()
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return data
+        data += chunk
+
+def iter_frames(payload):
+    # Разбиение сообщения на кадры не больше FRAGMENT_SIZE
+    view = memoryview(payload)
+    start = 0
+    while True:
+        end = min(start + FRAGMENT_SIZE, len(view))
+        flags = FRAME_MORE if end < len(view) else 0
+        yield FRAME_HEADER.pack((end - start) | flags) + view[start:end]
+        if not flags:
+            return
+        start = end
+
+def write_message(sock, payload):
+    for frame in iter_frames(payload):
+        sock.sendall(frame)
+
+def read_message(sock):
+    # Сборка сообщения из кадров-продолжений
+    message = bytearray()
+    while True:
+        header = recv_exact(sock, FRAME_HEADER.size)
+        if not message and header[:1] == b"{":
+            # Некадрированный ответ (например, отказ перегруженного сервера
+            # до чтения запроса) - читаем до закрытия соединения
+            return header + read_until_closed(sock)
+        (value,) = FRAME_HEADER.unpack(header)
+        message += recv_exact(sock, value & FRAME_SIZE_MASK)
+        if not value & FRAME_MORE:
+            return message
+
+async def read_message_async(reader):
+    # Асинхронный вариант read_message
+    message = bytearray()
+    while True:
+        header = await reader.readexactly(FRAME_HEADER.size)
+        if not message and header[:1] == b"{":
+            return header + await reader.read()
+        (value,) = FRAME_HEADER.unpack(header)
+        message += await reader.readexactly(value & FRAME_SIZE_MASK)
+        if not value & FRAME_MORE:
+            return message
+
+def decode_response(message):
+    # Разбор ответа: JSON или двоичный список офсетов. Двоичный ответ
+    # приводится к тому же виду, что и JSON: {"offsets": [...]} или
+    # {"offsets": "not found"}, при сокращении списка - "truncated": true
+    if message[:len(BINARY_OFFSETS_MAGIC)] != BINARY_OFFSETS_MAGIC:
+        return json.loads(message.decode('utf-8'))
+
+    _, flags, count = BINARY_OFFSETS_HEADER.unpack_from(message)
+    start = BINARY_OFFSETS_HEADER.size
+    offsets = array("Q")
+    offsets.frombytes(memoryview(message)[start:start + count * offsets.itemsize])
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    response = {"offsets": offsets.tolist() if count else "not found"}
+    if flags & BINARY_FLAG_TRUNCATED:
+        response["truncated"] = True
+    return response
+
+def with_binary_format(command, params):
+    # Запрос двоичного ответа для команд, которые его поддерживают
+    if command in BINARY_RESPONSE_COMMANDS and isinstance(params, dict):
+        return {**params, "format": "binary"}
+    return params
+
+def encode_request(command, params):
+    return json.dumps({command: params}).encode('utf-8')
+
+def is_final_response(command, response):
+    # Потоковая команда заканчивается сводкой {"done": true} или ошибкой
+    # самого запроса (ошибки отдельных файлов содержат file_path)
+    if command not in STREAMING_COMMANDS:
+        return True
+    return bool(response.get("done")) or ("error" in response and "file_path" not in response)
+
+def collect_stream(results, final):
+    # Ответы потоковой команды собираются в один, как для одиночного запроса
+    summary = {key: value for key, value in final.items() if key != "done"}
+    return {"results": results, **summary}
+
+class RetryPolicy:
+    """
+    Правила повтора запросов
+
+    Запрос повторяется после ответа о перегрузке сервера ({"busy": true}) и
+    после ошибки соединения (кроме команд из NON_IDEMPOTENT_COMMANDS), не
+    больше retries раз. Задержка перед повтором растет экспоненциально от
+    backoff до max_backoff секунд со случайным разбросом, чтобы клиенты,
+    получившие отказ одновременно, не повторяли запросы одновременно.
+    """
+
+    def __init__(self, retries=3, backoff=0.05, max_backoff=2.0):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def should_retry(self, command, attempt, response=None):
+        # response=None означает ошибку соединения
+        if attempt >= self.retries:
+            return False
+        if response is not None:
+            return bool(response.get("busy"))
+        return command not in NON_IDEMPOTENT_COMMANDS
+
+    def delay(self, attempt):
+        limit = min(self.max_backoff, self.backoff * (2 ** attempt))
+        return random.uniform(limit / 2, limit)
+
+class Connection:
+    """Постоянное соединение с сервером с поддержкой конвейерных запросов"""
+
+    def __init__(self, host=HOST, port=PORT, timeout=None):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def request(self, command, params):
+        # Отправка одного запроса и ожидание ответа
+        self._send(command, params)
+        return self._receive(command)
+
+    def iter_request(self, command, params):
+        # Отправка запроса потоковой команды и получение ответов по мере готовности
+        self._send(command, params)
+        while True:
+            response = self._read_response()
+            yield response
+            if is_final_response(command, response):
+                return
+
+    def pipeline(self, requests):
+        # Отправка всех запросов без ожидания ответов. Запросы пишутся из
+        # отдельного потока, чтобы сервер не блокировался на отправке
+        # ответов, пока клиент еще отправляет запросы
+        requests = list(requests)
+        errors = []
+
+        def writer():
+            try:
+                for command, params in requests:
+                    self._send(command, params)
+            except OSError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=writer, daemon=True)
+        thread.start()
+        # Сервер отвечает строго в порядке поступления запросов
+        responses = [self._receive(command) for command, _ in requests]
+        thread.join()
+        if errors:
+            raise errors[0]
+        return responses
+
+    def _send(self, command, params):
+        write_message(self.sock, encode_request(command, params))
+
+    def _read_response(self):
+        return decode_response(read_message(self.sock))
+
+    def _receive(self, command):
+        results = []
+        while True:
+            response = self._read_response()
+            if is_final_response(command, response):
+                return collect_stream(results, response) if command in STREAMING_COMMANDS else response
+            results.append(response)
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул постоянных соединений
+
+    Каждый запрос занимает одно соединение пула на время ожидания ответа;
+    соединения открываются по мере необходимости (не больше size) и
+    переиспользуются. Соединение после ошибки или ответа о перегрузке
+    закрывается (многопоточный сервер закрывает его сам).
+    """
+
+    def __init__(self, host=HOST, port=PORT, size=4, retry=None, timeout=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []
 
-def send_request(command, params):
+    def request(self, command, params):
+        attempt = 0
+        while True:
+            try:
+                response = self._request_once(command, params)
+            except OSError:
+                if not self.retry.should_retry(command, attempt):
+                    raise
+            else:
+                if not self.retry.should_retry(command, attempt, response):
+                    return response
+            time.sleep(self.retry.delay(attempt))
+            attempt += 1
+
+    def _request_once(self, command, params):
+        with self._slots:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                connection = Connection(self.host, self.port, self.timeout)
+
+            try:
+                response = connection.request(command, params)
+            except BaseException:
+                connection.close()
+                raise
+
+            if response.get("busy"):
+                connection.close()
+            else:
+                with self._lock:
+                    self._idle.append(connection)
+            return response
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class AsyncConnection:
+    """
+    Постоянное соединение asyncio с несколькими запросами в полете
+
+    Запросы отправляются сразу, не дожидаясь ответов на предыдущие; сервер
+    отвечает в порядке запросов, поэтому ответы сопоставляются с ожидающими
+    запросами по очереди. При обрыве соединения все ожидающие запросы
+    завершаются с ConnectionError.
+    """
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        # Ожидающие запросы: (команда, future, накопленные ответы потоковой команды)
+        self._waiting = deque()
+        self.closed = False
+        self._read_task = asyncio.create_task(self._read_responses())
+
+    @classmethod
+    async def open(cls, host=HOST, port=PORT):
+        reader, writer = await asyncio.open_connection(host, port)
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return cls(reader, writer)
+
+    @property
+    def pending(self):
+        return len(self._waiting)
+
+    async def request(self, command, params):
+        if self.closed:
+            raise ConnectionError("Connection is closed")
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append((command, future, []))
+        try:
+            self._writer.writelines(iter_frames(encode_request(command, params)))
+            await self._writer.drain()
+        except (ConnectionError, OSError) as e:
+            self._close(ConnectionError(f"Error sending request: {e}"))
+        return await future
+
+    async def _read_responses(self):
+        error = ConnectionError("Connection closed by server")
+        try:
+            while True:
+                response = decode_response(await read_message_async(self._reader))
+                if not self._waiting:
+                    error = ConnectionError("Unexpected response from server")
+                    return
+                command, future, results = self._waiting[0]
+                if not is_final_response(command, response):
+                    results.append(response)
+                    continue
+
+                self._waiting.popleft()
+                if command in STREAMING_COMMANDS:
+                    response = collect_stream(results, response)
+                # Запрос мог быть отменен вызывающим кодом
+                if not future.done():
+                    future.set_result(response)
+        except asyncio.IncompleteReadError:
+            pass
+        except (ConnectionError, OSError, ValueError) as e:
+            error = ConnectionError(f"Error reading response: {e}")
+        finally:
+            self._close(error)
+
+    def _close(self, error):
+        self.closed = True
+        self._writer.close()
+        while self._waiting:
+            _, future, _ = self._waiting.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+    async def close(self):
+        self._close(ConnectionError("Connection is closed"))
+        self._read_task.cancel()
+        await asyncio.gather(self._read_task, return_exceptions=True)
+
+class AsyncClient:
+    """
+    Асинхронный клиент с несколькими соединениями
+
+    Запросы распределяются по connections постоянным соединениям (новый
+    запрос уходит в наименее загруженное), на каждом соединении в полете
+    может быть в среднем до in_flight запросов. Соединения открываются при
+    первом запросе и переоткрываются после обрыва.
+
+    Пример:
+        async with AsyncClient(port=8888, connections=4) as client:
+            responses = await asyncio.gather(*(
+                client.request("CheckLocalFile", {"file_path": path, "signature": "4d5a"})
+                for path in paths
+            ))
+    """
+
+    def __init__(self, host=HOST, port=PORT, connections=4, in_flight=32, retry=None):
+        self.host = host
+        self.port = port
+        self.retry = retry or RetryPolicy()
+        self._connections = [None] * connections
+        self._locks = [asyncio.Lock() for _ in range(connections)]
+        self._slots = asyncio.Semaphore(connections * in_flight)
+
+    async def request(self, command, params):
+        attempt = 0
+        while True:
+            try:
+                async with self._slots:
+                    connection = await self._get_connection()
+                    response = await connection.request(command, params)
+            except OSError:
+                if not self.retry.should_retry(command, attempt):
+                    raise
+            else:
+                if not self.retry.should_retry(command, attempt, response):
+                    return response
+            await asyncio.sleep(self.retry.delay(attempt))
+            attempt += 1
+
+    async def _get_connection(self):
+        def load(index):
+            connection = self._connections[index]
+            return 0 if connection is None or connection.closed else connection.pending
+
+        index = min(range(len(self._connections)), key=load)
+        async with self._locks[index]:
+            connection = self._connections[index]
+            if connection is None or connection.closed:
+                connection = self._connections[index] = await AsyncConnection.open(self.host, self.port)
+            return connection
+
+    async def close(self):
+        connections = [connection for connection in self._connections if connection is not None]
+        self._connections = [None] * len(self._connections)
+        await asyncio.gather(*(connection.close() for connection in connections))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+def parse_bulk_line(line):
+    # Строка запроса: {"command": "...", "params": {...}} или {"<команда>": {...}},
+    # необязательное поле "id" возвращается в ответе
+    request = json.loads(line)
+    if not isinstance(request, dict):
+        raise ValueError("Request must be a JSON object")
+    request_id = request.pop("id", None)
+    if "command" in request:
+        return request_id, request["command"], request.get("params", {})
+    if len(request) != 1:
+        raise ValueError('Expected {"command": ..., "params": ...} or {"<Command>": {...}}')
+    command, params = next(iter(request.items()))
+    return request_id, command, params
+
+async def run_bulk(source, output, host, port, connections, in_flight, retry, binary=False):
+    # Выполнение запросов JSONL из source с записью ответов JSONL в output
+    # в порядке готовности. Число одновременно выполняемых запросов
+    # ограничено, поэтому вход может быть сколь угодно большим
+    loop = asyncio.get_running_loop()
+    # Обычный файл читается без блокировки цикла событий, канал - в потоке
+    read_line = source.readline if source.seekable() else (lambda: loop.run_in_executor(None, source.readline))
+    slots = asyncio.Semaphore(connections * in_flight)
+    tasks = set()
+    counts = {"requests": 0, "errors": 0}
+    started = time.perf_counter()
+
+    def write_record(number, request_id, response):
+        record = {"line": number, "response": response}
+        if request_id is not None:
+            record["id"] = request_id
+        counts["requests"] += 1
+        counts["errors"] += "error" in response
+        output.write(json.dumps(record) + "\n")
+
+    async def run(client, number, request_id, command, params):
+        try:
+            response = await client.request(command, params)
+        except OSError as e:
+            response = {"error": f"Connection error: {e}"}
+        finally:
+            slots.release()
+        write_record(number, request_id, response)
+
+    async with AsyncClient(host, port, connections, in_flight, retry) as client:
+        number = 0
+        while True:
+            line = read_line()
+            if not isinstance(line, str):
+                line = await line
+            if not line:
+                break
+            number += 1
+            if not line.strip():
+                continue
+            try:
+                request_id, command, params = parse_bulk_line(line)
+            except ValueError as e:
+                write_record(number, None, {"error": f"Invalid request: {e}"})
+                continue
+            if binary:
+                params = with_binary_format(command, params)
+
+            await slots.acquire()
+            task = asyncio.create_task(run(client, number, request_id, command, params))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+
+    output.flush()
+    elapsed = time.perf_counter() - started
+    print(
+        f"{counts['requests']} requests, {counts['errors']} errors in {elapsed:.2f}s "
+        f"({counts['requests'] / elapsed if elapsed else 0:.1f} req/s)",
+        file=sys.stderr
+    )
+    return counts
+
+def send_request(command, params, host=HOST, port=PORT):
     # Отправка запроса серверу
-    request = {command: params}
-    request_json = json.dumps(request)
+    with Connection(host, port) as connection:
+        if command in STREAMING_COMMANDS:
+            # Результаты по файлам выводятся по мере поступления
+            for response in connection.iter_request(command, params):
+                print(f"Response: {json.dumps(response)}")
+            return
+        response = connection.request(command, params)
+    print(f"Response: {json.dumps(response)}")
 
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as client_socket:
-        client_socket.connect(("127.0.0.1", 8888))
-        client_socket.sendall(request_json.encode('utf-8'))
-        response = client_socket.recv(1024).decode('utf-8')
-        print(f"Response: {response}")
+def send_requests(requests, host=HOST, port=PORT):
+    # Отправка нескольких запросов по одному соединению
+    with Connection(host, port) as connection:
+        for response in connection.pipeline(requests):
+            print(f"Response: {json.dumps(response)}")
 
-if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python client.py <command> <params>")
-        print("Example: python client.py CheckLocalFile '{\"file_path\": \"test.txt\", \"signature\": \"6d70 6f72 7420\"}'")
-        sys.exit(1)
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description='Signature crawler client',
+        epilog='Example: python client.py CheckLocalFile \'{"file_path": "test.txt", "signature": "6d70 6f72 7420"}\''
+    )
+    parser.add_argument('--host', type=str, default=HOST, help='Server host')
+    parser.add_argument('--port', type=int, default=PORT, help='Server port')
+    parser.add_argument('--bulk', type=str, default=None, metavar='FILE',
+                        help='Run JSONL requests from FILE ("-" for stdin) and write JSONL responses')
+    parser.add_argument('--output', type=str, default=None, help='Write bulk responses to this file instead of stdout')
+    parser.add_argument('--connections', type=int, default=4, help='Connections used in bulk mode')
+    parser.add_argument('--in-flight', type=int, default=32, help='Requests in flight per connection in bulk mode')
+    parser.add_argument('--retries', type=int, default=3,
+                        help='Retries after a busy response or a connection error in bulk mode')
+    parser.add_argument('--binary', action='store_true',
+                        help='Ask the server for compact binary offset lists (decoded to the same JSON output)')
+    parser.add_argument('requests', nargs='*', metavar='COMMAND PARAMS',
+                        help='Command names followed by their JSON parameters')
+    args = parser.parse_args()
+    if args.bulk is None and (not args.requests or len(args.requests) % 2):
+        parser.error("expected <command> <params> pairs or --bulk FILE")
+    return args
+
+def main():
+    args = parse_arguments()
+    if args.bulk is not None:
+        source = sys.stdin if args.bulk == "-" else open(args.bulk, "r", encoding="utf-8")
+        output = sys.stdout if args.output is None else open(args.output, "w", encoding="utf-8")
+        try:
+            asyncio.run(run_bulk(
+                source, output, args.host, args.port, args.connections, args.in_flight,
+                RetryPolicy(args.retries), args.binary
+            ))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if output is not sys.stdout:
+                output.close()
+        return
 
+    requests = [(args.requests[i], json.loads(args.requests[i + 1])) for i in range(0, len(args.requests), 2)]
+    if args.binary:
+        requests = [(command, with_binary_format(command, params)) for command, params in requests]
+    if len(requests) == 1:
+        send_request(*requests[0], host=args.host, port=args.port)
+    else:
+        send_requests(requests, host=args.host, port=args.port)
+
+if __name__ == "__main__":
     try:
-        command = sys.argv[1]
-        params = json.loads(sys.argv[2])
-        send_request(command, params)
+        main()
     except json.JSONDecodeError:
         print("Error: Parameters should be in valid JSON format")
         sys.exit(1)
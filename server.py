@@ -9,12 +9,13 @@ import argparse
 import logging
 
 class TCPServer:
-    def __init__(self, host, port, thread_count, quarantine_dir, enable_logging):
+    def __init__(self, host, port, thread_count, quarantine_dir, enable_logging, chunk_size=1024 * 1024):
         # Инициализация сервера
         self.host = host
         self.port = port
         self.thread_count = thread_count
         self.quarantine_dir = quarantine_dir
+        self.chunk_size = chunk_size
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.bind((self.host, self.port))
         self.server_socket.listen(5)
@@ -93,12 +94,24 @@ class TCPServer:
         offsets = []
 
         if os.path.exists(file_path):
+            if not signature:
+                return {"error": "Empty signature"}
+            # Читаем файл блоками, сохраняя перекрытие в len(signature) - 1 байт
+            overlap = len(signature) - 1
+            tail = b""
+            base = 0
             with open(file_path, "rb") as file:
-                content = file.read()
-                offset = content.find(signature)
-                while offset != -1:
-                    offsets.append(offset)
-                    offset = content.find(signature, offset + 1)
+                while True:
+                    chunk = file.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    content = tail + chunk
+                    offset = content.find(signature)
+                    while offset != -1:
+                        offsets.append(base + offset)
+                        offset = content.find(signature, offset + 1)
+                    tail = content[max(0, len(content) - overlap):] if overlap else b""
+                    base += len(content) - len(tail)
             if offsets:
                 return {"offsets": offsets}
             else:
@@ -141,8 +154,11 @@ if __name__ == "__main__":
     parser.add_argument('--threads', type=int, default=4, help='Number of threads in the pool')
     parser.add_argument('--quarantine', type=str, default='./quarantine', help='Quarantine directory')
     parser.add_argument('--logging', action='store_true', help='Enable logging to server.log')
+    parser.add_argument('--chunk-size', type=int, default=1024 * 1024, help='Read chunk size in bytes')
 
     args = parser.parse_args()
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size must be positive")
 
     # Параметры запуска сервера
     host = args.host
@@ -150,7 +166,8 @@ if __name__ == "__main__":
     thread_count = args.threads
     quarantine_dir = args.quarantine
     enable_logging = args.logging
+    chunk_size = args.chunk_size
 
     # Инициализация и запуск сервера
-    server = TCPServer(host, port, thread_count, quarantine_dir, enable_logging)
+    server = TCPServer(host, port, thread_count, quarantine_dir, enable_logging, chunk_size)
     server.start()
@@ -3,15 +3,24 @@ Signature Crawler Server Package
 """
 
 from .tcp_server import TCPServer
+from .async_server import AsyncTCPServer
 from .handler import RequestHandler
 from .quarantine import QuarantineManager
-from .signature_checker import SignatureChecker
+from .signature_checker import SignatureChecker, MultiSignatureMatcher
+from .signature_db import SignatureDatabase
+from .result_cache import ScanResultCache
 from .worker import WorkerPool
+from .metrics import MetricsRegistry
 
 __all__ = [
     'TCPServer',
+    'AsyncTCPServer',
     'RequestHandler', 
     'QuarantineManager',
     'SignatureChecker',
-    'WorkerPool'
+    'MultiSignatureMatcher',
+    'SignatureDatabase',
+    'ScanResultCache',
+    'WorkerPool',
+    'MetricsRegistry'
 ]
\ No newline at end of file
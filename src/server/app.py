@@ -1,21 +1,39 @@
 import argparse
+import copy
+import os
+import shutil
 import signal
 import sys
-import logging
-from typing import NoReturn
+import tempfile
+import threading
+from typing import Optional, Union
 from server.tcp_server import TCPServer, ServerConfig
+from server.async_server import AsyncTCPServer
 from server.quarantine import QuarantineManager
-from server.signature_checker import SignatureChecker
-from server.handler import RequestHandler
+from server.signature_checker import SignatureChecker, DEFAULT_CHUNK_SIZE, DEFAULT_MMAP_THRESHOLD
+from server.handler import RequestHandler, HandlerConfig
+from server.signature_db import SignatureDatabase
+from server.directory_scanner import DirectoryScanner
+from server.scan_pool import ProcessSignatureChecker, WORKERS_MODE_THREADS, WORKERS_MODE_PROCESSES
+from server.result_cache import ScanResultCache, ResultCacheConfig, EVICTION_LRU, EVICTION_FIFO
+from server.metrics import MetricsHTTPServer, MetricsSnapshotWriter, aggregate_metrics
+from server.log_pipeline import LoggingConfig, setup_logging
+from server.supervisor import ProcessSupervisor
+from server.watch import WatchConfig, WatchManager
 
-def setup_logging(enable_logging: bool) -> None:
-    """Настраивает логирование"""
-    if enable_logging:
-        logging.basicConfig(
-            filename='server.log', 
-            level=logging.DEBUG,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
+IO_MODE_THREADS = 'threads'
+IO_MODE_ASYNCIO = 'asyncio'
+
+def create_logging_config(args: argparse.Namespace) -> LoggingConfig:
+    """Создает конфигурацию журналирования из аргументов командной строки"""
+    return LoggingConfig(
+        file_path=args.log_file if args.logging else None,
+        max_bytes=args.log_max_bytes,
+        backup_count=args.log_backups,
+        sample_rate=args.log_sample_rate,
+        max_field_length=args.log_max_field_length,
+        console=not args.quiet
+    )
 
 def parse_arguments() -> argparse.Namespace:
     """Парсит аргументы командной строки"""
@@ -23,48 +41,295 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument('--host', type=str, default='127.0.0.1', help='Hostname to bind')
     parser.add_argument('--port', type=int, default=8888, help='Port to bind')
     parser.add_argument('--threads', type=int, default=4, help='Number of threads in the pool')
+    parser.add_argument('--queue-size', type=int, default=ServerConfig.queue_size,
+                        help='Maximum number of requests waiting for a worker; extra ones get a busy response')
+    parser.add_argument('--backlog', type=int, default=ServerConfig.socket_backlog,
+                        help='Listen socket backlog')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='Run this many server processes sharing the port via SO_REUSEPORT')
+    parser.add_argument('--io-mode', choices=[IO_MODE_THREADS, IO_MODE_ASYNCIO], default=IO_MODE_THREADS,
+                        help='Connection handling: a thread per connection or an asyncio event loop '
+                             '(with --threads scan threads)')
     parser.add_argument('--quarantine', type=str, default='./quarantine', help='Quarantine directory')
-    parser.add_argument('--logging', action='store_true', help='Enable logging to server.log')
+    parser.add_argument('--no-quarantine-hash', action='store_true',
+                        help='Do not record SHA-256 of quarantined files in the manifest')
+    parser.add_argument('--logging', action='store_true', help='Enable JSON lines logging to --log-file')
+    parser.add_argument('--log-file', type=str, default='server.log', help='Log file path')
+    parser.add_argument('--log-max-bytes', type=int, default=LoggingConfig.max_bytes,
+                        help='Rotate the log file when it reaches this size')
+    parser.add_argument('--log-backups', type=int, default=LoggingConfig.backup_count,
+                        help='Number of rotated log files to keep')
+    parser.add_argument('--log-sample-rate', type=float, default=LoggingConfig.sample_rate,
+                        help='Fraction of successful requests to log (errors are always logged)')
+    parser.add_argument('--log-max-field-length', type=int, default=LoggingConfig.max_field_length,
+                        help='Truncate logged strings (e.g. responses) to this many characters')
+    parser.add_argument('--quiet', action='store_true',
+                        help='Do not print startup, connection and shutdown messages to stdout')
+    parser.add_argument('--workers-mode', choices=[WORKERS_MODE_THREADS, WORKERS_MODE_PROCESSES],
+                        default=WORKERS_MODE_THREADS,
+                        help='Run signature scans in the worker threads or in a pool of processes')
+    parser.add_argument('--directory-workers', type=int, default=None,
+                        help='Threads checking files of CheckDirectory/CheckPaths requests and watch passes, '
+                             'shared by all such requests (default: half of --threads)')
+    parser.add_argument('--scan-workers', type=int, default=None,
+                        help='Number of scan processes for --workers-mode processes, per server process '
+                             '(default: CPU count divided by --processes)')
+    parser.add_argument('--idle-timeout', type=float, default=HandlerConfig.idle_timeout,
+                        help='Seconds to wait for the next request on a persistent connection')
+    parser.add_argument('--max-message-size', type=int, default=HandlerConfig.max_message_size,
+                        help='Maximum size of a single request message in bytes')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='Read chunk size in bytes for streaming signature scan')
+    parser.add_argument('--mmap-threshold', type=int, default=DEFAULT_MMAP_THRESHOLD,
+                        help='Scan files of at least this size via mmap (negative value disables mmap)')
+    parser.add_argument('--signatures', type=str, default=None,
+                        help='Signature database file (JSON), reloaded on SIGHUP')
+    parser.add_argument('--cache-entries', type=int, default=ResultCacheConfig.max_entries,
+                        help='Maximum number of cached scan results (0 disables the cache)')
+    parser.add_argument('--cache-max-bytes', type=int, default=ResultCacheConfig.max_bytes,
+                        help='Approximate memory limit for cached scan results in bytes')
+    parser.add_argument('--cache-eviction', choices=[EVICTION_LRU, EVICTION_FIFO], default=EVICTION_LRU,
+                        help='Scan result cache eviction policy')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Serve Prometheus metrics on http://<metrics-host>:<port>/metrics (disabled by default)')
+    parser.add_argument('--metrics-host', type=str, default='127.0.0.1',
+                        help='Address for the metrics HTTP endpoint')
+    parser.add_argument('--watch-index', type=str, default=None,
+                        help='SQLite index of watch jobs and per-file scan state (enables the Watch* commands)')
+    parser.add_argument('--watch-interval', type=float, default=WatchConfig.default_interval,
+                        help='Default seconds between rescans of a watch job')
     
     return parser.parse_args()
 
-def create_server_components(args: argparse.Namespace) -> tuple[TCPServer, callable]:
-    """Создает компоненты сервера"""
+def create_server_components(
+    args: argparse.Namespace,
+    run_watch_jobs: bool = True
+) -> tuple[Union[TCPServer, AsyncTCPServer], callable, Optional[SignatureDatabase]]:
+    """
+    Создает компоненты сервера
+    
+    Args:
+        args: Аргументы командной строки
+        run_watch_jobs: Выполнять задания повторной проверки в этом процессе
+    """
     # Создание конфигурации
     config = ServerConfig(
         host=args.host,
         port=args.port,
         thread_count=args.threads,
-        enable_logging=args.logging
+        enable_logging=args.logging,
+        socket_backlog=args.backlog,
+        socket_reuse_port=args.processes > 1,
+        queue_size=args.queue_size
     )
     
     # Инициализация компонентов
-    quarantine_manager = QuarantineManager(args.quarantine)
-    signature_checker = SignatureChecker()
-    request_handler = RequestHandler(signature_checker, quarantine_manager, args.logging)
+    quarantine_manager = QuarantineManager(args.quarantine, hash_files=not args.no_quarantine_hash)
+    result_cache = None
+    if args.cache_entries > 0:
+        result_cache = ScanResultCache(ResultCacheConfig(
+            max_entries=args.cache_entries,
+            max_bytes=args.cache_max_bytes,
+            eviction=args.cache_eviction
+        ))
+    if args.workers_mode == WORKERS_MODE_PROCESSES:
+        # В режиме --processes пул рабочих процессов есть у каждого процесса
+        # сервера, поэтому ядра по умолчанию делятся между ними
+        scan_workers = args.scan_workers
+        if scan_workers is None:
+            scan_workers = max(1, (os.cpu_count() or 1) // args.processes)
+        signature_checker = ProcessSignatureChecker(
+            chunk_size=args.chunk_size,
+            mmap_threshold=args.mmap_threshold,
+            result_cache=result_cache,
+            workers=scan_workers,
+            signatures_path=args.signatures
+        )
+        signature_checker.start()
+    else:
+        signature_checker = SignatureChecker(
+            chunk_size=args.chunk_size,
+            mmap_threshold=args.mmap_threshold,
+            result_cache=result_cache
+        )
+    signature_db = SignatureDatabase(args.signatures) if args.signatures else None
+    # Поток запроса CheckDirectory только ждет результатов, а файлы проверяет
+    # отдельный пул: одновременно идет не больше --threads + --directory-workers проверок
+    directory_workers = args.directory_workers
+    if directory_workers is None:
+        directory_workers = max(1, args.threads // 2)
+    directory_scanner = DirectoryScanner(max_workers=directory_workers)
+    watch_manager = None
+    if args.watch_index:
+        watch_manager = WatchManager(
+            WatchConfig(args.watch_index, run_jobs=run_watch_jobs, default_interval=args.watch_interval),
+            directory_scanner
+        )
+    request_handler = RequestHandler(
+        signature_checker,
+        quarantine_manager,
+        args.logging,
+        signature_db,
+        idle_timeout=args.idle_timeout,
+        max_message_size=args.max_message_size,
+        directory_scanner=directory_scanner,
+        watch_manager=watch_manager
+    )
+    if watch_manager is not None:
+        watch_manager.start(request_handler.make_watch_check)
     
     # Создание сервера
-    server = TCPServer(config, request_handler)
+    if args.io_mode == IO_MODE_ASYNCIO:
+        server = AsyncTCPServer(config, request_handler)
+    else:
+        server = TCPServer(config, request_handler)
+    
+    # HTTP-сервер метрик работает в фоновом потоке и завершается вместе с процессом
+    if args.metrics_port is not None:
+        metrics_server = MetricsHTTPServer(
+            request_handler.metrics,
+            args.metrics_host,
+            args.metrics_port,
+            stats_provider=request_handler.collect_stats
+        )
+        metrics_server.start()
     
-    # Создание обработчика сигнала завершения
-    def shutdown_handler(signum: int, frame) -> NoReturn:
+    # Создание обработчика сигнала завершения. Сигнал может прийти дважды
+    # (например, Ctrl+C всей группе процессов и пересылка от родителя)
+    stopping = threading.Event()
+    
+    def shutdown_handler(signum: int, frame) -> None:
+        if stopping.is_set():
+            return
+        stopping.set()
         server.shutdown()
-        sys.exit(0)
+        # asyncio-сервер сам выходит из start() после остановки цикла событий
+        if args.io_mode == IO_MODE_THREADS:
+            if watch_manager is not None:
+                watch_manager.close()
+            directory_scanner.close()
+            signature_checker.close()
+            sys.exit(0)
     
-    return server, shutdown_handler
+    return server, shutdown_handler, signature_db
 
-def main() -> None:
-    """Главная функция приложения"""
-    args = parse_arguments()
-    setup_logging(args.logging)
+def install_reload_handler(signature_db: SignatureDatabase) -> None:
+    """Настраивает перезагрузку базы сигнатур по SIGHUP"""
+    def reload_handler(signum: int, frame) -> None:
+        # Компиляция базы может занять время, поэтому выполняется
+        # в отдельном потоке, чтобы не блокировать прием соединений
+        threading.Thread(target=signature_db.reload, name="SignatureReload", daemon=True).start()
+    
+    signal.signal(signal.SIGHUP, reload_handler)
+
+def run_server(args: argparse.Namespace, metrics_dir: Optional[str] = None, process_index: int = 0) -> None:
+    """
+    Запускает сервер в текущем процессе и блокируется до его остановки
+    
+    Args:
+        args: Аргументы командной строки
+        metrics_dir: Каталог метрик процессов в режиме --processes; метрики
+            процесса периодически записываются в него, а Stats возвращает
+            сумму по всем процессам в разделе processes
+        process_index: Номер процесса в режиме --processes; задания
+            повторной проверки выполняет только процесс 0, остальные
+            лишь принимают команды Watch* через общий индекс
+    """
+    log_listener = setup_logging(create_logging_config(args))
+    snapshot_writer = None
+    
+    try:
+        server, shutdown_handler, signature_db = create_server_components(args, run_watch_jobs=process_index == 0)
+        
+        if metrics_dir is not None:
+            request_handler = server.request_handler
+            snapshot_writer = MetricsSnapshotWriter(request_handler.metrics, metrics_dir)
+            snapshot_writer.start()
+            request_handler.register_stats_provider("processes", lambda: {
+                "count": args.processes,
+                "pid": os.getpid(),
+                "metrics": aggregate_metrics(metrics_dir, request_handler.metrics).snapshot()
+            })
+        
+        # Настройка обработки сигналов завершения
+        signal.signal(signal.SIGINT, shutdown_handler)
+        signal.signal(signal.SIGTERM, shutdown_handler)
+        if hasattr(signal, "SIGHUP"):
+            if signature_db is not None:
+                install_reload_handler(signature_db)
+            else:
+                # Перечитывать нечего; в режиме --processes родитель пересылает
+                # SIGHUP всем процессам, и действие по умолчанию завершило бы их
+                signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        
+        # Запуск сервера
+        server.start()
+        if server.request_handler.watch_manager is not None:
+            server.request_handler.watch_manager.close()
+        server.request_handler.directory_scanner.close()
+        server.request_handler.signature_checker.close()
+    finally:
+        if snapshot_writer is not None:
+            snapshot_writer.stop()
+        # Дописываем накопившиеся в очереди записи журнала
+        if log_listener is not None:
+            log_listener.stop()
+
+def process_log_path(path: str, index: int) -> str:
+    """Путь журнала процесса с номером index: server.log -> server.1.log"""
+    root, extension = os.path.splitext(path)
+    return f"{root}.{index}{extension}"
+
+def run_processes(args: argparse.Namespace) -> int:
+    """
+    Запускает args.processes процессов сервера на одном порту
     
-    server, shutdown_handler = create_server_components(args)
+    Соединения между процессами распределяет ядро (SO_REUSEPORT). Каждый
+    процесс пишет свой журнал; HTTP-сервер метрик работает в родительском
+    процессе и отдает сумму метрик всех процессов.
     
-    # Настройка обработки сигнала завершения
-    signal.signal(signal.SIGINT, shutdown_handler)
+    Returns:
+        int: Код завершения
+    """
+    metrics_dir = tempfile.mkdtemp(prefix="signature_crawler_metrics_")
     
-    # Запуск сервера
-    server.start()
+    def run_child(index: int) -> None:
+        child_args = copy.copy(args)
+        child_args.log_file = process_log_path(args.log_file, index)
+        child_args.metrics_port = None
+        run_server(child_args, metrics_dir, process_index=index)
+    
+    supervisor = ProcessSupervisor(args.processes, run_child)
+    supervisor.start()
+    
+    # Потоки родительского процесса создаются только после fork
+    log_listener = setup_logging(LoggingConfig(console=not args.quiet))
+    metrics_server = None
+    try:
+        if args.metrics_port is not None:
+            metrics_server = MetricsHTTPServer(
+                lambda: aggregate_metrics(metrics_dir),
+                args.metrics_host,
+                args.metrics_port,
+                stats_provider=lambda: {
+                    "processes": {"count": args.processes, "metrics": aggregate_metrics(metrics_dir).snapshot()}
+                }
+            )
+            metrics_server.start()
+        return supervisor.wait()
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        if log_listener is not None:
+            log_listener.stop()
+
+def main() -> None:
+    """Главная функция приложения"""
+    args = parse_arguments()
+    if args.processes > 1:
+        sys.exit(run_processes(args))
+    run_server(args)
 
 if __name__ == "__main__":
     main()
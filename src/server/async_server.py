@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from .handler import RequestHandler
+from .protocol import (
+    LEGACY_REQUEST_PREFIXES,
+    ProtocolError,
+    iter_frames,
+    read_message_async,
+    receive_json_document_async
+)
+from .tcp_server import ServerConfig
+from .worker import AdmissionStats, BUSY_RESPONSE
+
+logger = logging.getLogger(__name__)
+
+class AsyncTCPServer:
+    """
+    TCP сервер на asyncio
+
+    Ввод-вывод всех соединений выполняется в одном цикле событий, поэтому
+    медленные и простаивающие клиенты не занимают потоки. Блокирующая
+    обработка запросов (чтение и проверка файлов, карантин) выполняется в
+    пуле из config.thread_count потоков, что ограничивает число
+    одновременных проверок независимо от числа соединений. Сверх этого
+    ожидать исполнителя могут не больше config.queue_size запросов,
+    остальные сразу получают ответ о перегрузке.
+    """
+
+    def __init__(self, config: ServerConfig, request_handler: RequestHandler) -> None:
+        self.config = config
+        self.request_handler = request_handler
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.running = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._writers: set[asyncio.StreamWriter] = set()
+        self._tasks: set[asyncio.Task] = set()
+        # Запросы, принятые к выполнению и еще не завершенные
+        self._pending = 0
+        self.admission_stats = AdmissionStats()
+        request_handler.register_stats_provider("queue", self.stats)
+        metrics = request_handler.metrics
+        self.accepted_connections = metrics.counter("connections_total", "Accepted client connections")
+        self.queue_wait_seconds = request_handler.stage_histogram("queue_wait")
+        self.active_workers = metrics.gauge("active_workers", "Workers busy with a connection or request")
+        self.rejected_requests = metrics.counter("rejected_total", "Requests rejected because the queue was full")
+
+    def start(self) -> None:
+        """Запускает сервер и блокируется до его остановки"""
+        asyncio.run(self._serve())
+
+    def shutdown(self) -> None:
+        """Завершает работу сервера (можно вызывать из обработчика сигнала)"""
+        logger.info("Shutting down server")
+
+        self.running = False
+        if self._loop is not None and self._stop_event is not None:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает метрики очереди допуска"""
+        stats = self.admission_stats.snapshot(
+            max(0, self._pending - self.config.thread_count),
+            self.config.queue_size
+        )
+        stats["active"] = min(self._pending, self.config.thread_count)
+        stats["threads"] = self.config.thread_count
+        stats["connections"] = len(self._writers)
+        return stats
+
+    async def _serve(self) -> None:
+        """Основная корутина сервера"""
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.config.thread_count,
+            thread_name_prefix="Worker"
+        )
+
+        server = await asyncio.start_server(
+            self._handle_connection,
+            self.config.host,
+            self.config.port,
+            backlog=self.config.socket_backlog,
+            reuse_address=self.config.socket_reuse_addr,
+            reuse_port=self.config.socket_reuse_port
+        )
+        self._log_startup()
+        self.running = True
+
+        try:
+            async with server:
+                await self._stop_event.wait()
+        finally:
+            server.close()
+            for writer in list(self._writers):
+                writer.close()
+            # Обработчики соединений завершают незаконченные запросы в пуле,
+            # поэтому пул останавливается только после них
+            tasks = list(self._tasks)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.executor.shutdown(wait=True)
+
+    def _log_startup(self) -> None:
+        """Логирует информацию о запуске сервера"""
+        startup_message = (
+            f"Starting asyncio server on {self.config.host}:{self.config.port} "
+            f"with {self.config.thread_count} scan threads"
+        )
+        logger.info(startup_message)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Обрабатывает одно клиентское соединение"""
+        client_address = writer.get_extra_info("peername")
+        self.accepted_connections.inc()
+        logger.info("Connection from %s", client_address)
+
+        self._writers.add(writer)
+        self._tasks.add(asyncio.current_task())
+        try:
+            first_byte = await self._read_with_timeout(reader.read(1))
+            if not first_byte:
+                return
+
+            if first_byte in LEGACY_REQUEST_PREFIXES:
+                await self._handle_single_request(reader, writer, first_byte)
+            else:
+                await self._handle_framed_connection(reader, writer, first_byte)
+
+        except (asyncio.TimeoutError, ProtocolError, ConnectionError, OSError) as e:
+            if self.config.enable_logging:
+                logger.error("Error handling client %s: %s", client_address, e)
+        except asyncio.CancelledError:
+            # Остановка сервера: соединение закрывается без ответа, задача
+            # завершается обычным образом, чтобы asyncio не сообщал об ошибке
+            pass
+        finally:
+            self._writers.discard(writer)
+            self._tasks.discard(asyncio.current_task())
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError, asyncio.CancelledError):
+                pass
+
+    async def _handle_single_request(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        prefix: bytes
+    ) -> None:
+        """Обрабатывает единственный запрос без кадрирования"""
+        handler_config = self.request_handler.config
+        started = time.perf_counter()
+        payload = await self._read_with_timeout(receive_json_document_async(
+            reader,
+            prefix,
+            handler_config.max_message_size,
+            handler_config.buffer_size
+        ))
+        self.request_handler.receive_seconds.observe(time.perf_counter() - started)
+        if not self._admit():
+            writer.write(BUSY_RESPONSE)
+            await writer.drain()
+            return
+
+        try:
+            # Ответы потоковых команд собираются в один, как и в многопоточном сервере
+            response = await self._run(self.request_handler.process_message, payload)
+        finally:
+            self._pending -= 1
+        started = time.perf_counter()
+        writer.write(response)
+        await writer.drain()
+        self.request_handler.send_seconds.observe(time.perf_counter() - started)
+
+    async def _handle_framed_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        prefix: bytes
+    ) -> None:
+        """Обрабатывает поток кадрированных запросов на постоянном соединении"""
+        handler_config = self.request_handler.config
+        while self.running:
+            # Простой соединения в ожидании запроса не входит во время приема
+            if not prefix:
+                prefix = await self._read_with_timeout(reader.read(1))
+                if not prefix:
+                    return
+            started = time.perf_counter()
+            payload = await self._read_with_timeout(
+                read_message_async(reader, handler_config.max_message_size, prefix)
+            )
+            prefix = b""
+            if payload is None:
+                return
+            self.request_handler.receive_seconds.observe(time.perf_counter() - started)
+
+            if not self._admit():
+                # Соединение остается открытым: клиент может повторить запрос позже
+                for frame in iter_frames(BUSY_RESPONSE, handler_config.fragment_size):
+                    writer.writelines(frame)
+                await writer.drain()
+                continue
+
+            responses = self._iter_responses(payload)
+            try:
+                async for response in responses:
+                    started = time.perf_counter()
+                    for frame in iter_frames(response, handler_config.fragment_size):
+                        writer.writelines(frame)
+                        await writer.drain()
+                    self.request_handler.send_seconds.observe(time.perf_counter() - started)
+            finally:
+                await responses.aclose()
+
+    def _admit(self) -> bool:
+        """Принимает запрос к выполнению, если очередь ожидания не переполнена"""
+        if self._pending >= self.config.thread_count + self.config.queue_size:
+            self.admission_stats.record_rejected()
+            self.rejected_requests.inc()
+            return False
+
+        self._pending += 1
+        self.admission_stats.record_accepted(max(0, self._pending - self.config.thread_count))
+        return True
+
+    async def _run(self, function, *args):
+        """Выполняет функцию в пуле потоков проверки, учитывая время ожидания исполнителя"""
+        enqueued_at = time.monotonic()
+
+        def timed():
+            wait = time.monotonic() - enqueued_at
+            self.admission_stats.record_wait(wait)
+            self.queue_wait_seconds.observe(wait)
+            self.active_workers.inc()
+            try:
+                return function(*args)
+            finally:
+                self.active_workers.dec()
+
+        return await self._loop.run_in_executor(self.executor, timed)
+
+    async def _iter_responses(self, payload: bytes):
+        """
+        Выполняет запрос в пуле потоков проверки и отдает ответы по мере готовности
+
+        Каждый шаг генератора ответов (в том числе проверка очередного
+        файла потоковой команды) выполняется в пуле, а не в цикле событий.
+        Вызывающий код должен предварительно принять запрос через _admit.
+        """
+        responses = self.request_handler.iter_responses(payload)
+        try:
+            response = await self._run(next, responses, None)
+            while response is not None:
+                yield response
+                response = await self._loop.run_in_executor(self.executor, next, responses, None)
+        finally:
+            self._pending -= 1
+            await self._loop.run_in_executor(self.executor, responses.close)
+
+    async def _read_with_timeout(self, coroutine):
+        """Ожидает чтения не дольше таймаута простоя соединения"""
+        return await asyncio.wait_for(coroutine, self.request_handler.config.idle_timeout)
@@ -0,0 +1,192 @@
+import fnmatch
+import glob
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+@dataclass
+class TraversalOptions:
+    """Параметры обхода дерева каталогов"""
+    include: List[str] = field(default_factory=list)
+    exclude: List[str] = field(default_factory=list)
+    max_depth: Optional[int] = None
+    max_files: Optional[int] = None
+
+    @classmethod
+    def from_params(cls, params: Dict[str, Any]) -> "TraversalOptions":
+        """Создает параметры обхода из параметров запроса"""
+        max_depth = params.get("max_depth")
+        max_files = params.get("max_files")
+        return cls(
+            include=list(params.get("include") or []),
+            exclude=list(params.get("exclude") or []),
+            max_depth=int(max_depth) if max_depth is not None else None,
+            max_files=int(max_files) if max_files is not None else None
+        )
+
+def _matches(path: str, name: str, patterns: List[str]) -> bool:
+    """Проверяет путь по шаблонам: шаблоны с разделителем сравниваются с полным путем, остальные - с именем"""
+    for pattern in patterns:
+        target = path if os.sep in pattern else name
+        if fnmatch.fnmatch(target, pattern):
+            return True
+    return False
+
+class DirectoryScanner:
+    """
+    Серверный обход каталогов и параллельная проверка найденных файлов
+
+    Каталоги обходятся через os.scandir, записи каждого каталога
+    упорядочиваются по номеру inode, что на большинстве файловых систем
+    приближает порядок чтения к физическому расположению файлов. Проверки
+    выполняются в общем ограниченном пуле потоков, а результаты отдаются
+    по мере готовности. Пул отделен от пула обработки запросов (поток
+    запроса ждет результатов, а не проверяет сам), поэтому его размер
+    задается отдельно и в сумме с ним ограничивает число одновременных
+    проверок.
+    """
+
+    def __init__(self, max_workers: int) -> None:
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="DirectoryScan")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает размер пула и число выполняемых и ожидающих проверок"""
+        with self._lock:
+            return {"workers": self.max_workers, "running": self._running, "queued": self._queued}
+
+    def close(self) -> None:
+        """Останавливает пул потоков"""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def iter_files(self, paths: Iterable[str], options: TraversalOptions) -> Iterator[str]:
+        """
+        Перечисляет файлы по списку путей, каталогов и glob-шаблонов
+
+        Yields:
+            str: Пути к файлам, прошедшим фильтры
+        """
+        count = 0
+        for path in paths:
+            if glob.has_magic(path):
+                candidates: Iterable[str] = sorted(glob.iglob(path, recursive=True))
+            else:
+                candidates = (path,)
+
+            for candidate in candidates:
+                for file_path in self._iter_path(candidate, options):
+                    if options.max_files is not None and count >= options.max_files:
+                        return
+                    count += 1
+                    yield file_path
+
+    def _iter_path(self, path: str, options: TraversalOptions) -> Iterator[str]:
+        """Перечисляет файлы одного пути"""
+        if os.path.isdir(path):
+            yield from self._walk(path, 0, options)
+        elif self._accept_file(path, os.path.basename(path), options):
+            # Несуществующие файлы тоже отдаются, чтобы клиент получил по ним ошибку
+            yield path
+
+    def _walk(self, directory: str, depth: int, options: TraversalOptions) -> Iterator[str]:
+        """
+        Обходит каталог в глубину
+
+        Вместо рекурсии используется явный стек, поэтому глубина дерева не
+        ограничена пределом рекурсии интерпретатора. Порядок тот же: сначала
+        файлы каталога, затем его подкаталоги по порядку.
+        """
+        stack = [(directory, depth)]
+        while stack:
+            directory, depth = stack.pop()
+            try:
+                with os.scandir(directory) as iterator:
+                    entries = sorted(iterator, key=lambda entry: entry.inode())
+            except OSError:
+                continue
+
+            subdirectories = []
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not _matches(entry.path, entry.name, options.exclude):
+                            subdirectories.append(entry.path)
+                    elif entry.is_file() and self._accept_file(entry.path, entry.name, options):
+                        yield entry.path
+                except OSError:
+                    continue
+
+            if options.max_depth is not None and depth >= options.max_depth:
+                continue
+            stack.extend((subdirectory, depth + 1) for subdirectory in reversed(subdirectories))
+
+    @staticmethod
+    def _accept_file(path: str, name: str, options: TraversalOptions) -> bool:
+        """Применяет фильтры include/exclude к файлу"""
+        if options.include and not _matches(path, name, options.include):
+            return False
+        return not _matches(path, name, options.exclude)
+
+    def scan(
+        self,
+        file_paths: Iterable[str],
+        check: Callable[[str], Dict[str, Any]]
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Проверяет файлы в пуле потоков и отдает результаты по мере готовности
+
+        Число одновременно поставленных задач ограничено, поэтому обход
+        большого дерева не накапливает в памяти список всех файлов.
+
+        Yields:
+            tuple: Путь к файлу и результат проверки
+        """
+        window = self.max_workers * 2
+        pending: Dict[Future, str] = {}
+        file_iterator = iter(file_paths)
+        exhausted = False
+
+        try:
+            while True:
+                while not exhausted and len(pending) < window:
+                    file_path = next(file_iterator, None)
+                    if file_path is None:
+                        exhausted = True
+                        break
+                    with self._lock:
+                        self._queued += 1
+                    pending[self.executor.submit(self._run, check, file_path)] = file_path
+
+                if not pending:
+                    return
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {"error": str(e)}
+                    yield file_path, result
+        finally:
+            # Клиент отключился или генератор закрыт - снимаем оставшиеся задачи
+            for future in pending:
+                if future.cancel():
+                    with self._lock:
+                        self._queued -= 1
+
+    def _run(self, check: Callable[[str], Dict[str, Any]], file_path: str) -> Dict[str, Any]:
+        """Выполняет проверку файла в потоке пула с учетом в статистике"""
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return check(file_path)
+        finally:
+            with self._lock:
+                self._running -= 1
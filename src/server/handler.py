@@ -1,17 +1,90 @@
+import hashlib
 import json
 import logging
 import socket
-from typing import Dict, Any, Optional
+import threading
+import time
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple, Union
 from dataclasses import dataclass
-from .signature_checker import SignatureChecker
+from .signature_checker import MaskedSignature, ScanOptions, SignatureChecker, is_match, parse_signature
 from .quarantine import QuarantineManager
+from .signature_db import SignatureDatabase, ALL_SIGNATURES_SET
+from .directory_scanner import DirectoryScanner, TraversalOptions
+from .watch import WatchManager
+from .metrics import REGISTRY, MetricsRegistry
+from .protocol import (
+    DEFAULT_FRAGMENT_SIZE,
+    DEFAULT_MAX_MESSAGE_SIZE,
+    RESPONSE_FORMAT_BINARY,
+    RESPONSE_FORMAT_JSON,
+    RESPONSE_FORMATS,
+    ProtocolError,
+    encode_binary_offsets,
+    is_framed_connection,
+    read_message,
+    receive_json_document,
+    write_message
+)
+
+logger = logging.getLogger(__name__)
+
+# Ответ команды: один объект или поток объектов, завершающийся {"done": true, ...}
+Response = Union[Dict[str, Any], Iterator[Dict[str, Any]]]
+
+# Сериализованный ответ: байты JSON или список буферов двоичного ответа
+EncodedResponse = Union[bytes, List[Any]]
+
+# Команды, ответ которых может быть закодирован в двоичном формате
+BINARY_RESPONSE_COMMANDS = ("CheckLocalFile",)
+
+# Команды, учитываемые в метриках под своим именем; остальные - как "unknown"
+KNOWN_COMMANDS = (
+    "CheckLocalFile",
+    "CheckLocalFileMulti",
+    "CheckDirectory",
+    "CheckPaths",
+    "QuarantineLocalFile",
+    "CheckAndQuarantine",
+    "QuarantineBatch",
+    "QuarantineLookup",
+    "QuarantineRestore",
+    "WatchStart",
+    "WatchStop",
+    "WatchStatus",
+    "WatchResults",
+    "Stats"
+)
+
+# Параметры задания повторной проверки, от которых зависит результат проверки файла
+WATCH_VERSION_PARAMS = (
+    "signature",
+    "signature_id",
+    "signatures",
+    "signature_set",
+    "first_only",
+    "max_offsets",
+    "count_only",
+    "start",
+    "end",
+    "quarantine"
+)
 
 @dataclass
 class HandlerConfig:
     """Конфигурация обработчика запросов"""
     enable_logging: bool = False
-    buffer_size: int = 1024
+    buffer_size: int = 64 * 1024
     encoding: str = 'utf-8'
+    # Время ожидания следующего запроса на постоянном соединении, секунды
+    idle_timeout: Optional[float] = 60.0
+    # Сколько поток ждет следующего запроса, прежде чем отложить постоянное
+    # соединение до прихода данных без потока (активный клиент обычно
+    # присылает запрос раньше, и лишней передачи соединения не происходит)
+    request_linger: float = 0.005
+    # Максимальный размер сообщения (запроса) после сборки из кадров
+    max_message_size: int = DEFAULT_MAX_MESSAGE_SIZE
+    # Размер кадра, которыми отправляются большие ответы
+    fragment_size: int = DEFAULT_FRAGMENT_SIZE
 
 class RequestHandler:
     """Класс для обработки клиентских запросов"""
@@ -20,70 +93,509 @@ class RequestHandler:
         self, 
         signature_checker: SignatureChecker, 
         quarantine_manager: QuarantineManager,
-        enable_logging: bool = False
+        enable_logging: bool = False,
+        signature_db: Optional[SignatureDatabase] = None,
+        idle_timeout: Optional[float] = HandlerConfig.idle_timeout,
+        max_message_size: int = HandlerConfig.max_message_size,
+        directory_scanner: Optional[DirectoryScanner] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        watch_manager: Optional[WatchManager] = None
     ) -> None:
         self.signature_checker = signature_checker
         self.quarantine_manager = quarantine_manager
-        self.config = HandlerConfig(enable_logging)
+        self.signature_db = signature_db
+        self.directory_scanner = directory_scanner
+        self.watch_manager = watch_manager
+        self.metrics = metrics or REGISTRY
+        self.receive_seconds = self.stage_histogram("receive")
+        self.parse_seconds = self.stage_histogram("parse")
+        self.send_seconds = self.stage_histogram("send")
+        self.quarantine_seconds = self.stage_histogram("quarantine")
+        self._requests = {
+            command: self.metrics.counter("requests_total", "Requests by command", {"command": command})
+            for command in KNOWN_COMMANDS + ("unknown",)
+        }
+        self._error_responses = self.metrics.counter("error_responses_total", "Responses carrying an error")
+        # Источники статистики для команды Stats: имя раздела -> функция
+        self.stats_providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self.register_stats_provider("metrics", self.metrics.snapshot)
+        if watch_manager is not None:
+            self.register_stats_provider("watch", watch_manager.stats)
+        if directory_scanner is not None:
+            self.register_stats_provider("directory", directory_scanner.stats)
+        self.expired_requests = 0
+        self._expired_lock = threading.Lock()
+        self.config = HandlerConfig(
+            enable_logging,
+            idle_timeout=idle_timeout,
+            max_message_size=max_message_size
+        )
+    
+    def stage_histogram(self, stage: str):
+        """Возвращает гистограмму длительности этапа обработки запроса"""
+        return self.metrics.histogram("stage_seconds", "Request processing stage latency", {"stage": stage})
     
-    def handle_request(self, client_socket: socket.socket) -> None:
+    def handle_request(self, client_socket: socket.socket) -> bool:
         """
-        Обрабатывает запрос от клиента
+        Обрабатывает соединение клиента
+        
+        Кадрированное соединение остается открытым, и запросы на нем
+        обрабатываются по очереди, пока клиент его не закроет; ответы
+        отправляются в порядке поступления запросов, поэтому клиент может
+        отправлять запросы, не дожидаясь ответов. Одиночный JSON-запрос без
+        кадра обрабатывается как раньше - один запрос на соединение.
         
         Args:
             client_socket: Сокет клиента
+        
+        Returns:
+            bool: True, если кадрированное соединение ждет следующего запроса;
+                когда он придет, вызывающий код продолжает обработку через
+                serve_framed_requests
         """
+        client_socket.settimeout(self.config.idle_timeout)
+        try:
+            framed = is_framed_connection(client_socket)
+        except OSError as e:
+            if self.config.enable_logging:
+                logger.error("Error reading from client: %s", e)
+            return False
+        
+        if framed:
+            # Небольшие ответы на конвейерные запросы не должны задерживаться алгоритмом Нейгла
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return self.serve_framed_requests(client_socket)
+        
+        self._handle_single_request(client_socket)
+        return False
+    
+    def _handle_single_request(self, client_socket: socket.socket) -> None:
+        """Обрабатывает единственный запрос без кадрирования"""
         try:
             request_data = self._receive_request(client_socket)
             response = self._process_request(request_data)
-            self._send_response(client_socket, response)
+            if not isinstance(response, dict):
+                response = self._collect_stream(response)
+            with self.send_seconds.time():
+                self._send_response(client_socket, response)
             
             if self.config.enable_logging:
                 command = list(request_data.keys())[0] if request_data else "unknown"
-                logging.info(f"Handled command {command} with response {response}")
+                self._log_handled(command, response)
                 
         except Exception as e:
             error_response = {"error": str(e)}
             self._send_response(client_socket, error_response)
             if self.config.enable_logging:
-                logging.error(f"Error handling client: {str(e)}")
+                logger.error("Error handling client: %s", e)
+    
+    def serve_framed_requests(self, client_socket: socket.socket) -> bool:
+        """
+        Обрабатывает кадрированные запросы, уже поступившие на соединение
+        
+        Запросы обрабатываются, пока их данные есть в буфере сокета, поэтому
+        конвейер запросов выполняется без перерывов. Ожидание следующего
+        запроса не занимает поток: вызывающий код откладывает соединение до
+        прихода данных и снова вызывает этот метод.
+        
+        Args:
+            client_socket: Сокет клиента
+        
+        Returns:
+            bool: True, если соединение остается открытым в ожидании запросов
+        """
+        while True:
+            try:
+                # Простой соединения в ожидании запроса не входит во время приема
+                if not client_socket.recv(1, socket.MSG_PEEK):
+                    return False
+                started = time.perf_counter()
+                payload = read_message(client_socket, self.config.max_message_size)
+                self.receive_seconds.observe(time.perf_counter() - started)
+            except socket.timeout:
+                return False
+            except (ProtocolError, OSError) as e:
+                if self.config.enable_logging:
+                    logger.error("Error reading frame: %s", e)
+                return False
+            
+            if payload is None:
+                return False
+            
+            try:
+                for response in self.iter_responses(payload):
+                    started = time.perf_counter()
+                    write_message(client_socket, response, self.config.fragment_size)
+                    self.send_seconds.observe(time.perf_counter() - started)
+            except OSError as e:
+                if self.config.enable_logging:
+                    logger.error("Error sending response: %s", e)
+                return False
+            
+            if not self._wait_pending_data(client_socket, self.config.request_linger):
+                return True
+    
+    @staticmethod
+    def _wait_pending_data(client_socket: socket.socket, wait: float) -> bool:
+        """Проверяет, пришли ли за wait секунд данные или закрытие соединения"""
+        timeout = client_socket.gettimeout()
+        client_socket.settimeout(wait)
+        try:
+            client_socket.recv(1, socket.MSG_PEEK)
+        except (BlockingIOError, socket.timeout):
+            return False
+        except OSError:
+            # Ошибку сокета сообщит следующее чтение
+            pass
+        finally:
+            client_socket.settimeout(timeout)
+        return True
+    
+    def process_message(self, payload: bytes) -> bytes:
+        """
+        Выполняет запрос из тела сообщения и возвращает один сериализованный ответ
+        
+        Ответы потоковых команд собираются в один, как для клиентов без
+        кадрирования; ответ всегда в формате JSON.
+        """
+        response, _ = self._handle_payload(payload)
+        if not isinstance(response, dict):
+            response = self._collect_stream(response)
+        return self._encode_response(response)
+    
+    def iter_responses(self, payload: bytes) -> Iterator[EncodedResponse]:
+        """
+        Выполняет запрос из тела сообщения и отдает сериализованные ответы
+        
+        Для большинства команд отдается ровно один ответ; потоковые команды
+        (CheckDirectory, CheckPaths) отдают ответ на каждый файл по мере
+        готовности и завершающий ответ с "done": true. Используется также
+        серверами, которые сами управляют вводом-выводом соединения
+        (например, asyncio-сервером).
+        
+        Ответ на запрос с "format": "binary" отдается списком буферов
+        (см. encode_binary_offsets), который отправляется без склеивания.
+        """
+        response, response_format = self._handle_payload(payload)
+        if isinstance(response, dict):
+            yield self._encode_response(response, response_format)
+            return
+        
+        for message in response:
+            yield self._encode_response(message)
+    
+    def _handle_payload(self, payload: bytes) -> Tuple[Response, str]:
+        """
+        Разбирает тело кадра и выполняет запрос
+        
+        Returns:
+            tuple: Ответ и запрошенный формат ответа
+        """
+        try:
+            with self.parse_seconds.time():
+                request_data = json.loads(payload.decode(self.config.encoding))
+            response_format = self._response_format(request_data)
+            response = self._process_request(request_data)
+            
+            command = list(request_data.keys())[0] if request_data else "unknown"
+            if not isinstance(response, dict):
+                return self._guard_stream(command, response), RESPONSE_FORMAT_JSON
+            
+            if self.config.enable_logging:
+                self._log_handled(command, response)
+            return response, response_format
+        
+        except Exception as e:
+            if self.config.enable_logging:
+                logger.error("Error handling client: %s", e)
+            return {"error": str(e)}, RESPONSE_FORMAT_JSON
+    
+    @staticmethod
+    def _response_format(request_data: Dict[str, Any]) -> str:
+        """
+        Определяет формат ответа по параметру "format" запроса
+        
+        Двоичный формат поддерживают только команды из
+        BINARY_RESPONSE_COMMANDS; остальным команды отвечают в JSON, поэтому
+        клиент, запросивший двоичный формат, должен уметь разобрать оба.
+        """
+        if not request_data:
+            return RESPONSE_FORMAT_JSON
+        command, params = next(iter(request_data.items()))
+        response_format = params.get("format", RESPONSE_FORMAT_JSON) if isinstance(params, dict) else RESPONSE_FORMAT_JSON
+        if response_format not in RESPONSE_FORMATS:
+            raise ValueError(f"Unsupported response format: {response_format}")
+        return response_format if command in BINARY_RESPONSE_COMMANDS else RESPONSE_FORMAT_JSON
+    
+    def _guard_stream(self, command: str, stream: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Завершает поток ответов сообщением об ошибке, если выполнение прервалось"""
+        try:
+            for message in stream:
+                if self.config.enable_logging and message.get("done"):
+                    self._log_handled(command, message)
+                yield message
+        except Exception as e:
+            if self.config.enable_logging:
+                logger.error("Error handling client: %s", e)
+            yield {"error": str(e), "done": True}
+    
+    @staticmethod
+    def _log_handled(command: str, response: Dict[str, Any]) -> None:
+        """
+        Записывает в журнал выполненную команду
+        
+        Ответ сокращается при постановке записи в очередь журнала, а
+        сериализуется в потоке записи, а не в рабочем потоке; успешные
+        ответы участвуют в выборке (--log-sample-rate).
+        """
+        logger.debug(
+            "Handled command %s",
+            command,
+            # Ответы с ошибкой в выборке не участвуют и записываются всегда
+            extra={"fields": {"command": command, "response": response}, "sampled": "error" not in response}
+        )
+    
+    @staticmethod
+    def _collect_stream(stream: Iterator[Dict[str, Any]]) -> Dict[str, Any]:
+        """Собирает поток ответов в один ответ для клиентов без кадрирования"""
+        results = []
+        for message in stream:
+            if message.get("done"):
+                summary = {key: value for key, value in message.items() if key != "done"}
+                return {"results": results, **summary}
+            results.append(message)
+        return {"results": results}
     
     def _receive_request(self, client_socket: socket.socket) -> Dict[str, Any]:
         """Получает и парсит запрос от клиента"""
-        request_bytes = client_socket.recv(self.config.buffer_size)
-        request_str = request_bytes.decode(self.config.encoding)
-        return json.loads(request_str)
+        with self.receive_seconds.time():
+            request_bytes = receive_json_document(
+                client_socket,
+                self.config.max_message_size,
+                self.config.buffer_size
+            )
+        with self.parse_seconds.time():
+            request_str = request_bytes.decode(self.config.encoding)
+            return json.loads(request_str)
     
-    def _process_request(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _process_request(self, request_data: Dict[str, Any]) -> Response:
         """Обрабатывает запрос и возвращает ответ"""
         if not request_data:
             return {"error": "Empty request"}
         
         command = list(request_data.keys())[0]
         params = request_data[command]
+        self._requests.get(command, self._requests["unknown"]).inc()
+        
+        # Запрос, срок которого истек, пока он ждал в очереди, не выполняем
+        if self._is_expired(params):
+            with self._expired_lock:
+                self.expired_requests += 1
+            return {"error": "Deadline exceeded", "expired": True}
         
         if command == "CheckLocalFile":
             return self._handle_check_file(params)
+        elif command == "CheckLocalFileMulti":
+            return self._handle_check_file_multi(params)
+        elif command in ("CheckDirectory", "CheckPaths"):
+            return self._handle_check_paths(params)
         elif command == "QuarantineLocalFile":
             return self._handle_quarantine_file(params)
+        elif command == "CheckAndQuarantine":
+            return self._handle_check_and_quarantine(params)
+        elif command == "QuarantineBatch":
+            return self._handle_quarantine_batch(params)
+        elif command == "QuarantineLookup":
+            return self._handle_quarantine_lookup(params)
+        elif command == "QuarantineRestore":
+            return self._handle_quarantine_restore(params)
+        elif command == "WatchStart":
+            return self._handle_watch_start(params)
+        elif command == "WatchStop":
+            return self._handle_watch_stop(params)
+        elif command == "WatchStatus":
+            return self._handle_watch_status(params)
+        elif command == "WatchResults":
+            return self._handle_watch_results(params)
+        elif command == "Stats":
+            return self._handle_stats(params)
         else:
             return {"error": f"Unknown command: {command}"}
     
+    def register_stats_provider(self, name: str, provider: Callable[[], Dict[str, Any]]) -> None:
+        """Добавляет раздел в ответ команды Stats"""
+        self.stats_providers[name] = provider
+    
+    @staticmethod
+    def _is_expired(params: Any) -> bool:
+        """Проверяет срок запроса: "deadline" - время Unix в секундах"""
+        if not isinstance(params, dict):
+            return False
+        deadline = params.get("deadline")
+        return deadline is not None and time.time() > float(deadline)
+    
     def _send_response(self, client_socket: socket.socket, response: Dict[str, Any]) -> None:
         """Отправляет ответ клиенту"""
+        client_socket.sendall(self._encode_response(response))
+    
+    def _encode_response(self, response: Dict[str, Any], response_format: str = RESPONSE_FORMAT_JSON) -> EncodedResponse:
+        """Сериализует ответ"""
+        if "error" in response:
+            self._error_responses.inc()
+        elif response_format == RESPONSE_FORMAT_BINARY and "offsets" in response:
+            return encode_binary_offsets(response["offsets"], response.get("truncated", False))
         response_str = json.dumps(response)
-        response_bytes = response_str.encode(self.config.encoding)
-        client_socket.sendall(response_bytes)
+        return response_str.encode(self.config.encoding)
     
     def _handle_check_file(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Обрабатывает команду проверки файла"""
         file_path = params.get("file_path")
-        signature = params.get("signature", "")
         
         if not file_path:
             return {"error": "Missing file_path parameter"}
         
-        return self.signature_checker.check_file_signature(file_path, signature)
+        try:
+            signature = self._resolve_signature(params)
+            options = ScanOptions.from_params(params)
+        except (TypeError, ValueError) as e:
+            return {"error": str(e)}
+        
+        return self.signature_checker.check_file_signature(file_path, signature, options)
+    
+    def _handle_check_file_multi(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Обрабатывает команду проверки файла на множество сигнатур"""
+        file_path = params.get("file_path")
+        
+        if not file_path:
+            return {"error": "Missing file_path parameter"}
+        
+        try:
+            signatures = self._resolve_signatures(params)
+            options = ScanOptions.from_params(params)
+        except (TypeError, ValueError) as e:
+            return {"error": str(e)}
+        
+        return self.signature_checker.check_file_signatures(file_path, signatures, options)
+    
+    def _handle_check_paths(self, params: Dict[str, Any]) -> Response:
+        """
+        Обрабатывает команды проверки каталогов и списков путей
+        
+        Параметры: "root" или "paths" (пути, каталоги и glob-шаблоны),
+        "include"/"exclude" (шаблоны fnmatch), "max_depth", "max_files" и
+        сигнатура в том же виде, что у CheckLocalFile или CheckLocalFileMulti.
+        """
+        if self.directory_scanner is None:
+            return {"error": "Directory scanning is not enabled"}
+        
+        paths = params.get("paths") or []
+        if isinstance(paths, str):
+            paths = [paths]
+        if params.get("root"):
+            paths = [params["root"], *paths]
+        if not paths:
+            return {"error": "Missing root or paths parameter"}
+        
+        try:
+            check = self._make_file_check(params)
+            options = TraversalOptions.from_params(params)
+        except (TypeError, ValueError) as e:
+            return {"error": str(e)}
+        
+        return self._stream_check_paths(paths, options, check)
+    
+    def _stream_check_paths(
+        self,
+        paths: list,
+        options: TraversalOptions,
+        check: Callable[[str], Dict[str, Any]]
+    ) -> Iterator[Dict[str, Any]]:
+        """Отдает результаты проверки файлов по мере готовности и итоговую сводку"""
+        files = matched = errors = 0
+        file_paths = self.directory_scanner.iter_files(paths, options)
+        for file_path, result in self.directory_scanner.scan(file_paths, check):
+            files += 1
+            if "error" in result:
+                errors += 1
+            elif is_match(result):
+                matched += 1
+            yield {"file_path": file_path, **result}
+        
+        yield {"done": True, "files": files, "matched": matched, "errors": errors}
+    
+    def _make_file_check(self, params: Dict[str, Any], quarantine: bool = False) -> Callable[[str], Dict[str, Any]]:
+        """
+        Строит функцию проверки одного файла по параметрам сигнатуры и ограничениям из запроса
+        
+        С quarantine=True файл с совпадением перемещается в карантин так же,
+        как в CheckAndQuarantine, а результат содержит поле "quarantined".
+        """
+        options = ScanOptions.from_params(params)
+        if "signatures" in params or "signature_set" in params:
+            signatures = self.signature_checker.compile_signatures(self._resolve_signatures(params))
+            if quarantine:
+                return lambda file_path: self._check_and_quarantine_path(file_path, signatures, options)
+            return lambda file_path: self.signature_checker.check_file_signatures(file_path, signatures, options)
+        
+        signature = self._resolve_signature(params)
+        if isinstance(signature, str):
+            signature = parse_signature(signature)
+        if quarantine:
+            return lambda file_path: self._check_and_quarantine_path(file_path, signature, options)
+        return lambda file_path: self.signature_checker.check_file_signature(file_path, signature, options)
+    
+    def make_watch_check(self, params: Dict[str, Any]) -> Tuple[Callable[[str], Dict[str, Any]], str]:
+        """
+        Строит функцию проверки файлов для задания повторной проверки
+        
+        Версия сигнатур включает параметры, влияющие на результат, и версию
+        базы, если сигнатуры берутся из нее: после перечитывания базы или
+        изменения задания все файлы задания проверяются заново.
+        
+        Returns:
+            Tuple: Функция проверки одного файла и версия сигнатур
+        
+        Raises:
+            ValueError: Некорректные параметры сигнатуры
+        """
+        versioned = {key: params[key] for key in WATCH_VERSION_PARAMS if key in params}
+        uses_database = "signature_id" in params or (
+            ("signatures" in params or "signature_set" in params) and not params.get("signatures")
+        )
+        if uses_database and self.signature_db is not None:
+            # Версия читается до разрешения сигнатур: при перечитывании базы
+            # между ними файлы будут лишний раз проверены, но не пропущены
+            versioned["database"] = self.signature_db.index.version
+        version = hashlib.sha256(json.dumps(versioned, sort_keys=True).encode()).hexdigest()[:16]
+        return self._make_file_check(params, quarantine=bool(params.get("quarantine"))), version
+    
+    def _resolve_signature(self, params: Dict[str, Any]) -> Union[str, bytes, MaskedSignature]:
+        """Возвращает сигнатуру из запроса: hex-строку или сигнатуру из базы по signature_id"""
+        signature_id = params.get("signature_id")
+        if signature_id is None:
+            return params.get("signature", "")
+        
+        if self.signature_db is None:
+            raise ValueError("Signature database is not loaded")
+        try:
+            return self.signature_db.index.get_signature(str(signature_id))
+        except KeyError as e:
+            raise ValueError(e.args[0]) from None
+    
+    def _resolve_signatures(self, params: Dict[str, Any]) -> Any:
+        """Возвращает набор сигнатур из запроса или предкомпилированный набор из базы"""
+        signatures = params.get("signatures")
+        if signatures:
+            return signatures
+        
+        # Без явного списка используется предкомпилированный набор из базы
+        if self.signature_db is None:
+            raise ValueError("Missing signatures parameter")
+        set_name = params.get("signature_set", ALL_SIGNATURES_SET)
+        try:
+            return self.signature_db.index.get_matcher(set_name)
+        except KeyError as e:
+            raise ValueError(e.args[0]) from None
     
     def _handle_quarantine_file(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Обрабатывает команду карантина файла"""
@@ -92,4 +604,178 @@ class RequestHandler:
         if not file_path:
             return {"error": "Missing file_path parameter"}
         
-        return self.quarantine_manager.quarantine_file(file_path)
+        with self.quarantine_seconds.time():
+            return self.quarantine_manager.quarantine_file(file_path)
+    
+    def _handle_check_and_quarantine(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Обрабатывает команду проверки файла с карантином при совпадении
+        
+        Файл открывается один раз: по этому дескриптору он сканируется и
+        (при совпадении) перемещается в карантин, поэтому в карантин
+        попадает ровно тот файл, который был проверен. Сигнатура задается
+        так же, как в CheckLocalFile или CheckLocalFileMulti.
+        """
+        file_path = params.get("file_path")
+        
+        if not file_path:
+            return {"error": "Missing file_path parameter"}
+        
+        try:
+            if "signatures" in params or "signature_set" in params:
+                signatures = self._resolve_signatures(params)
+            else:
+                signatures = self._resolve_signature(params)
+            options = ScanOptions.from_params(params)
+        except (TypeError, ValueError) as e:
+            return {"error": str(e)}
+        
+        return self._check_and_quarantine_path(file_path, signatures, options)
+    
+    def _check_and_quarantine_path(self, file_path: str, signatures: Any, options: ScanOptions) -> Dict[str, Any]:
+        """Проверяет файл и перемещает его в карантин по тому же дескриптору при совпадении"""
+        try:
+            file = open(file_path, "rb")
+        except FileNotFoundError:
+            return {"error": "File not found"}
+        except OSError as e:
+            return {"error": f"Error opening file: {str(e)}"}
+        
+        with file:
+            result = self.signature_checker.check_open_file(file, signatures, options)
+            if "error" in result or not is_match(result):
+                return {**result, "quarantined": False}
+            
+            with self.quarantine_seconds.time():
+                quarantine_result = self.quarantine_manager.quarantine_open_file(file, file_path)
+        
+        return {**result, "quarantined": "error" not in quarantine_result, **quarantine_result}
+    
+    def _handle_quarantine_batch(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Обрабатывает команду карантина нескольких файлов за один запрос"""
+        file_paths = params.get("file_paths")
+        
+        if not file_paths or not isinstance(file_paths, list):
+            return {"error": "Missing file_paths parameter"}
+        
+        with self.quarantine_seconds.time():
+            return self.quarantine_manager.quarantine_files(file_paths)
+    
+    def _handle_quarantine_lookup(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Обрабатывает команду поиска в карантине по id, sha256 или исходному пути"""
+        entries = self.quarantine_manager.lookup(
+            quarantine_id=params.get("id"),
+            sha256=params.get("sha256"),
+            original_path=params.get("original_path")
+        )
+        return {"entries": entries}
+    
+    def _handle_quarantine_restore(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Обрабатывает команду восстановления файла из карантина"""
+        quarantine_id = params.get("id")
+        
+        if not quarantine_id:
+            return {"error": "Missing id parameter"}
+        
+        return self.quarantine_manager.restore_file(
+            quarantine_id,
+            restore_path=params.get("restore_path"),
+            overwrite=bool(params.get("overwrite", False))
+        )
+    
+    def _handle_watch_start(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Обрабатывает команду создания (замены) задания повторной проверки
+        
+        Параметры: "name", пути и фильтры как у CheckPaths, сигнатура как у
+        CheckLocalFile или CheckLocalFileMulti, "interval" - период прохода
+        в секундах и "quarantine" - перемещать файлы с совпадениями в карантин.
+        """
+        if self.watch_manager is None:
+            return {"error": "Watch mode is not enabled"}
+        
+        name = params.get("name")
+        if not name or not isinstance(name, str):
+            return {"error": "Missing name parameter"}
+        if not params.get("root") and not params.get("paths"):
+            return {"error": "Missing root or paths parameter"}
+        
+        try:
+            interval = float(params.get("interval", self.watch_manager.config.default_interval))
+            if interval <= 0:
+                raise ValueError("interval must be positive")
+            TraversalOptions.from_params(params)
+            _, version = self.make_watch_check(params)
+        except (TypeError, ValueError) as e:
+            return {"error": str(e)}
+        
+        job_params = {key: value for key, value in params.items() if key not in ("name", "interval", "deadline")}
+        self.watch_manager.add_job(name, job_params, interval)
+        return {"name": name, "status": "started", "interval": interval, "version": version}
+    
+    def _handle_watch_stop(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Обрабатывает команду удаления задания повторной проверки вместе с его индексом"""
+        if self.watch_manager is None:
+            return {"error": "Watch mode is not enabled"}
+        
+        name = params.get("name")
+        if not name:
+            return {"error": "Missing name parameter"}
+        if not self.watch_manager.remove_job(name):
+            return {"error": f"Unknown watch job: {name}"}
+        return {"name": name, "status": "stopped"}
+    
+    def _handle_watch_status(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Обрабатывает команду состояния заданий повторной проверки (всех или "name")"""
+        if self.watch_manager is None:
+            return {"error": "Watch mode is not enabled"}
+        
+        name = params.get("name")
+        jobs = self.watch_manager.status(name)
+        if name is not None and not jobs:
+            return {"error": f"Unknown watch job: {name}"}
+        return {"jobs": jobs}
+    
+    def _handle_watch_results(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Обрабатывает команду получения результатов задания из индекса
+        
+        По умолчанию возвращаются только файлы с совпадениями; "all": true -
+        все проверенные файлы. Постраничный вывод - "limit" и "offset".
+        """
+        if self.watch_manager is None:
+            return {"error": "Watch mode is not enabled"}
+        
+        name = params.get("name")
+        if not name:
+            return {"error": "Missing name parameter"}
+        if not self.watch_manager.index.job_exists(name):
+            return {"error": f"Unknown watch job: {name}"}
+        
+        try:
+            limit = int(params.get("limit", 1000))
+            offset = int(params.get("offset", 0))
+        except (TypeError, ValueError) as e:
+            return {"error": str(e)}
+        
+        results = self.watch_manager.index.results(name, not params.get("all", False), limit, offset)
+        return {"name": name, "results": results}
+    
+    def _handle_stats(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Обрабатывает команду получения статистики сервера"""
+        return self.collect_stats()
+    
+    def collect_stats(self) -> Dict[str, Any]:
+        """Собирает статистику сервера: кэш, очередь, метрики и другие разделы"""
+        stats: Dict[str, Any] = {}
+        
+        result_cache = self.signature_checker.result_cache
+        if result_cache is not None:
+            stats["cache"] = result_cache.stats()
+        
+        for name, provider in self.stats_providers.items():
+            stats[name] = provider()
+        with self._expired_lock:
+            stats.setdefault("queue", {})["expired"] = self.expired_requests
+        
+        return stats
@@ -0,0 +1,189 @@
+import json
+import logging
+import random
+import sys
+from dataclasses import dataclass
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import Full, Queue
+from typing import Any, List, Optional
+from .metrics import REGISTRY, MetricsRegistry
+
+# Логгер пакета: модули сервера пишут в дочерние логгеры server.*
+LOGGER_NAME = "server"
+
+@dataclass
+class LoggingConfig:
+    """Конфигурация журналирования"""
+    # Путь к файлу журнала в формате JSON lines; None - без файла
+    file_path: Optional[str] = None
+    # Размер файла, после которого он ротируется, и число хранимых копий
+    max_bytes: int = 10 * 1024 * 1024
+    backup_count: int = 5
+    # Доля записываемых сообщений об успешных запросах (ошибки пишутся всегда)
+    sample_rate: float = 1.0
+    # Ограничения на размер полей записи: длина строки и число элементов списка
+    max_field_length: int = 1024
+    max_items: int = 20
+    # Вывод сообщений о запуске, соединениях и остановке в stdout
+    console: bool = True
+    # Максимальное число записей, ожидающих потока записи; лишние отбрасываются
+    queue_size: int = 10000
+
+def truncate(value: Any, max_length: int, max_items: int) -> Any:
+    """
+    Сокращает значение для журнала: длинные строки обрезаются, у длинных
+    списков и словарей остаются первые max_items элементов
+    """
+    if isinstance(value, str):
+        if len(value) > max_length:
+            return f"{value[:max_length]}... ({len(value)} chars)"
+        return value
+    if isinstance(value, dict):
+        items = list(value.items())
+        result = {str(key): truncate(item, max_length, max_items) for key, item in items[:max_items]}
+        if len(items) > max_items:
+            result["..."] = f"{len(items) - max_items} more keys"
+        return result
+    if isinstance(value, (list, tuple)):
+        result = [truncate(item, max_length, max_items) for item in value[:max_items]]
+        if len(value) > max_items:
+            result.append(f"... ({len(value)} items)")
+        return result
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    return truncate(str(value), max_length, max_items)
+
+class JsonLineFormatter(logging.Formatter):
+    """
+    Форматирует запись одной строкой JSON
+
+    Дополнительные поля передаются через extra={"fields": {...}} и
+    сокращаются так же, как сообщение.
+    """
+
+    def __init__(self, max_field_length: int, max_items: int) -> None:
+        super().__init__()
+        self.max_field_length = max_field_length
+        self.max_items = max_items
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": truncate(record.getMessage(), self.max_field_length, self.max_items)
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            # Поля записей из очереди уже сокращены NonBlockingQueueHandler
+            truncated = getattr(record, "fields_truncated", False)
+            for key, value in fields.items():
+                entry[key] = value if truncated else truncate(value, self.max_field_length, self.max_items)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает долю записей, отмеченных extra={"sampled": True}
+
+    Записи уровня WARNING и выше, а также неотмеченные записи проходят всегда.
+    """
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1.0 or record.levelno >= logging.WARNING:
+            return True
+        if not getattr(record, "sampled", False):
+            return True
+        return random.random() < self.rate
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Передает записи потоку записи через ограниченную очередь
+
+    Рабочий поток только кладет запись в очередь: форматирование, JSON и
+    запись в файл выполняются в потоке QueueListener. Если очередь
+    переполнена (диск не успевает), запись отбрасывается, а не блокирует
+    обработку запроса. Дополнительные поля сокращаются до постановки в
+    очередь: иначе каждая ожидающая запись удерживала бы в памяти весь
+    ответ (например, длинный список офсетов).
+    """
+
+    def __init__(self, queue: Queue, metrics: MetricsRegistry, max_field_length: int, max_items: int) -> None:
+        super().__init__(queue)
+        self.max_field_length = max_field_length
+        self.max_items = max_items
+        self.dropped = metrics.counter("log_dropped_total", "Log records dropped because the log queue was full")
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Стандартная реализация форматирует сообщение в вызывающем потоке;
+        # аргументы записей не изменяются после логирования, поэтому
+        # форматирование откладывается до потока записи. Сокращение полей
+        # просматривает только первые max_items элементов и дешевле JSON
+        fields = getattr(record, "fields", None)
+        if fields:
+            record.fields = {
+                key: truncate(value, self.max_field_length, self.max_items) for key, value in fields.items()
+            }
+            record.fields_truncated = True
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped.inc()
+
+def setup_logging(config: LoggingConfig, metrics: Optional[MetricsRegistry] = None) -> Optional[QueueListener]:
+    """
+    Настраивает журналирование сервера через очередь и фоновый поток записи
+
+    Returns:
+        QueueListener | None: Запущенный поток записи (остановить при
+            завершении, чтобы сбросить очередь) или None, если журнал выключен
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    handlers: List[logging.Handler] = []
+    if config.file_path:
+        file_handler = RotatingFileHandler(
+            config.file_path,
+            maxBytes=config.max_bytes,
+            backupCount=config.backup_count,
+            encoding="utf-8"
+        )
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(JsonLineFormatter(config.max_field_length, config.max_items))
+        handlers.append(file_handler)
+    if config.console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setLevel(logging.INFO)
+        console_handler.setFormatter(logging.Formatter("%(message)s"))
+        handlers.append(console_handler)
+
+    if not handlers:
+        # Записи отсекаются проверкой уровня еще до создания
+        logger.setLevel(logging.CRITICAL + 1)
+        return None
+
+    logger.setLevel(logging.DEBUG if config.file_path else logging.INFO)
+    queue_handler = NonBlockingQueueHandler(
+        Queue(maxsize=config.queue_size),
+        metrics or REGISTRY,
+        config.max_field_length,
+        config.max_items
+    )
+    queue_handler.addFilter(SamplingFilter(config.sample_rate))
+    logger.addHandler(queue_handler)
+
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
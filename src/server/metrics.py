@@ -0,0 +1,435 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Границы корзин гистограмм задержек, секунды
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+METRIC_PREFIX = "signature_crawler_"
+
+LabelsKey = Tuple[Tuple[str, str], ...]
+
+def _labels_key(labels: Optional[Dict[str, str]]) -> LabelsKey:
+    return tuple(sorted((labels or {}).items()))
+
+def _format_labels(labels: LabelsKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in items) + "}"
+
+class Counter:
+    """Монотонно растущий счетчик"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+class Gauge:
+    """Значение, которое может расти и уменьшаться"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        # Последняя корзина - +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Измеряет длительность блока"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def quantile(self, q: float) -> float:
+        """Оценивает квантиль по верхним границам корзин"""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+        return quantile_from_buckets(self.buckets, counts, total, q)
+
+    def merge(self, counts: List[int], total_sum: float, total: int) -> None:
+        """Добавляет наблюдения другой гистограммы с теми же корзинами"""
+        with self._lock:
+            for index, count in enumerate(counts):
+                self.counts[index] += count
+            self.sum += total_sum
+            self.count += total
+
+def quantile_from_buckets(buckets: Tuple[float, ...], counts: List[int], total: int, q: float) -> float:
+    """Оценивает квантиль по счетчикам корзин (верхняя граница корзины)"""
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for index, count in enumerate(counts):
+        seen += count
+        if seen >= rank:
+            return buckets[index] if index < len(buckets) else buckets[-1]
+    return buckets[-1]
+
+class RateMeter:
+    """Скорость события за скользящее окно из посекундных корзин"""
+
+    def __init__(self, window: int = 60) -> None:
+        self._lock = threading.Lock()
+        self.window = window
+        self._buckets = [0.0] * window
+        self._seconds = [0] * window
+
+    def add(self, amount: float) -> None:
+        now = int(time.monotonic())
+        index = now % self.window
+        with self._lock:
+            if self._seconds[index] != now:
+                self._seconds[index] = now
+                self._buckets[index] = 0.0
+            self._buckets[index] += amount
+
+    def rate(self) -> float:
+        """Среднее значение в секунду за окно"""
+        now = int(time.monotonic())
+        with self._lock:
+            total = sum(
+                amount for amount, second in zip(self._buckets, self._seconds)
+                if now - self.window < second <= now
+            )
+        return total / self.window
+
+class FixedRate:
+    """Скорость, известная заранее (сумма скоростей нескольких процессов)"""
+
+    def __init__(self, value: float = 0.0) -> None:
+        self.value = value
+
+    def rate(self) -> float:
+        return self.value
+
+@dataclass
+class _Family:
+    """Семейство метрик одного имени с разными метками"""
+    kind: str
+    help: str
+    children: Dict[LabelsKey, Any]
+
+class MetricsRegistry:
+    """
+    Реестр метрик сервера
+
+    Метрики создаются один раз (обычно в конструкторах компонентов), а на
+    горячем пути выполняется только изменение значения под коротким
+    локальным замком метрики, поэтому сбор можно не отключать в работе.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._families: Dict[str, _Family] = {}
+        self._rates: Dict[str, RateMeter] = {}
+
+    def counter(self, name: str, help: str = "", labels: Optional[Dict[str, str]] = None) -> Counter:
+        return self._get(name, "counter", help, labels, Counter)
+
+    def gauge(self, name: str, help: str = "", labels: Optional[Dict[str, str]] = None) -> Gauge:
+        return self._get(name, "gauge", help, labels, Gauge)
+
+    def histogram(self, name: str, help: str = "", labels: Optional[Dict[str, str]] = None) -> Histogram:
+        return self._get(name, "histogram", help, labels, Histogram)
+
+    def rate(self, name: str) -> RateMeter:
+        """Возвращает измеритель скорости (только для Stats)"""
+        with self._lock:
+            meter = self._rates.get(name)
+            if meter is None:
+                meter = self._rates[name] = RateMeter()
+            return meter
+
+    def _get(self, name: str, kind: str, help: str, labels: Optional[Dict[str, str]], factory) -> Any:
+        key = _labels_key(labels)
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = _Family(kind, help, {})
+            elif family.kind != kind:
+                raise ValueError(f"Metric {name} is already registered as {family.kind}")
+
+            metric = family.children.get(key)
+            if metric is None:
+                metric = family.children[key] = factory()
+            return metric
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Возвращает значения всех метрик в виде, пригодном для JSON
+
+        Гистограммы представлены числом наблюдений, суммой, средним и
+        оценками p50/p99 в секундах.
+        """
+        with self._lock:
+            families = list(self._families.items())
+            rates = list(self._rates.items())
+
+        result: Dict[str, Any] = {}
+        for name, family in families:
+            for labels, metric in list(family.children.items()):
+                key = name + _format_labels(labels)
+                if family.kind == "histogram":
+                    result[key] = {
+                        "count": metric.count,
+                        "sum": metric.sum,
+                        "avg": metric.sum / metric.count if metric.count else 0.0,
+                        "p50": metric.quantile(0.5),
+                        "p99": metric.quantile(0.99)
+                    }
+                else:
+                    result[key] = metric.value
+        for name, meter in rates:
+            result[f"{name}_per_second"] = meter.rate()
+        return result
+
+    def dump(self) -> Dict[str, Any]:
+        """
+        Возвращает состояние всех метрик для объединения с метриками других
+        процессов (в отличие от snapshot, гистограммы передаются корзинами)
+        """
+        with self._lock:
+            families = list(self._families.items())
+            rates = list(self._rates.items())
+
+        result: Dict[str, Any] = {"families": {}, "rates": {}}
+        for name, family in families:
+            children = []
+            for labels, metric in list(family.children.items()):
+                if family.kind == "histogram":
+                    with metric._lock:
+                        state = {"counts": list(metric.counts), "sum": metric.sum, "count": metric.count}
+                else:
+                    state = metric.value
+                children.append([list(labels), state])
+            result["families"][name] = {"kind": family.kind, "help": family.help, "children": children}
+        for name, meter in rates:
+            result["rates"][name] = meter.rate()
+        return result
+
+    def merge(self, dump: Dict[str, Any]) -> None:
+        """
+        Добавляет к метрикам реестра состояние из dump другого процесса
+
+        Счетчики и значения суммируются, у гистограмм складываются корзины,
+        скорости суммируются.
+        """
+        for name, family in dump.get("families", {}).items():
+            for labels, state in family["children"]:
+                labels = dict(labels)
+                if family["kind"] == "histogram":
+                    self.histogram(name, family["help"], labels).merge(state["counts"], state["sum"], state["count"])
+                elif family["kind"] == "counter":
+                    self.counter(name, family["help"], labels).inc(state)
+                else:
+                    self.gauge(name, family["help"], labels).inc(state)
+        with self._lock:
+            for name, value in dump.get("rates", {}).items():
+                meter = self._rates.get(name)
+                self._rates[name] = FixedRate(value + (meter.rate() if meter is not None else 0.0))
+
+    def render_prometheus(self) -> str:
+        """Возвращает метрики в текстовом формате Prometheus"""
+        with self._lock:
+            families = list(self._families.items())
+
+        lines = []
+        for name, family in families:
+            full_name = METRIC_PREFIX + name
+            if family.help:
+                lines.append(f"# HELP {full_name} {family.help}")
+            lines.append(f"# TYPE {full_name} {family.kind}")
+            for labels, metric in list(family.children.items()):
+                if family.kind == "histogram":
+                    with metric._lock:
+                        counts = list(metric.counts)
+                        total_sum = metric.sum
+                        total = metric.count
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets + (float("inf"),), counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{full_name}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+                    lines.append(f"{full_name}_sum{_format_labels(labels)} {total_sum}")
+                    lines.append(f"{full_name}_count{_format_labels(labels)} {total}")
+                else:
+                    lines.append(f"{full_name}{_format_labels(labels)} {metric.value}")
+        return "\n".join(lines) + "\n"
+
+# Реестр по умолчанию, общий для компонентов сервера
+REGISTRY = MetricsRegistry()
+
+# Период записи метрик процесса в каталог метрик, секунды
+SNAPSHOT_INTERVAL = 1.0
+
+class MetricsSnapshotWriter:
+    """
+    Периодически записывает метрики процесса в каталог метрик
+
+    Каждый процесс сервера пишет свой файл <pid>.json (атомарно, через
+    временный файл и rename), а aggregate_metrics объединяет файлы всех
+    процессов. Файл остается после завершения процесса, чтобы его счетчики
+    не пропадали из суммы.
+    """
+
+    def __init__(self, registry: MetricsRegistry, directory: str, interval: float = SNAPSHOT_INTERVAL) -> None:
+        self.registry = registry
+        self.path = snapshot_path(directory, os.getpid())
+        self.interval = interval
+        self._stop = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Запускает запись в фоновом потоке"""
+        self.write()
+        self.thread = threading.Thread(target=self._run, name="MetricsSnapshot", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Останавливает запись, сохранив последние значения"""
+        self._stop.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.write()
+
+    def write(self) -> None:
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(self.registry.dump(), file)
+        os.replace(temporary_path, self.path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                # Каталог метрик недоступен: следующая попытка через интервал
+                pass
+
+def snapshot_path(directory: str, pid: int) -> str:
+    return os.path.join(directory, f"{pid}.json")
+
+def aggregate_metrics(directory: str, live: Optional[MetricsRegistry] = None) -> MetricsRegistry:
+    """
+    Объединяет метрики всех процессов из каталога метрик
+
+    Args:
+        directory: Каталог, в который пишут MetricsSnapshotWriter процессов
+        live: Реестр текущего процесса; его текущие значения используются
+            вместо записанного им файла
+
+    Returns:
+        MetricsRegistry: Новый реестр с суммой метрик
+    """
+    result = MetricsRegistry()
+    own_path = snapshot_path(directory, os.getpid()) if live is not None else None
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not name.endswith(".json") or path == own_path:
+            continue
+        try:
+            with open(path) as file:
+                result.merge(json.load(file))
+        except (OSError, ValueError):
+            # Файл процесса, который еще не успел записать метрики
+            continue
+    if live is not None:
+        result.merge(live.dump())
+    return result
+
+class MetricsHTTPServer:
+    """
+    Локальный HTTP-сервер метрик
+
+    GET /metrics - текстовый формат Prometheus, GET /stats - JSON.
+    Вместо реестра можно передать функцию, возвращающую реестр при каждом
+    запросе (например, объединенные метрики нескольких процессов).
+    """
+
+    def __init__(self, registry, host: str, port: int, stats_provider=None) -> None:
+        self.registry_provider: Callable[[], MetricsRegistry] = registry if callable(registry) else (lambda: registry)
+        self.stats_provider = stats_provider or (lambda: self.registry_provider().snapshot())
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path == "/metrics":
+                    body = server.registry_provider().render_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/stats":
+                    body = json.dumps(server.stats_provider()).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                # Запросы к метрикам не засоряют вывод сервера
+                pass
+
+        return Handler
+
+    def start(self) -> None:
+        """Запускает HTTP-сервер в фоновом потоке"""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="MetricsHTTP", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Останавливает HTTP-сервер"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
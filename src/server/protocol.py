@@ -0,0 +1,364 @@
+"""
+Кадрирование сообщений для постоянных соединений
+
+Каждое сообщение передается одним или несколькими кадрами: 4 байта
+заголовка (big-endian) и тело. Младшие 31 бит заголовка - длина тела,
+старший бит означает, что за кадром следует продолжение того же сообщения.
+Так большие сообщения отправляются частями фиксированного размера, а
+получатель собирает сообщение целиком, не превышая заданного предела.
+
+Старые клиенты отправляют один JSON-объект без заголовка и закрывают
+соединение после ответа; такой запрос всегда начинается с '{', что для
+кадра означало бы длину больше 2 ГиБ, поэтому режим определяется по первому
+байту соединения.
+"""
+import asyncio
+import re
+import socket
+import struct
+import sys
+from array import array
+from typing import Any, Iterator, List, Optional
+
+FRAME_HEADER = struct.Struct("!I")
+FRAME_MORE = 0x80000000
+FRAME_SIZE_MASK = 0x7FFFFFFF
+LEGACY_REQUEST_PREFIXES = b"{ \t\r\n"
+
+DEFAULT_MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+DEFAULT_FRAGMENT_SIZE = 1024 * 1024
+
+# Форматы ответа. Двоичный формат запрашивается параметром "format" и
+# используется только для ответов со списком офсетов; сигнатура формата
+# начинается с нулевого байта, поэтому не путается с JSON-ответом
+RESPONSE_FORMAT_JSON = "json"
+RESPONSE_FORMAT_BINARY = "binary"
+RESPONSE_FORMATS = (RESPONSE_FORMAT_JSON, RESPONSE_FORMAT_BINARY)
+BINARY_OFFSETS_MAGIC = b"\x00OF1"
+# Сигнатура, флаги, 3 байта резерва, число офсетов (uint64)
+BINARY_OFFSETS_HEADER = struct.Struct("<4sB3xQ")
+BINARY_FLAG_TRUNCATED = 0x01
+
+class ProtocolError(Exception):
+    """Ошибка формата кадра"""
+
+def is_framed_connection(client_socket: socket.socket) -> bool:
+    """
+    Определяет режим соединения по первому байту, не извлекая его из сокета
+
+    Returns:
+        bool: True для кадрированного режима, False для одиночного JSON-запроса
+    """
+    first_byte = client_socket.recv(1, socket.MSG_PEEK)
+    return bool(first_byte) and first_byte not in LEGACY_REQUEST_PREFIXES
+
+def recv_exact(client_socket: socket.socket, size: int) -> bytes:
+    """
+    Читает ровно size байт
+
+    Returns:
+        bytes: Прочитанные данные; пустая строка, если соединение закрыто
+            до получения первого байта
+    """
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = client_socket.recv_into(view[received:])
+        if not count:
+            if received == 0:
+                return b""
+            raise ProtocolError("Connection closed in the middle of a frame")
+        received += count
+    return bytes(buffer)
+
+def read_message(client_socket: socket.socket, max_size: int) -> Optional[bytes]:
+    """
+    Читает сообщение, собирая его из всех кадров-продолжений
+
+    Returns:
+        bytes | None: Тело сообщения или None, если клиент закрыл соединение
+    """
+    message = bytearray()
+    while True:
+        header = recv_exact(client_socket, FRAME_HEADER.size)
+        if not header:
+            if message:
+                raise ProtocolError("Connection closed in the middle of a message")
+            return None
+
+        (value,) = FRAME_HEADER.unpack(header)
+        size = value & FRAME_SIZE_MASK
+        if len(message) + size > max_size:
+            raise ProtocolError(f"Message exceeds limit of {max_size} bytes")
+
+        if size:
+            payload = recv_exact(client_socket, size)
+            if not payload:
+                raise ProtocolError("Connection closed in the middle of a frame")
+            message += payload
+
+        if not value & FRAME_MORE:
+            return bytes(message)
+
+def send_buffers(client_socket: socket.socket, buffers: List[Any]) -> None:
+    """
+    Отправляет несколько буферов одним вызовом sendmsg (scatter/gather)
+
+    Буферы не склеиваются в промежуточный объект; частичная отправка
+    продолжается с места остановки.
+    """
+    views = [memoryview(buffer).cast("B") for buffer in buffers if len(buffer)]
+    if not hasattr(client_socket, "sendmsg"):
+        client_socket.sendall(b"".join(views))
+        return
+
+    while views:
+        sent = client_socket.sendmsg(views)
+        while sent:
+            first = views[0]
+            if sent >= len(first):
+                sent -= len(first)
+                views.pop(0)
+            else:
+                views[0] = first[sent:]
+                sent = 0
+
+def iter_frames(payload: Any, fragment_size: int = DEFAULT_FRAGMENT_SIZE) -> Iterator[List[Any]]:
+    """
+    Разбивает сообщение на кадры не больше fragment_size
+
+    Args:
+        payload: Тело сообщения - буфер или список буферов (например,
+            заголовок двоичного ответа и массив офсетов), которые
+            передаются подряд без склеивания
+
+    Yields:
+        list: Заголовок кадра и срезы memoryview тела (без копирования)
+    """
+    buffers = payload if isinstance(payload, list) else [payload]
+    views = [memoryview(buffer).cast("B") for buffer in buffers]
+    remaining = sum(len(view) for view in views)
+    index = offset = 0
+    while True:
+        size = min(fragment_size, remaining)
+        remaining -= size
+        frame = [FRAME_HEADER.pack(size | (FRAME_MORE if remaining else 0))]
+        while size:
+            view = views[index]
+            taken = min(size, len(view) - offset)
+            frame.append(view[offset:offset + taken])
+            offset += taken
+            size -= taken
+            if offset == len(view):
+                index += 1
+                offset = 0
+        yield frame
+        if not remaining:
+            return
+
+def write_message(client_socket: socket.socket, payload: Any, fragment_size: int = DEFAULT_FRAGMENT_SIZE) -> None:
+    """Отправляет сообщение (буфер или список буферов) кадрами не больше fragment_size"""
+    for frame in iter_frames(payload, fragment_size):
+        send_buffers(client_socket, frame)
+
+def encode_binary_offsets(offsets: Any, truncated: bool = False) -> List[Any]:
+    """
+    Кодирует список офсетов в двоичный ответ
+
+    Ответ - заголовок BINARY_OFFSETS_HEADER (сигнатура формата, флаги, число
+    офсетов) и массив 64-битных офсетов little-endian. Возвращается список
+    из заголовка и массива, который отправляется как есть, без
+    сериализации в текст и промежуточных копий.
+
+    Args:
+        offsets: Список офсетов или "not found"
+        truncated: Список офсетов сокращен ограничением max_offsets
+    """
+    values = array("Q", offsets if isinstance(offsets, list) else ())
+    if sys.byteorder != "little":
+        values.byteswap()
+    flags = BINARY_FLAG_TRUNCATED if truncated else 0
+    return [BINARY_OFFSETS_HEADER.pack(BINARY_OFFSETS_MAGIC, flags, len(values)), values]
+
+# Сколько уровней вложенности внутри одного блока сокращается при подсчете
+# скобок; для более глубоких блоков скобки разбираются по одной
+BRACE_REDUCE_PASSES = 16
+_NOT_BRACES = bytes(byte for byte in range(256) if byte not in b"{}")
+
+class JsonDocumentTracker:
+    """
+    Отслеживает границу одиночного JSON-запроса по мере поступления данных
+
+    Учитывается глубина вложенности фигурных скобок вне строк, а внутри
+    строк - кавычки и экранирование (в том числе разорванные между
+    блоками). Если в блоке глубина заведомо не доходит до нуля, скобки
+    считаются в нем целиком после удаления законченных строк; по одной
+    разбираются только блоки, где документ может закончиться. Документ
+    считается законченным, когда глубина возвращается к нулю; сам разбор
+    выполняется один раз обработчиком запроса.
+    """
+
+    _STRINGS = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+    # Вне строки: строка целиком, скобка или кавычка строки, не
+    # законченной в этом блоке
+    _TOKEN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[{}"]', re.DOTALL)
+    _STRING_SPECIAL = re.compile(rb'["\\]')
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.complete = False
+
+    def feed(self, chunk: bytes) -> bool:
+        """
+        Учитывает очередной блок данных
+
+        Returns:
+            bool: True, если документ закончился в этом или предыдущих блоках
+        """
+        position = 0
+        length = len(chunk)
+        count_braces = True
+        while not self.complete and position < length:
+            if self.escape:
+                self.escape = False
+                position += 1
+            elif self.in_string:
+                match = self._STRING_SPECIAL.search(chunk, position)
+                if match is None:
+                    return False
+                position = match.end()
+                if match.group() == b'"':
+                    self.in_string = False
+                else:
+                    self.escape = True
+            elif count_braces and self.depth:
+                count_braces = False
+                position = self._count_braces(chunk, position)
+            else:
+                match = self._TOKEN.search(chunk, position)
+                if match is None:
+                    return False
+                position = match.end()
+                token = match.group()
+                if token == b"{":
+                    self.depth += 1
+                elif token == b"}":
+                    if self.depth:
+                        self.depth -= 1
+                        self.complete = not self.depth
+                elif token == b'"':
+                    self.in_string = True
+        return self.complete
+
+    def _count_braces(self, chunk: bytes, position: int) -> int:
+        """
+        Учитывает скобки остатка блока вне строк без разбора по одной
+
+        Returns:
+            int: Позиция, с которой продолжить разбор: конец блока, начало
+                незаконченной строки или position, если глубина в этом
+                блоке может дойти до нуля
+        """
+        rest = self._STRINGS.sub(b"", chunk[position:])
+        # После начала незаконченной строки законченных строк нет, поэтому
+        # ее хвост в rest совпадает с хвостом блока
+        unterminated = rest.find(b'"')
+        head = rest if unterminated == -1 else rest[:unterminated]
+        # Парные скобки сокращаются, остаются закрывающие без пары и за
+        # ними открывающие без пары: }}}{{
+        braces = head.translate(None, _NOT_BRACES)
+        for _ in range(BRACE_REDUCE_PASSES):
+            reduced = braces.replace(b"{}", b"")
+            if len(reduced) == len(braces):
+                break
+            braces = reduced
+        else:
+            return position
+        closed = len(braces) - len(braces.lstrip(b"}"))
+        if closed >= self.depth:
+            return position
+
+        self.depth += len(braces) - 2 * closed
+        if unterminated == -1:
+            return len(chunk)
+        self.in_string = True
+        return len(chunk) - (len(rest) - unterminated) + 1
+
+def receive_json_document(client_socket: socket.socket, max_size: int, buffer_size: int) -> bytes:
+    """
+    Читает одиночный JSON-запрос без кадрирования до конца документа
+
+    Документ считается полученным, когда закрывается его внешняя фигурная
+    скобка или когда клиент закрыл свою сторону соединения.
+    """
+    message = bytearray()
+    tracker = JsonDocumentTracker()
+    while True:
+        chunk = client_socket.recv(buffer_size)
+        if not chunk:
+            return bytes(message)
+
+        message += chunk
+        if len(message) > max_size:
+            raise ProtocolError(f"Message exceeds limit of {max_size} bytes")
+        if tracker.feed(chunk):
+            return bytes(message)
+
+async def read_message_async(reader: asyncio.StreamReader, max_size: int, prefix: bytes = b"") -> Optional[bytes]:
+    """
+    Асинхронный вариант read_message для asyncio.StreamReader
+
+    Args:
+        reader: Поток чтения соединения
+        max_size: Максимальный размер сообщения
+        prefix: Уже прочитанное начало заголовка первого кадра
+
+    Returns:
+        bytes | None: Тело сообщения или None, если клиент закрыл соединение
+    """
+    message = bytearray()
+    while True:
+        try:
+            header = prefix + await reader.readexactly(FRAME_HEADER.size - len(prefix))
+        except asyncio.IncompleteReadError as e:
+            if not prefix and not e.partial and not message:
+                return None
+            raise ProtocolError("Connection closed in the middle of a message") from None
+        prefix = b""
+
+        (value,) = FRAME_HEADER.unpack(header)
+        size = value & FRAME_SIZE_MASK
+        if len(message) + size > max_size:
+            raise ProtocolError(f"Message exceeds limit of {max_size} bytes")
+
+        if size:
+            try:
+                message += await reader.readexactly(size)
+            except asyncio.IncompleteReadError:
+                raise ProtocolError("Connection closed in the middle of a frame") from None
+
+        if not value & FRAME_MORE:
+            return bytes(message)
+
+async def receive_json_document_async(
+    reader: asyncio.StreamReader,
+    prefix: bytes,
+    max_size: int,
+    buffer_size: int
+) -> bytes:
+    """Асинхронный вариант receive_json_document; prefix - уже прочитанные байты"""
+    message = bytearray(prefix)
+    tracker = JsonDocumentTracker()
+    complete = tracker.feed(prefix)
+    while not complete:
+        chunk = await reader.read(buffer_size)
+        if not chunk:
+            break
+        message += chunk
+        if len(message) > max_size:
+            raise ProtocolError(f"Message exceeds limit of {max_size} bytes")
+        complete = tracker.feed(chunk)
+    return bytes(message)
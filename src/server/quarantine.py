@@ -1,24 +1,332 @@
+import errno
+import hashlib
+import json
 import os
-import shutil
+import stat
+import threading
+import time
+import uuid
+
+# Каталог с файлами карантина внутри каталога карантина
+OBJECTS_DIR = "objects"
+# Журнал операций карантина (JSON lines)
+MANIFEST_NAME = "manifest.jsonl"
+# Размер блока чтения при вычислении хэша и копировании между файловыми системами
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path, chunk_size=HASH_CHUNK_SIZE):
+    """
+    Вычисляет SHA-256 файла
+
+    Returns:
+        str: hex-дайджест
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return hash_fd(fd, chunk_size)
+    finally:
+        os.close(fd)
+
+
+def hash_fd(fd, chunk_size=HASH_CHUNK_SIZE):
+    """
+    Вычисляет SHA-256 открытого файла с начала, независимо от текущей позиции
+
+    Returns:
+        str: hex-дайджест
+    """
+    digest = hashlib.sha256()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    os.lseek(fd, 0, os.SEEK_SET)
+    while True:
+        size = os.readv(fd, [buffer])
+        if not size:
+            break
+        digest.update(view[:size])
+    return digest.hexdigest()
+
+
+def _write_all(fd, data):
+    """Записывает буфер целиком"""
+    while data:
+        written = os.write(fd, data)
+        data = data[written:]
+
+
+def _copy_kernel(source_fd, destination_fd, size):
+    """
+    Копирует файл средствами ядра без передачи данных через процесс
+
+    Returns:
+        bool: False, если ни copy_file_range, ни sendfile недоступны
+    """
+    copy = getattr(os, "copy_file_range", None)
+    if copy is None:
+        copy = getattr(os, "sendfile", None)
+        if copy is None:
+            return False
+        # sendfile(out, in, offset, count) - с текущей позиции источника
+        copy_chunk = lambda count: copy(destination_fd, source_fd, None, count)
+    else:
+        copy_chunk = lambda count: copy(source_fd, destination_fd, count)
+
+    copied = 0
+    try:
+        while True:
+            count = copy_chunk(max(size - copied, HASH_CHUNK_SIZE))
+            if not count:
+                return True
+            copied += count
+    except OSError as e:
+        # Файловые системы без поддержки копирования файлов ядром:
+        # если еще ничего не скопировано, можно вернуться к чтению
+        if copied == 0 and e.errno in (errno.EINVAL, errno.ENOSYS, errno.EXDEV, errno.EOPNOTSUPP):
+            return False
+        raise
+
+
+def copy_file(source, destination, compute_hash=True, chunk_size=HASH_CHUNK_SIZE, overwrite=False):
+    """
+    Копирует файл на другую файловую систему за один проход
+
+    Если нужен хэш, данные читаются в один переиспользуемый буфер, по нему
+    же считается SHA-256 и он же записывается в файл назначения, то есть
+    файл читается один раз. copy_file_range и sendfile передают данные
+    внутри ядра и не дают посчитать хэш, поэтому используются только когда
+    хэш не нужен. Перед возвратом данные и каталог назначения
+    сбрасываются на диск (fsync). Файл назначения не должен существовать,
+    если не задан overwrite.
+
+    Args:
+        source (str): Исходный файл
+        destination (str): Новый файл
+        compute_hash (bool): Считать SHA-256
+        overwrite (bool): Атомарно заменить существующий файл назначения
+
+    Returns:
+        str | None: hex-дайджест SHA-256 или None
+    """
+    source_fd = os.open(source, os.O_RDONLY)
+    try:
+        return copy_fd(source_fd, destination, compute_hash, chunk_size, overwrite)
+    finally:
+        os.close(source_fd)
+
+
+def copy_fd(source_fd, destination, compute_hash=True, chunk_size=HASH_CHUNK_SIZE, overwrite=False):
+    """
+    Вариант copy_file для уже открытого файла: копируется содержимое с
+    начала файла, права доступа и время изменения
+
+    Без overwrite файл назначения создается с O_EXCL, и существующий файл
+    не затрагивается. С overwrite данные копируются во временный файл в
+    каталоге назначения, который затем заменяет destination через
+    os.replace, поэтому по этому пути всегда лежит целый файл.
+
+    Returns:
+        str | None: hex-дайджест SHA-256 или None
+    """
+    digest = hashlib.sha256() if compute_hash else None
+    source_stat = os.fstat(source_fd)
+    os.lseek(source_fd, 0, os.SEEK_SET)
+    target = destination
+    if overwrite:
+        directory, name = os.path.split(destination)
+        target = os.path.join(directory, f".{name}.{uuid.uuid4().hex}.tmp")
+
+    # Файл открывается до блока очистки: при ошибке удаляется только файл,
+    # созданный этим вызовом, а не существовавший (EEXIST)
+    destination_fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        try:
+            size = source_stat.st_size
+            if digest is not None or not _copy_kernel(source_fd, destination_fd, size):
+                buffer = bytearray(chunk_size)
+                view = memoryview(buffer)
+                while True:
+                    count = os.readv(source_fd, [buffer])
+                    if not count:
+                        break
+                    if digest is not None:
+                        digest.update(view[:count])
+                    _write_all(destination_fd, view[:count])
+            os.fsync(destination_fd)
+        finally:
+            os.close(destination_fd)
+        os.chmod(target, stat.S_IMODE(source_stat.st_mode))
+        os.utime(target, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+        if overwrite:
+            os.replace(target, destination)
+    except BaseException:
+        try:
+            os.unlink(target)
+        except OSError:
+            pass
+        raise
+
+    _fsync_directory(os.path.dirname(destination))
+    return digest.hexdigest() if digest is not None else None
+
+
+def _same_file(first, second):
+    """Сравнивает два os.stat_result по устройству и inode"""
+    return (first.st_dev, first.st_ino) == (second.st_dev, second.st_ino)
+
+
+def _fsync_directory(path):
+    """Сбрасывает на диск запись каталога, чтобы новый файл пережил сбой"""
+    try:
+        fd = os.open(path or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
 
 class QuarantineManager:
-    """Класс для управления карантином файлов"""
+    """
+    Класс для управления карантином файлов
+
+    Файлы хранятся под случайными именами (UUID) в каталогах
+    objects/<2 hex>/<2 hex>/, поэтому имя выбирается без проверки
+    существующих файлов и без гонок между потоками, а ни один каталог не
+    разрастается. Каждая операция дописывается в manifest.jsonl (исходный
+    путь, путь в карантине, SHA-256, размер, время); при запуске журнал
+    читается в память, поэтому поиск и восстановление не обходят каталоги.
+    Перед поиском и восстановлением дочитываются записи, добавленные в
+    журнал с прошлого чтения, - в режиме --processes их добавляют и
+    другие процессы сервера с тем же каталогом карантина.
+    """
 
-    def __init__(self, quarantine_dir):
+    def __init__(self, quarantine_dir, hash_files=True):
         self.quarantine_dir = quarantine_dir
+        self.hash_files = hash_files
+        self.manifest_path = os.path.join(quarantine_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        # id -> запись журнала для файлов, находящихся в карантине
+        self._entries = {}
+        self._shards = set()
+        # Прочитанная часть журнала: (устройство, inode) файла и число байт
+        self._manifest_identity = None
+        self._manifest_offset = 0
         self._ensure_quarantine_dir()
+        with self._lock:
+            self._load_manifest()
 
     def _ensure_quarantine_dir(self):
         """Создает директорию карантина если она не существует"""
-        os.makedirs(self.quarantine_dir, exist_ok=True)
+        os.makedirs(os.path.join(self.quarantine_dir, OBJECTS_DIR), exist_ok=True)
+
+    def _load_manifest(self):
+        """
+        Восстанавливает индекс карантина из журнала, дочитывая записи,
+        добавленные с прошлого вызова (вызывается под self._lock)
+
+        Журнал только дописывается, поэтому достаточно помнить прочитанную
+        длину; если файл заменен или стал короче, он читается заново.
+        """
+        try:
+            with open(self.manifest_path, "rb") as manifest:
+                manifest_stat = os.fstat(manifest.fileno())
+                identity = (manifest_stat.st_dev, manifest_stat.st_ino)
+                if identity != self._manifest_identity or manifest_stat.st_size < self._manifest_offset:
+                    self._entries.clear()
+                    self._manifest_identity = identity
+                    self._manifest_offset = 0
+                if manifest_stat.st_size == self._manifest_offset:
+                    return
+                manifest.seek(self._manifest_offset)
+                data = manifest.read()
+        except FileNotFoundError:
+            return
+
+        # Строка, которую другой процесс еще дописывает, читается в следующий раз
+        end = data.rfind(b"\n") + 1
+        self._manifest_offset += end
+        for line in data[:end].decode("utf-8").splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Недописанная строка после аварийной остановки
+                continue
+            if record.get("action") == "restore":
+                self._entries.pop(record.get("id"), None)
+            else:
+                self._entries[record["id"]] = record
+
+    def _append_manifest(self, record):
+        """Дописывает запись в журнал (вызывается под self._lock)"""
+        with open(self.manifest_path, "a", encoding="utf-8") as manifest:
+            manifest.write(json.dumps(record) + "\n")
+
+    def _allocate_path(self, quarantine_id):
+        """Возвращает путь в карантине для идентификатора, создавая каталог шарда"""
+        shard = os.path.join(self.quarantine_dir, OBJECTS_DIR, quarantine_id[:2], quarantine_id[2:4])
+        if shard not in self._shards:
+            os.makedirs(shard, exist_ok=True)
+            self._shards.add(shard)
+        return os.path.join(shard, quarantine_id)
+
+    @staticmethod
+    def _move(source, destination, compute_hash=False, overwrite=False):
+        """
+        Перемещает файл: атомарный os.rename в пределах одной файловой
+        системы, потоковое копирование с удалением источника - между разными.
+        Без overwrite при копировании существующий файл назначения не
+        заменяется (ошибка FileExistsError).
+
+        Returns:
+            tuple: Способ перемещения ("rename" или "copy") и SHA-256, если
+                он был посчитан при копировании
+        """
+        try:
+            os.rename(source, destination)
+            return "rename", None
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+
+        sha256 = copy_file(source, destination, compute_hash, overwrite=overwrite)
+        # Источник удаляется только после того, как копия сброшена на диск
+        os.unlink(source)
+        return "copy", sha256
+
+    def _record(self, quarantine_id, original_path, quarantine_path, sha256, size, method):
+        """Записывает перемещенный файл в журнал и индекс и возвращает ответ"""
+        record = {
+            "action": "quarantine",
+            "id": quarantine_id,
+            "original_path": original_path,
+            "quarantine_path": quarantine_path,
+            "sha256": sha256,
+            "size": size,
+            "time": time.time()
+        }
+        with self._lock:
+            self._append_manifest(record)
+            self._entries[quarantine_id] = record
+
+        return {
+            "status": "File quarantined",
+            "quarantine_path": quarantine_path,
+            "id": quarantine_id,
+            "sha256": sha256,
+            "method": method
+        }
 
     def quarantine_file(self, file_path):
         """
         Перемещает файл в карантин
-        
+
         Args:
             file_path (str): Путь к файлу для карантина
-            
+
         Returns:
             dict: Результат операции
         """
@@ -26,22 +334,168 @@ class QuarantineManager:
             return {"error": "File not found"}
 
         try:
-            filename = os.path.basename(file_path)
-            quarantine_path = os.path.join(self.quarantine_dir, filename)
-
-            # Если файл с таким именем уже есть в карантине, добавляем суффикс
-            counter = 1
-            original_quarantine_path = quarantine_path
-            while os.path.exists(quarantine_path):
-                name, ext = os.path.splitext(original_quarantine_path)
-                quarantine_path = f"{name}_{counter}{ext}"
-                counter += 1
-
-            shutil.move(file_path, quarantine_path)
-            return {
-                "status": "File quarantined", 
-                "quarantine_path": quarantine_path
-            }
+            original_path = os.path.abspath(file_path)
+            size = os.path.getsize(original_path)
+            quarantine_id = uuid.uuid4().hex
+            quarantine_path = self._allocate_path(quarantine_id)
 
+            method, sha256 = self._move(original_path, quarantine_path, self.hash_files)
+            if self.hash_files and sha256 is None:
+                # После rename хэш считается по файлу в карантине
+                sha256 = hash_file(quarantine_path)
+
+            return self._record(quarantine_id, original_path, quarantine_path, sha256, size, method)
+
+        except Exception as e:
+            return {"error": f"Error quarantining file: {str(e)}"}
+
+    def quarantine_open_file(self, file, file_path):
+        """
+        Перемещает в карантин уже открытый (например, только что
+        проверенный) файл
+
+        Перед перемещением путь сверяется с дескриптором по (st_dev, st_ino):
+        если файл по этому пути заменили, он не перемещается. При rename
+        в карантин попадает именно этот inode (после переименования это
+        проверяется еще раз), при копировании на другую файловую систему
+        данные читаются из открытого дескриптора.
+
+        Args:
+            file: Открытый файл (объект с fileno())
+            file_path (str): Путь, по которому файл был открыт
+
+        Returns:
+            dict: Результат операции
+        """
+        try:
+            fd = file.fileno()
+            file_stat = os.fstat(fd)
+            original_path = os.path.abspath(file_path)
+            if not _same_file(os.stat(original_path), file_stat):
+                return {"error": "File was replaced after it was opened"}
+
+            quarantine_id = uuid.uuid4().hex
+            quarantine_path = self._allocate_path(quarantine_id)
+
+            try:
+                os.rename(original_path, quarantine_path)
+                method, sha256 = "rename", None
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                method = "copy"
+                sha256 = copy_fd(fd, quarantine_path, self.hash_files)
+                # Путь мог быть подменен во время копирования
+                if not _same_file(os.stat(original_path), file_stat):
+                    os.unlink(quarantine_path)
+                    return {"error": "File was replaced after it was opened"}
+                os.unlink(original_path)
+
+            if method == "rename" and not _same_file(os.stat(quarantine_path), file_stat):
+                # Файл подменили между проверкой и rename - возвращаем чужой файл на место
+                os.rename(quarantine_path, original_path)
+                return {"error": "File was replaced after it was opened"}
+
+            if self.hash_files and sha256 is None:
+                sha256 = hash_fd(fd)
+
+            return self._record(quarantine_id, original_path, quarantine_path, sha256, file_stat.st_size, method)
+
+        except FileNotFoundError:
+            return {"error": "File not found"}
         except Exception as e:
             return {"error": f"Error quarantining file: {str(e)}"}
+
+    def quarantine_files(self, file_paths):
+        """
+        Перемещает в карантин несколько файлов
+
+        Args:
+            file_paths (list): Пути к файлам
+
+        Returns:
+            dict: Результаты по каждому файлу и число перемещенных файлов и ошибок
+        """
+        results = []
+        quarantined = errors = 0
+        for file_path in file_paths:
+            result = self.quarantine_file(file_path)
+            if "error" in result:
+                errors += 1
+            else:
+                quarantined += 1
+            results.append({"file_path": file_path, **result})
+        return {"results": results, "quarantined": quarantined, "errors": errors}
+
+    def lookup(self, quarantine_id=None, sha256=None, original_path=None):
+        """
+        Ищет файлы в карантине по индексу
+
+        Args:
+            quarantine_id (str): Идентификатор карантина
+            sha256 (str): SHA-256 содержимого
+            original_path (str): Исходный путь файла
+
+        Returns:
+            list: Подходящие записи журнала (все записи, если фильтры не заданы)
+        """
+        if original_path is not None:
+            original_path = os.path.abspath(original_path)
+        with self._lock:
+            self._load_manifest()
+            if quarantine_id is not None:
+                entry = self._entries.get(quarantine_id)
+                entries = [entry] if entry else []
+            else:
+                entries = list(self._entries.values())
+
+        return [
+            dict(entry) for entry in entries
+            if (sha256 is None or entry.get("sha256") == sha256)
+            and (original_path is None or entry["original_path"] == original_path)
+        ]
+
+    def restore_file(self, quarantine_id, restore_path=None, overwrite=False):
+        """
+        Возвращает файл из карантина
+
+        Args:
+            quarantine_id (str): Идентификатор карантина
+            restore_path (str): Куда вернуть файл (по умолчанию исходный путь)
+            overwrite (bool): Заменить существующий файл
+
+        Returns:
+            dict: Результат операции
+        """
+        with self._lock:
+            self._load_manifest()
+            entry = self._entries.get(quarantine_id)
+        if entry is None:
+            return {"error": f"Unknown quarantine id: {quarantine_id}"}
+
+        destination = os.path.abspath(restore_path or entry["original_path"])
+        if not overwrite and os.path.exists(destination):
+            return {"error": f"Destination already exists: {destination}"}
+
+        with self._lock:
+            # Файл мог быть восстановлен параллельным запросом
+            if self._entries.pop(quarantine_id, None) is None:
+                return {"error": f"Unknown quarantine id: {quarantine_id}"}
+
+        try:
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            self._move(entry["quarantine_path"], destination, overwrite=overwrite)
+            with self._lock:
+                self._append_manifest({
+                    "action": "restore",
+                    "id": quarantine_id,
+                    "restore_path": destination,
+                    "time": time.time()
+                })
+
+            return {"status": "File restored", "restore_path": destination, "id": quarantine_id}
+
+        except Exception as e:
+            with self._lock:
+                self._entries.setdefault(quarantine_id, entry)
+            return {"error": f"Error restoring file: {str(e)}"}
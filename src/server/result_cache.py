@@ -0,0 +1,128 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+EVICTION_LRU = "lru"
+EVICTION_FIFO = "fifo"
+
+# Оценочный объем служебных данных одной записи кэша в байтах
+ENTRY_OVERHEAD = 256
+# Оценочный объем одного офсета в списке результата
+OFFSET_SIZE = 36
+
+@dataclass
+class ResultCacheConfig:
+    """Конфигурация кэша результатов проверки"""
+    max_entries: int = 10000
+    max_bytes: int = 64 * 1024 * 1024
+    eviction: str = EVICTION_LRU
+
+class ScanResultCache:
+    """
+    Потокобезопасный кэш результатов проверки файлов
+
+    Ключ записи - (устройство, inode, размер, mtime_ns, дайджест сигнатуры),
+    поэтому любое изменение файла приводит к промаху, и повторная проверка
+    неизмененного файла не требует чтения его содержимого.
+    """
+
+    def __init__(self, config: Optional[ResultCacheConfig] = None) -> None:
+        self.config = config or ResultCacheConfig()
+        if self.config.eviction not in (EVICTION_LRU, EVICTION_FIFO):
+            raise ValueError(f"Unknown eviction policy: {self.config.eviction}")
+
+        self._entries: "OrderedDict[Hashable, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(file_stat: os.stat_result, signature_digest: bytes) -> Tuple:
+        """Формирует ключ записи по метаданным файла и дайджесту сигнатуры"""
+        return (
+            file_stat.st_dev,
+            file_stat.st_ino,
+            file_stat.st_size,
+            file_stat.st_mtime_ns,
+            signature_digest
+        )
+
+    @staticmethod
+    def digest(*parts: bytes) -> bytes:
+        """Вычисляет дайджест сигнатуры (и параметров проверки)"""
+        hasher = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            hasher.update(len(part).to_bytes(8, "little"))
+            hasher.update(part)
+        return hasher.digest()
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """Возвращает результат из кэша или None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            if self.config.eviction == EVICTION_LRU:
+                self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Hashable, result: Dict[str, Any]) -> None:
+        """Сохраняет результат в кэше, вытесняя старые записи при необходимости"""
+        size = self._estimate_size(result)
+        if size > self.config.max_bytes or self.config.max_entries <= 0:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+
+            self._entries[key] = (result, size)
+            self._size += size
+
+            while len(self._entries) > self.config.max_entries or self._size > self.config.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Очищает кэш"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики кэша"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_entries": self.config.max_entries,
+                "max_bytes": self.config.max_bytes,
+                "eviction": self.config.eviction,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+    @staticmethod
+    def _estimate_size(result: Dict[str, Any]) -> int:
+        """Оценивает объем памяти, занимаемый результатом"""
+        offsets = result.get("offsets")
+        if isinstance(offsets, list):
+            count = len(offsets)
+        elif isinstance(offsets, dict):
+            count = sum(len(values) for values in offsets.values()) + len(offsets)
+        else:
+            count = 0
+        return ENTRY_OVERHEAD + count * OFFSET_SIZE
@@ -0,0 +1,131 @@
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from .signature_checker import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_MMAP_THRESHOLD,
+    DEFAULT_SCAN_OPTIONS,
+    MultiSignatureMatcher,
+    SignatureChecker
+)
+from .signature_db import SignatureDatabase
+
+WORKERS_MODE_THREADS = "threads"
+WORKERS_MODE_PROCESSES = "processes"
+
+# Состояние рабочего процесса, заполняется инициализатором пула
+_worker_checker = None
+# Скомпилированные наборы сигнатур базы: (версия базы, имя набора) -> автомат.
+# Версия - хэш содержимого файла базы, поэтому набор однозначно
+# определяется ключом; хранятся наборы только последней версии
+_worker_matchers = {}
+
+def _init_worker(chunk_size, mmap_threshold, signatures_path):
+    """Инициализирует рабочий процесс: создает проверку и загружает базу сигнатур"""
+    global _worker_checker
+
+    # Сигналы завершения и перезагрузки обрабатывает главный процесс
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    _worker_checker = SignatureChecker(chunk_size, mmap_threshold)
+    if signatures_path:
+        for matcher in SignatureDatabase(signatures_path).index.matchers.values():
+            _worker_matchers[matcher.key] = matcher
+
+def _ping():
+    """Пустая задача для прогрева пула"""
+    return os.getpid()
+
+def _scan_signature(file_path, signature, options):
+    """Сканирует файл на одну сигнатуру в рабочем процессе"""
+    return _worker_checker._scan_path(file_path, signature, options)
+
+def _scan_signatures(file_path, signatures, options):
+    """Сканирует файл на переданный набор hex-сигнатур в рабочем процессе"""
+    return _worker_checker._scan_path_multi(file_path, signatures, options)
+
+def _scan_signature_set(file_path, key, options, signatures=None):
+    """
+    Сканирует файл на набор сигнатур базы главного процесса
+
+    Процесс не перечитывает файл базы сам: его содержимое могло измениться
+    без SIGHUP, и тогда версия никогда не совпала бы с версией главного
+    процесса. Набор, которого нет в кэше, передает главный процесс.
+
+    Args:
+        key (tuple): (версия базы, имя набора)
+        signatures (dict | None): Сигнатуры набора, если его нет в кэше
+
+    Returns:
+        tuple | None: Результат сканирования или None, если набора нет в
+            кэше и сигнатуры не переданы
+    """
+    matcher = _worker_matchers.get(key)
+    if matcher is None:
+        if signatures is None:
+            return None
+        matcher = MultiSignatureMatcher(signatures, key=key)
+        # Наборы прежних версий базы больше не запрашиваются
+        for stale_key in [cached for cached in _worker_matchers if cached[0] != key[0]]:
+            del _worker_matchers[stale_key]
+        _worker_matchers[key] = matcher
+    return _worker_checker._scan_path_multi(file_path, matcher, options)
+
+class ProcessSignatureChecker(SignatureChecker):
+    """
+    Проверка сигнатур в пуле процессов
+
+    Сетевой ввод-вывод и кэш результатов остаются в главном процессе, а само
+    сканирование выполняется в рабочих процессах, каждый из которых заранее
+    загружает базу сигнатур. Между процессами передаются только путь,
+    сигнатура (или имя набора) и найденные офсеты, поэтому сопоставление
+    не ограничено GIL и масштабируется на все ядра.
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, mmap_threshold=DEFAULT_MMAP_THRESHOLD,
+                 result_cache=None, workers=None, signatures_path=None, metrics=None):
+        super().__init__(chunk_size, mmap_threshold, result_cache, metrics)
+        self.workers = workers or os.cpu_count() or 1
+        # spawn вместо fork: пул создается в процессе, где уже работают потоки
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(chunk_size, mmap_threshold, signatures_path)
+        )
+
+    def start(self):
+        """Запускает рабочие процессы заранее, чтобы первые запросы не ждали загрузки базы"""
+        futures = [self.executor.submit(_ping) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def close(self):
+        """Останавливает пул процессов"""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def compile_signatures(self, signatures):
+        # Скомпилированный автомат дорого передавать в процесс, поэтому
+        # произвольные наборы компилируются в рабочих процессах
+        return signatures
+
+    def _scan_path(self, file_path, signature, options=DEFAULT_SCAN_OPTIONS):
+        return self.executor.submit(_scan_signature, file_path, signature, options).result()
+
+    def _scan_path_multi(self, file_path, signatures, options=DEFAULT_SCAN_OPTIONS):
+        if isinstance(signatures, MultiSignatureMatcher):
+            if signatures.key is None:
+                # Автомат не из базы - передавать его в процесс дороже, чем сканировать здесь
+                return super()._scan_path_multi(file_path, signatures, options)
+            result = self.executor.submit(_scan_signature_set, file_path, signatures.key, options).result()
+            if result is None:
+                # Набор новой версии базы передается процессу один раз, дальше он берется из кэша
+                result = self.executor.submit(
+                    _scan_signature_set, file_path, signatures.key, options, signatures.signatures
+                ).result()
+            return result
+
+        return self.executor.submit(_scan_signatures, file_path, signatures, options).result()
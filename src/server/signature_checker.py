@@ -1,15 +1,660 @@
+import mmap
 import os
+import re
+import stat
+import time
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+from .metrics import REGISTRY
+
+# Размер блока чтения по умолчанию (1 МиБ)
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# Минимальный размер файла, начиная с которого используется mmap (64 МиБ)
+DEFAULT_MMAP_THRESHOLD = 64 * 1024 * 1024
+
+
+@dataclass
+class SignatureCheckerConfig:
+    """Конфигурация проверки сигнатур"""
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    # Отрицательное значение отключает mmap
+    mmap_threshold: int = DEFAULT_MMAP_THRESHOLD
+
+
+@dataclass(frozen=True)
+class ScanOptions:
+    """
+    Ограничения сканирования, задаваемые в запросе
+
+    max_offsets - сколько офсетов (для каждой сигнатуры) найти, после чего
+    сканирование прекращается; count_only - вернуть только число вхождений;
+    start/end - диапазон байт файла [start, end), в котором должно целиком
+    лежать вхождение.
+    """
+    max_offsets: Optional[int] = None
+    count_only: bool = False
+    start: int = 0
+    end: Optional[int] = None
+
+    @classmethod
+    def from_params(cls, params):
+        """
+        Создает ограничения из параметров запроса: first_only, max_offsets,
+        count_only, start, end
+
+        Raises:
+            ValueError: Некорректные значения
+        """
+        max_offsets = params.get("max_offsets")
+        if params.get("first_only"):
+            max_offsets = 1
+        start = params.get("start") or 0
+        end = params.get("end")
+
+        options = cls(
+            max_offsets=int(max_offsets) if max_offsets is not None else None,
+            count_only=bool(params.get("count_only", False)),
+            start=int(start),
+            end=int(end) if end is not None else None
+        )
+        if options.max_offsets is not None and options.max_offsets <= 0:
+            raise ValueError("max_offsets must be positive")
+        if options.start < 0 or (options.end is not None and options.end < options.start):
+            raise ValueError("Invalid byte range: start must be >= 0 and end >= start")
+        return options
+
+    def make_result(self, offsets):
+        """
+        Формирует ответ по найденным офсетам одной сигнатуры
+
+        Args:
+            offsets (list | int): Офсеты или их число (для count_only)
+        """
+        if self.count_only:
+            result = {"count": offsets}
+        elif offsets:
+            result = {"offsets": offsets}
+        else:
+            result = {"offsets": "not found"}
+
+        found = offsets if self.count_only else len(offsets)
+        if self.max_offsets is not None and found >= self.max_offsets:
+            # Достигнут предел - в файле могут быть и другие вхождения
+            result["truncated"] = True
+        return result
+
+    def make_multi_result(self, results):
+        """
+        Формирует ответ по результатам множества сигнатур
+
+        Args:
+            results (dict): Словарь id -> list офсетов (id -> число
+                вхождений для count_only)
+        """
+        if self.count_only:
+            result = {"counts": results}
+        elif results:
+            result = {"offsets": results}
+        else:
+            result = {"offsets": "not found"}
+
+        if self.max_offsets is not None:
+            found = results.values() if self.count_only else map(len, results.values())
+            if any(count >= self.max_offsets for count in found):
+                result["truncated"] = True
+        return result
+
+    def scanned_bytes(self, size):
+        """Возвращает число байт файла указанного размера, попадающих в диапазон"""
+        end = size if self.end is None else min(size, self.end)
+        return max(0, end - self.start)
+
+
+DEFAULT_SCAN_OPTIONS = ScanOptions()
+
+
+class MaskedSignature:
+    """
+    Сигнатура с масками
+
+    Синтаксис - hex-байты, между которыми допускаются пробелы, и:
+        ??      - любой байт
+        A? / ?A - байт с известной старшей / младшей половиной
+        [n-m]   - от n до m произвольных байт, [n] - ровно n байт
+
+    Сигнатура компилируется в регулярное выражение над байтами, а для
+    быстрого поиска из нее выделяется самый длинный фрагмент без масок
+    (якорь): кандидаты находятся поиском якоря через find, и только вокруг
+    найденных якорей проверяется вся сигнатура. Поэтому при достаточно
+    длинном якоре скорость близка к поиску обычной сигнатуры.
+    """
+
+    def __init__(self, text):
+        """
+        Args:
+            text (str): Сигнатура в описанном синтаксисе
+
+        Raises:
+            ValueError: Синтаксическая ошибка
+        """
+        self.text = text
+        tokens = _tokenize_masked(text)
+
+        pattern = []
+        # Лучший якорь: (длина, байты, мин. и макс. смещение от начала)
+        best = (0, b"", 0, 0)
+        run = bytearray()
+        run_min = run_max = 0
+        min_len = max_len = 0
+        for token in tokens + [("gap", 0, 0)]:
+            kind = token[0]
+            if kind == "byte" and token[2] == 0xFF:
+                if not run:
+                    run_min, run_max = min_len, max_len
+                run.append(token[1])
+            elif run:
+                if len(run) > best[0]:
+                    best = (len(run), bytes(run), run_min, run_max)
+                run = bytearray()
+
+            if kind == "byte":
+                pattern.append(_byte_class(token[1], token[2]))
+                min_len += 1
+                max_len += 1
+            elif token[2]:
+                pattern.append(b".{%d,%d}" % (token[1], token[2]))
+                min_len += token[1]
+                max_len += token[2]
+
+        self.regex = re.compile(b"".join(pattern), re.DOTALL)
+        self.anchor = best[1]
+        self.anchor_min_offset = best[2]
+        self.anchor_max_offset = best[3]
+        self.min_len = min_len
+        self.max_len = max_len
+        # Ключ для кэша результатов, не совпадающий ни с одной обычной сигнатурой
+        self.cache_key = b"\0masked\0" + " ".join(text.split()).encode()
+
+    def __repr__(self):
+        return f"MaskedSignature({self.text!r})"
+
+    def find(self, data, first, last, endpos):
+        """
+        Перечисляет начала вхождений сигнатуры в data
+
+        Args:
+            data (bytes | bytearray | mmap.mmap): Данные
+            first (int): Наименьшее проверяемое начало
+            last (int): Наибольшее проверяемое начало
+            endpos (int): Граница данных, за которую вхождение не выходит
+
+        Yields:
+            int: Начала вхождений по возрастанию (перекрывающиеся тоже)
+        """
+        match = self.regex.match
+        if not self.anchor:
+            # Сигнатура без единого полного байта - проверяется каждая позиция
+            for start in range(first, last + 1):
+                if match(data, start, endpos):
+                    yield start
+            return
+
+        anchor = self.anchor
+        min_offset = self.anchor_min_offset
+        max_offset = self.anchor_max_offset
+        search_end = min(endpos, last + max_offset + len(anchor))
+        next_start = first
+
+        position = data.find(anchor, first + min_offset, search_end)
+        while position != -1:
+            # При переменных промежутках до якоря начало может быть в диапазоне;
+            # окна соседних якорей перекрываются, поэтому каждое начало
+            # проверяется один раз
+            start = max(position - max_offset, next_start)
+            stop = min(position - min_offset, last)
+            while start <= stop:
+                if match(data, start, endpos):
+                    yield start
+                start += 1
+            next_start = max(next_start, stop + 1)
+            position = data.find(anchor, position + 1, search_end)
+
+
+_HEX_DIGITS = "0123456789abcdefABCDEF"
+_GAP_PATTERN = re.compile(r"\[(\d+)(?:-(\d+))?\]")
+
+
+def _tokenize_masked(text):
+    """
+    Разбирает сигнатуру с масками
+
+    Returns:
+        list: Токены ("byte", значение, маска) и ("gap", минимум, максимум)
+    """
+    compact = "".join(text.split())
+    tokens = []
+    index = 0
+    while index < len(compact):
+        if compact[index] == "[":
+            gap = _GAP_PATTERN.match(compact, index)
+            if gap is None:
+                raise ValueError(f"Invalid gap at position {index}: {text}")
+            low = int(gap.group(1))
+            high = int(gap.group(2)) if gap.group(2) is not None else low
+            if high < low:
+                raise ValueError(f"Invalid gap [{low}-{high}]: {text}")
+            if tokens and tokens[-1][0] == "gap":
+                tokens[-1] = ("gap", tokens[-1][1] + low, tokens[-1][2] + high)
+            else:
+                tokens.append(("gap", low, high))
+            index = gap.end()
+            continue
+
+        pair = compact[index:index + 2]
+        if len(pair) != 2 or any(char not in _HEX_DIGITS + "?" for char in pair):
+            raise ValueError(f"Invalid signature byte {pair!r} at position {index}: {text}")
+        high, low = pair
+        value = mask = 0
+        if high != "?":
+            value |= int(high, 16) << 4
+            mask |= 0xF0
+        if low != "?":
+            value |= int(low, 16)
+            mask |= 0x0F
+        tokens.append(("byte", value, mask))
+        index += 2
+
+    if not any(token[0] == "byte" for token in tokens):
+        raise ValueError("Empty signature")
+    if tokens[0][0] == "gap" or tokens[-1][0] == "gap":
+        raise ValueError(f"Signature cannot start or end with a gap: {text}")
+    return tokens
+
+
+def _byte_class(value, mask):
+    """Возвращает фрагмент регулярного выражения для байта с маской"""
+    if mask == 0xFF:
+        return b"\\x%02x" % value
+    if mask == 0:
+        return b"."
+    candidates = [byte for byte in range(256) if byte & mask == value]
+    return b"[" + b"".join(b"\\x%02x" % byte for byte in candidates) + b"]"
+
+
+@lru_cache(maxsize=1024)
+def parse_signature(text):
+    """
+    Разбирает сигнатуру из запроса или базы
+
+    Args:
+        text (str): hex-строка, возможно с масками и промежутками
+
+    Returns:
+        bytes | MaskedSignature: Байты для обычной сигнатуры, скомпилированная
+            сигнатура - если в ней есть маски
+    """
+    if "?" in text or "[" in text:
+        return MaskedSignature(text)
+    return bytes.fromhex(text)
+
+
+def parse_signatures(signatures):
+    """
+    Преобразует набор hex-сигнатур в словарь идентификатор -> байты
+
+    Args:
+        signatures (dict | list): Словарь {id: hex} или список hex-строк
+            (идентификатором служит индекс в списке)
+
+    Returns:
+        dict: Сигнатуры в виде bytes (MaskedSignature для сигнатур с масками)
+    """
+    if isinstance(signatures, dict):
+        items = signatures.items()
+    elif isinstance(signatures, list):
+        items = enumerate(signatures)
+    else:
+        raise ValueError("signatures must be an object or a list")
+
+    parsed = {}
+    for signature_id, signature_hex in items:
+        signature = parse_signature(signature_hex)
+        if not isinstance(signature, MaskedSignature) and not signature:
+            raise ValueError(f"Empty signature: {signature_id}")
+        parsed[str(signature_id)] = signature
+    return parsed
+
+
+def is_match(result):
+    """
+    Проверяет по результату проверки файла, найдена ли хотя бы одна сигнатура
+
+    Args:
+        result (dict): Ответ check_file_signature или check_file_signatures
+
+    Returns:
+        bool: True, если найдено хотя бы одно вхождение
+    """
+    if "count" in result:
+        return result["count"] > 0
+    if "counts" in result:
+        return bool(result["counts"])
+    return result.get("offsets", "not found") != "not found"
+
+
+# Наборы, в которых не больше стольких сигнатур без масок, ищутся через
+# bytes.find по каждой сигнатуре. Один find проходит около 1.4 ГБ/с, автомат
+# на Python - 6-12 МБ/с независимо от размера набора, поэтому find быстрее,
+# пока сигнатур не больше ~128 (замер на случайных данных, см. также
+# benchmarks/engine_bench.py)
+FIND_SEARCH_MAX_SIGNATURES = 128
+
+
+class MultiSignatureMatcher:
+    """
+    Поиск множества сигнатур за один проход по файлу
+
+    Небольшие наборы (до FIND_SEARCH_MAX_SIGNATURES сигнатур) ищутся в
+    каждом блоке через bytes.find по каждой сигнатуре, для больших
+    строится автомат Ахо-Корасик. Матчер строится один раз и может
+    использоваться из нескольких потоков одновременно: состояние поиска
+    хранится у вызывающего кода. Сигнатуры с масками ищутся по тем же
+    блокам отдельно.
+    """
+
+    def __init__(self, signatures, key=None):
+        """
+        Args:
+            signatures (dict): Словарь идентификатор -> сигнатура (bytes или
+                MaskedSignature)
+            key (tuple | None): Идентификатор набора в базе сигнатур
+                (версия базы, имя набора), если автомат построен по базе
+        """
+        self.signature_ids = list(signatures)
+        self.signatures = signatures
+        self.key = key
+        self.masked = {
+            signature_id: signature for signature_id, signature in signatures.items()
+            if isinstance(signature, MaskedSignature)
+        }
+        self.plain = {
+            signature_id: signature for signature_id, signature in signatures.items()
+            if signature_id not in self.masked
+        }
+        self.use_find = len(self.plain) <= FIND_SEARCH_MAX_SIGNATURES
+        # Переходы бора: goto[state] = {byte: next_state}
+        self._goto = [{}]
+        self._fail = [0]
+        # Для каждого состояния - кортеж (id, длина) всех заканчивающихся в нем сигнатур
+        self._output = [()]
+
+        if not self.use_find:
+            for signature_id, signature in self.plain.items():
+                self._add(signature_id, signature)
+            self._build_failure_links()
+
+        # Переходы из корня развернуты в полную таблицу на 256 байт
+        root = self._goto[0]
+        self._root_row = [root.get(byte, 0) for byte in range(256)]
+
+    def _add(self, signature_id, signature):
+        """Добавляет сигнатуру в бор"""
+        state = 0
+        for byte in signature:
+            next_state = self._goto[state].get(byte)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+                self._goto[state][byte] = next_state
+            state = next_state
+        self._output[state] += ((signature_id, len(signature)),)
+
+    def _build_failure_links(self):
+        """Строит суффиксные ссылки обходом бора в ширину"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for byte, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and byte not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(byte, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def search(self, data, state, base, results):
+        """
+        Продолжает поиск по очередному фрагменту данных
+
+        Args:
+            data (bytes): Фрагмент данных
+            state (int): Состояние автомата после предыдущего фрагмента
+            base (int): Офсет начала фрагмента в файле
+            results (_SetResults): Результаты, дополняются найденными
+
+        Returns:
+            int: Состояние автомата после обработки фрагмента
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        root_row = self._root_row
+        add = results.add
+        done = results.done
+
+        for index, byte in enumerate(data):
+            while state:
+                next_state = goto[state].get(byte)
+                if next_state is not None:
+                    state = next_state
+                    break
+                state = fail[state]
+            else:
+                state = root_row[byte]
+
+            if output[state]:
+                end = base + index + 1
+                for signature_id, length in output[state]:
+                    if signature_id not in done:
+                        add(signature_id, end - length)
+
+        return state
+
+    def scan(self, file, chunk_size, options=DEFAULT_SCAN_OPTIONS):
+        """
+        Сканирует файл блоками за один проход
+
+        Args:
+            file: Файл, открытый в бинарном режиме
+            chunk_size (int): Размер блока чтения
+            options (ScanOptions): Диапазон, предел числа офсетов и режим
+                подсчета; сигнатура, достигшая предела, дальше не ищется, а
+                сканирование прекращается, как только предела достигли все
+                сигнатуры набора
+
+        Returns:
+            dict: Словарь id -> list офсетов (id -> число вхождений для
+                count_only) для найденных сигнатур
+        """
+        results = _SetResults(options)
+        state = 0
+        base = options.start
+        remaining = None if options.end is None else options.end - options.start
+        if base:
+            file.seek(base)
+
+        masked_scan = _MaskedSetScan(self.masked, base) if self.masked else None
+        find_scan = _FindSetScan(self.plain, base) if self.use_find and self.plain else None
+
+        while remaining != 0:
+            chunk = file.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if find_scan is not None:
+                find_scan.feed(chunk, results)
+            elif not self.use_find:
+                state = self.search(chunk, state, base, results)
+            if masked_scan is not None:
+                masked_scan.feed(chunk, results)
+            base += len(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+
+            if len(results.done) == len(self.signature_ids):
+                masked_scan = None
+                break
+
+        if masked_scan is not None:
+            masked_scan.finish(results)
+        return results.found
+
+
+class _SetResults:
+    """
+    Результаты поиска набора сигнатур
+
+    Для каждой сигнатуры хранятся офсеты, а в режиме count_only - только
+    число вхождений. Сигнатура, достигшая предела max_offsets, попадает в
+    done, и ее вхождения больше не добавляются.
+    """
+
+    def __init__(self, options):
+        self.count_only = options.count_only
+        self.limit = options.max_offsets
+        self.found = {}
+        self.done = set()
+
+    def add(self, signature_id, offset):
+        """
+        Добавляет вхождение сигнатуры
+
+        Returns:
+            bool: False, если сигнатура достигла предела
+        """
+        if self.count_only:
+            count = self.found.get(signature_id, 0) + 1
+            self.found[signature_id] = count
+        else:
+            offsets = self.found.get(signature_id)
+            if offsets is None:
+                offsets = self.found[signature_id] = []
+            offsets.append(offset)
+            count = len(offsets)
+        if count == self.limit:
+            self.done.add(signature_id)
+            return False
+        return True
+
+
+class _FindSetScan:
+    """
+    Потоковый поиск сигнатур без масок через bytes.find по каждой сигнатуре
+
+    Между блоками сохраняется max_len - 1 последних байт. Для каждой
+    сигнатуры запоминается первое еще не проверенное начало, поэтому
+    вхождения, попавшие в перекрытие, не сообщаются дважды.
+    """
+
+    def __init__(self, signatures, base):
+        self.signatures = signatures
+        self.overlap = max(len(signature) for signature in signatures.values()) - 1
+        self.pending = b""
+        self.base = base  # Офсет начала self.pending в файле
+        # Первое еще не проверенное начало (офсет в файле) для каждой сигнатуры
+        self.next_start = dict.fromkeys(signatures, base)
+
+    def feed(self, chunk, results):
+        data = self.pending + chunk if self.pending else chunk
+        base = self.base
+        for signature_id, signature in self.signatures.items():
+            if signature_id in results.done:
+                continue
+            offset = data.find(signature, self.next_start[signature_id] - base)
+            while offset != -1 and results.add(signature_id, base + offset):
+                offset = data.find(signature, offset + 1)
+            # Начала, для которых вхождение целиком помещается в data, проверены
+            self.next_start[signature_id] = max(
+                self.next_start[signature_id], base + len(data) - len(signature) + 1
+            )
+
+        keep = min(self.overlap, len(data))
+        self.pending = data[len(data) - keep:]
+        self.base += len(data) - keep
+
+
+class _MaskedSetScan:
+    """
+    Потоковый поиск сигнатур с масками по блокам, которые читает автомат
+
+    Между блоками сохраняется max_len - 1 последних байт. В очередном
+    блоке проверяются только те начала, для которых в буфере помещается
+    вхождение максимальной длины (остальные проверяются со следующим
+    блоком), и лишь в конце файла - все оставшиеся.
+    """
+
+    def __init__(self, signatures, base):
+        self.signatures = signatures
+        self.overlap = max(signature.max_len for signature in signatures.values()) - 1
+        self.pending = b""
+        self.base = base  # Офсет начала self.pending в файле
+        # Первое еще не проверенное начало (офсет в файле) для каждой сигнатуры
+        self.next_start = dict.fromkeys(signatures, base)
+
+    def feed(self, chunk, results):
+        data = self.pending + chunk
+        self._search(data, results, final=False)
+        keep = min(self.overlap, len(data))
+        self.pending = data[len(data) - keep:]
+        self.base += len(data) - keep
+
+    def finish(self, results):
+        self._search(self.pending, results, final=True)
+
+    def _search(self, data, results, final):
+        for signature_id, signature in self.signatures.items():
+            if signature_id in results.done:
+                continue
+            first = self.next_start[signature_id] - self.base
+            last = len(data) - (signature.min_len if final else signature.max_len)
+            if last < first:
+                continue
+            for start in signature.find(data, first, last, len(data)):
+                if not results.add(signature_id, self.base + start):
+                    break
+            self.next_start[signature_id] = self.base + last + 1
+
 
 class SignatureChecker:
     """Класс для проверки файлов на наличие сигнатур"""
-    def check_file_signature(self, file_path, signature_hex):
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, mmap_threshold=DEFAULT_MMAP_THRESHOLD,
+                 result_cache=None, metrics=None):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        self.config = SignatureCheckerConfig(chunk_size, mmap_threshold)
+        self.result_cache = result_cache
+        self.metrics = metrics or REGISTRY
+        self._scan_seconds = self.metrics.histogram(
+            "stage_seconds", "Request processing stage latency", {"stage": "scan"}
+        )
+        self._scanned_bytes = self.metrics.counter("scanned_bytes_total", "Bytes of files scanned")
+        self._scanned_bytes_rate = self.metrics.rate("scanned_bytes")
+
+    def check_file_signature(self, file_path, signature_hex, options=DEFAULT_SCAN_OPTIONS):
         """
         Проверяет файл на наличие сигнатуры
-        
+
         Args:
             file_path (str): Путь к файлу
-            signature_hex (str): Сигнатура в hex формате
-            
+            signature_hex (str | bytes | MaskedSignature): Сигнатура в hex
+                формате (возможно, с масками) либо уже разобранная сигнатура
+            options (ScanOptions): Диапазон, предел числа офсетов и режим подсчета
+
         Returns:
             dict: Результат проверки с офсетами или ошибкой
         """
@@ -17,20 +662,369 @@ class SignatureChecker:
             return {"error": "File not found"}
 
         try:
-            signature = bytes.fromhex(signature_hex)
-            offsets = []
+            if isinstance(signature_hex, (bytes, MaskedSignature)):
+                signature = signature_hex
+            else:
+                signature = parse_signature(signature_hex)
+            if not signature:
+                return {"error": "Empty signature"}
 
-            with open(file_path, "rb") as file:
-                content = file.read()
-                offset = content.find(signature)
-                while offset != -1:
-                    offsets.append(offset)
-                    offset = content.find(signature, offset + 1)
+            cache = self.result_cache
+            if cache is not None:
+                key = signature.cache_key if isinstance(signature, MaskedSignature) else signature
+                if options == DEFAULT_SCAN_OPTIONS:
+                    signature_digest = cache.digest(key)
+                else:
+                    signature_digest = cache.digest(key, repr(options).encode())
+                cached = cache.get(cache.make_key(os.stat(file_path), signature_digest))
+                if cached is not None:
+                    return cached
+
+            # Ключ берется от открытого дескриптора: если файл подменили
+            # после stat, результат сохранится для фактически прочитанного файла
+            started = time.perf_counter()
+            offsets, file_stat = self._scan_path(file_path, signature, options)
+            self._record_scan(started, file_stat, options)
+            result = options.make_result(offsets)
+
+            if cache is not None:
+                cache.put(cache.make_key(file_stat, signature_digest), result)
+            return result
+
+        except Exception as e:
+            return {"error": f"Error checking signature: {str(e)}"}
+
+    def check_file_signatures(self, file_path, signatures, options=DEFAULT_SCAN_OPTIONS):
+        """
+        Проверяет файл сразу на множество сигнатур за одно чтение
 
-            if offsets:
-                return {"offsets": offsets}
+        Args:
+            file_path (str): Путь к файлу
+            signatures (dict | list | MultiSignatureMatcher): Сигнатуры в hex
+                формате либо заранее скомпилированный автомат
+            options (ScanOptions): Диапазон, предел числа офсетов и режим подсчета
+
+        Returns:
+            dict: Офсеты по идентификаторам сигнатур или ошибка
+        """
+        if not os.path.exists(file_path):
+            return {"error": "File not found"}
+
+        try:
+            started = time.perf_counter()
+            results, file_stat = self._scan_path_multi(file_path, signatures, options)
+            self._record_scan(started, file_stat, options)
+            return options.make_multi_result(results)
+
+        except Exception as e:
+            return {"error": f"Error checking signatures: {str(e)}"}
+
+    def check_open_file(self, file, signatures, options=DEFAULT_SCAN_OPTIONS):
+        """
+        Проверяет уже открытый файл на одну сигнатуру или набор сигнатур
+
+        Файл сканируется в текущем процессе через переданный дескриптор,
+        минуя кэш результатов, чтобы вызывающий код мог дальше работать
+        именно с проверенным файлом.
+
+        Args:
+            file: Файл, открытый в двоичном режиме
+            signatures (str | bytes | MaskedSignature | dict | list | MultiSignatureMatcher):
+                Одна сигнатура (hex, bytes или с масками) либо набор сигнатур
+            options (ScanOptions): Диапазон, предел числа офсетов и режим подсчета
+
+        Returns:
+            dict: Результат проверки с офсетами или ошибкой
+        """
+        try:
+            started = time.perf_counter()
+            file_stat = os.fstat(file.fileno())
+            if isinstance(signatures, (str, bytes, MaskedSignature)):
+                signature = parse_signature(signatures) if isinstance(signatures, str) else signatures
+                if not signature:
+                    return {"error": "Empty signature"}
+                result = options.make_result(self._scan_file(file, signature, options))
             else:
-                return {"offsets": "not found"}
+                if not isinstance(signatures, MultiSignatureMatcher):
+                    signatures = MultiSignatureMatcher(parse_signatures(signatures))
+                result = options.make_multi_result(signatures.scan(file, self.config.chunk_size, options))
+            self._record_scan(started, file_stat, options)
+            return result
 
         except Exception as e:
             return {"error": f"Error checking signature: {str(e)}"}
+
+    def compile_signatures(self, signatures):
+        """
+        Готовит набор сигнатур к многократному использованию
+
+        Returns:
+            MultiSignatureMatcher: Скомпилированный автомат
+        """
+        if isinstance(signatures, MultiSignatureMatcher):
+            return signatures
+        return MultiSignatureMatcher(parse_signatures(signatures))
+
+    def close(self):
+        """Освобождает ресурсы проверки (для совместимости с другими реализациями)"""
+
+    def _record_scan(self, started, file_stat, options=DEFAULT_SCAN_OPTIONS):
+        """Учитывает в метриках длительность сканирования и объем прочитанных данных"""
+        self._scan_seconds.observe(time.perf_counter() - started)
+        # При раннем выходе фактически прочитано меньше - это оценка сверху
+        size = options.scanned_bytes(file_stat.st_size)
+        self._scanned_bytes.inc(size)
+        self._scanned_bytes_rate.add(size)
+
+    def _scan_path(self, file_path, signature, options=DEFAULT_SCAN_OPTIONS):
+        """
+        Открывает и сканирует файл на одну сигнатуру
+
+        Returns:
+            tuple: Список офсетов (или их число для count_only) и
+                os.stat_result открытого файла
+        """
+        with open(file_path, "rb") as file:
+            file_stat = os.fstat(file.fileno())
+            return self._scan_file(file, signature, options), file_stat
+
+    def _scan_path_multi(self, file_path, signatures, options=DEFAULT_SCAN_OPTIONS):
+        """
+        Открывает и сканирует файл на множество сигнатур
+
+        Returns:
+            tuple: Словарь id -> list офсетов для найденных сигнатур и
+                os.stat_result открытого файла
+        """
+        if isinstance(signatures, MultiSignatureMatcher):
+            matcher = signatures
+        else:
+            matcher = MultiSignatureMatcher(parse_signatures(signatures))
+
+        with open(file_path, "rb") as file:
+            file_stat = os.fstat(file.fileno())
+            return matcher.scan(file, self.config.chunk_size, options), file_stat
+
+    def _scan_file(self, file, signature, options=DEFAULT_SCAN_OPTIONS):
+        """
+        Выбирает способ сканирования открытого файла
+
+        Большие обычные файлы отображаются в память, остальные (пустые,
+        специальные, а также файлы, которые не удалось отобразить)
+        читаются блоками.
+        """
+        masked = isinstance(signature, MaskedSignature)
+        mapped = self._map_file(file)
+        if mapped is None:
+            if masked:
+                return self._scan_chunked_masked(file, signature, options)
+            return self._scan_chunked(file, signature, options)
+
+        with mapped:
+            if masked:
+                return self._scan_mapped_masked(mapped, signature, options)
+            return self._scan_mapped(mapped, signature, options)
+
+    def _map_file(self, file):
+        """
+        Отображает файл в память, если это возможно и оправдано
+
+        Returns:
+            mmap.mmap | None: Отображение только для чтения или None
+        """
+        threshold = self.config.mmap_threshold
+        if threshold < 0:
+            return None
+
+        try:
+            file_stat = os.fstat(file.fileno())
+        except (OSError, ValueError):
+            return None
+
+        # mmap не поддерживает пустые файлы, а у специальных файлов
+        # (каналы, устройства) размер не отражает объем данных
+        if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size == 0:
+            return None
+        if file_stat.st_size < threshold:
+            return None
+
+        try:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, OverflowError):
+            return None
+
+        if hasattr(mapped, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            try:
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            except OSError:
+                pass
+        return mapped
+
+    def _scan_mapped(self, mapped, signature, options=DEFAULT_SCAN_OPTIONS):
+        """
+        Ищет сигнатуру в отображенном в память файле
+
+        Поиск выполняется непосредственно по страницам отображения, без
+        копирования содержимого файла в объект bytes.
+
+        Args:
+            mapped (mmap.mmap): Отображение файла
+            signature (bytes): Искомая сигнатура
+            options (ScanOptions): Диапазон, предел и режим подсчета
+
+        Returns:
+            list | int: Офсеты всех (в том числе перекрывающихся) вхождений
+                или их число для count_only
+        """
+        offsets = []
+        found = 0
+        collect = not options.count_only
+        limit = options.max_offsets
+        end = len(mapped) if options.end is None else min(options.end, len(mapped))
+
+        offset = mapped.find(signature, options.start, end)
+        while offset != -1:
+            found += 1
+            if collect:
+                offsets.append(offset)
+            if found == limit:
+                break
+            offset = mapped.find(signature, offset + 1, end)
+        return offsets if collect else found
+
+    def _scan_chunked(self, file, signature, options=DEFAULT_SCAN_OPTIONS):
+        """
+        Потоково ищет сигнатуру в файле блоками фиксированного размера
+
+        Между соседними блоками сохраняется перекрытие в len(signature) - 1
+        байт, поэтому вхождения на границе блоков не теряются, а одно и то же
+        вхождение не попадает в результат дважды. Пиковое потребление памяти
+        ограничено размером блока.
+
+        Args:
+            file: Файл, открытый в бинарном режиме
+            signature (bytes): Искомая сигнатура
+            options (ScanOptions): Диапазон, предел и режим подсчета
+
+        Returns:
+            list | int: Офсеты всех (в том числе перекрывающихся) вхождений
+                или их число для count_only
+        """
+        offsets = []
+        found = 0
+        collect = not options.count_only
+        limit = options.max_offsets
+        overlap = len(signature) - 1
+        buffer = bytearray(overlap + self.config.chunk_size)
+        view = memoryview(buffer)
+        filled = 0  # Байты, перенесенные из предыдущего блока
+        base = options.start  # Офсет начала буфера в файле
+        # Сколько байт диапазона осталось прочитать (None - до конца файла)
+        remaining = None if options.end is None else options.end - options.start
+        if base:
+            file.seek(base)
+
+        try:
+            while remaining != 0:
+                target = view[filled:] if remaining is None else view[filled:filled + remaining]
+                read = file.readinto(target)
+                if not read:
+                    break
+                if remaining is not None:
+                    remaining -= read
+
+                end = filled + read
+                offset = buffer.find(signature, 0, end)
+                while offset != -1:
+                    found += 1
+                    if collect:
+                        offsets.append(base + offset)
+                    if found == limit:
+                        return offsets if collect else found
+                    offset = buffer.find(signature, offset + 1, end)
+
+                # Переносим хвост блока в начало буфера
+                filled = min(overlap, end)
+                buffer[:filled] = buffer[end - filled:end]
+                base += end - filled
+        finally:
+            view.release()
+
+        return offsets if collect else found
+
+    def _scan_mapped_masked(self, mapped, signature, options=DEFAULT_SCAN_OPTIONS):
+        """
+        Ищет сигнатуру с масками в отображенном в память файле
+
+        Returns:
+            list | int: Офсеты вхождений или их число для count_only
+        """
+        offsets = []
+        found = 0
+        collect = not options.count_only
+        limit = options.max_offsets
+        end = len(mapped) if options.end is None else min(options.end, len(mapped))
+
+        for offset in signature.find(mapped, options.start, end - signature.min_len, end):
+            found += 1
+            if collect:
+                offsets.append(offset)
+            if found == limit:
+                break
+        return offsets if collect else found
+
+    def _scan_chunked_masked(self, file, signature, options=DEFAULT_SCAN_OPTIONS):
+        """
+        Потоково ищет сигнатуру с масками блоками фиксированного размера
+
+        Перекрытие между блоками - signature.max_len - 1 байт. В каждом блоке
+        проверяются только начала, для которых вхождение максимальной длины
+        целиком помещается в буфер; остальные начала переносятся вместе с
+        перекрытием в следующий блок, а в конце файла проверяются все
+        оставшиеся. Так каждое начало проверяется ровно один раз.
+
+        Returns:
+            list | int: Офсеты вхождений или их число для count_only
+        """
+        offsets = []
+        found = 0
+        collect = not options.count_only
+        limit = options.max_offsets
+        overlap = signature.max_len - 1
+        buffer = bytearray(overlap + self.config.chunk_size)
+        view = memoryview(buffer)
+        filled = 0
+        base = options.start
+        remaining = None if options.end is None else options.end - options.start
+        if base:
+            file.seek(base)
+
+        try:
+            while True:
+                read = 0
+                if remaining != 0:
+                    target = view[filled:] if remaining is None else view[filled:filled + remaining]
+                    read = file.readinto(target)
+                    if remaining is not None:
+                        remaining -= read
+
+                end = filled + read
+                final = not read
+                last = end - (signature.min_len if final else signature.max_len)
+                for offset in signature.find(buffer, 0, last, end):
+                    found += 1
+                    if collect:
+                        offsets.append(base + offset)
+                    if found == limit:
+                        return offsets if collect else found
+                if final:
+                    break
+
+                # Непроверенные начала (с end - overlap) переносятся в начало буфера
+                filled = min(overlap, end)
+                buffer[:filled] = buffer[end - filled:end]
+                base += end - filled
+        finally:
+            view.release()
+
+        return offsets if collect else found
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Tuple, Union
+from .signature_checker import MaskedSignature, MultiSignatureMatcher, parse_signatures
+
+logger = logging.getLogger(__name__)
+
+# Имя набора, включающего все сигнатуры базы
+ALL_SIGNATURES_SET = "all"
+
+@dataclass(frozen=True)
+class SignatureIndex:
+    """Скомпилированный неизменяемый снимок базы сигнатур"""
+    version: str
+    signatures: Dict[str, Union[bytes, MaskedSignature]]
+    sets: Dict[str, Tuple[str, ...]]
+    matchers: Dict[str, MultiSignatureMatcher] = field(repr=False)
+
+    def get_signature(self, signature_id: str) -> Union[bytes, MaskedSignature]:
+        """Возвращает сигнатуру по идентификатору"""
+        try:
+            return self.signatures[signature_id]
+        except KeyError:
+            raise KeyError(f"Unknown signature id: {signature_id}") from None
+
+    def get_matcher(self, set_name: str) -> MultiSignatureMatcher:
+        """Возвращает скомпилированный автомат для набора сигнатур"""
+        try:
+            return self.matchers[set_name]
+        except KeyError:
+            raise KeyError(f"Unknown signature set: {set_name}") from None
+
+class SignatureDatabase:
+    """
+    База сигнатур, загружаемая на сервере при старте
+
+    Файл базы - JSON вида:
+        {"signatures": {"<id>": "<hex, возможно с масками>", ...},
+         "sets": {"<name>": ["<id>", ...], ...}}
+
+    Текущий индекс подменяется целиком одной операцией присваивания,
+    поэтому сканирования, уже получившие ссылку на старый индекс,
+    спокойно дорабатывают с ним.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._reload_lock = threading.Lock()
+        self._index = self._load()
+
+    @property
+    def index(self) -> SignatureIndex:
+        """Текущий скомпилированный индекс"""
+        return self._index
+
+    def reload(self) -> bool:
+        """
+        Перечитывает файл базы и атомарно подменяет индекс
+
+        Returns:
+            bool: True, если индекс обновлен; при ошибке остается прежний
+        """
+        with self._reload_lock:
+            try:
+                index = self._load()
+            except Exception as e:
+                logger.error("Failed to reload signature database %s: %s", self.path, e)
+                return False
+
+            self._index = index
+            logger.info("Signature database reloaded: %d signatures, version %s", len(index.signatures), index.version)
+            return True
+
+    def _load(self) -> SignatureIndex:
+        """Читает и компилирует файл базы"""
+        with open(self.path, "rb") as file:
+            raw = file.read()
+
+        data = json.loads(raw)
+        signatures = parse_signatures(data.get("signatures", {}))
+
+        sets: Dict[str, Tuple[str, ...]] = {ALL_SIGNATURES_SET: tuple(signatures)}
+        for set_name, signature_ids in data.get("sets", {}).items():
+            missing = [signature_id for signature_id in signature_ids if signature_id not in signatures]
+            if missing:
+                raise ValueError(f"Set {set_name} refers to unknown signatures: {missing}")
+            sets[set_name] = tuple(signature_ids)
+
+        version = hashlib.sha256(raw).hexdigest()[:16]
+        matchers = {
+            set_name: MultiSignatureMatcher(
+                {signature_id: signatures[signature_id] for signature_id in signature_ids},
+                key=(version, set_name)
+            )
+            for set_name, signature_ids in sets.items()
+        }
+
+        return SignatureIndex(
+            version=version,
+            signatures=signatures,
+            sets=sets,
+            matchers=matchers
+        )
@@ -0,0 +1,125 @@
+import logging
+import os
+import signal
+import threading
+import traceback
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class ProcessSupervisor:
+    """
+    Запускает несколько процессов сервера и координирует их остановку
+
+    Каждый процесс создается через fork и выполняет target(index) - обычно
+    полноценный сервер со своим прослушивающим сокетом (SO_REUSEPORT),
+    пулом исполнителей и журналом. Сигналы SIGINT и SIGTERM, полученные
+    родительским процессом, пересылаются всем процессам; процессы, не
+    завершившиеся за shutdown_timeout секунд, завершаются SIGKILL. SIGHUP
+    пересылается без остановки (перечитывание базы сигнатур). Если процесс
+    завершился сам, останавливаются и остальные: сервер с частью
+    процессов продолжал бы принимать соединения на тот же порт.
+    """
+
+    def __init__(self, process_count: int, target: Callable[[int], None], shutdown_timeout: float = 10.0) -> None:
+        self.process_count = process_count
+        self.target = target
+        self.shutdown_timeout = shutdown_timeout
+        # pid -> номер процесса
+        self.children: Dict[int, int] = {}
+        self.stopping = False
+        self.failed = False
+        self._kill_timer: Optional[threading.Timer] = None
+
+    def start(self) -> None:
+        """
+        Запускает процессы
+
+        Вызывается до создания потоков в родительском процессе: после fork
+        в дочернем процессе остается только вызывающий поток.
+        """
+        # До установки своих обработчиков процессы наследуют эту реакцию:
+        # пересланный SIGHUP не должен завершить еще не настроенный процесс
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        for index in range(self.process_count):
+            self._spawn(index)
+
+        signal.signal(signal.SIGINT, self._stop_handler)
+        signal.signal(signal.SIGTERM, self._stop_handler)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, lambda signum, frame: self._forward(signum))
+
+    def wait(self) -> int:
+        """
+        Ожидает завершения всех процессов
+
+        Returns:
+            int: Код завершения: 0, если все процессы остановлены по сигналу
+                и завершились успешно
+        """
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+
+            index = self.children.pop(pid, None)
+            if index is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if code != 0:
+                self.failed = True
+            if not self.stopping:
+                logger.error("Server process %d (pid %d) exited with code %d, stopping the others", index, pid, code)
+                self.failed = True
+                self.stop(signal.SIGTERM)
+
+        if self._kill_timer is not None:
+            self._kill_timer.cancel()
+        return 1 if self.failed else 0
+
+    def stop(self, signum: int = signal.SIGTERM) -> None:
+        """Пересылает сигнал остановки всем процессам"""
+        self.stopping = True
+        self._forward(signum)
+        if self._kill_timer is None:
+            self._kill_timer = threading.Timer(self.shutdown_timeout, self._kill)
+            self._kill_timer.daemon = True
+            self._kill_timer.start()
+
+    def _stop_handler(self, signum: int, frame) -> None:
+        if not self.stopping:
+            logger.info("Stopping %d server processes", len(self.children))
+        self.stop(signum)
+
+    def _spawn(self, index: int) -> None:
+        """Создает процесс сервера с номером index"""
+        pid = os.fork()
+        if pid:
+            self.children[pid] = index
+            return
+
+        code = 0
+        try:
+            self.target(index)
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 0
+        except BaseException:
+            # Журнал процесса к этому моменту уже остановлен
+            traceback.print_exc()
+            code = 1
+        finally:
+            # Дочерний процесс не должен возвращаться в код родителя
+            os._exit(code)
+
+    def _forward(self, signum: int) -> None:
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _kill(self) -> None:
+        logger.warning("Server processes did not stop in %.0f seconds, killing them", self.shutdown_timeout)
+        self._forward(signal.SIGKILL)
@@ -1,10 +1,13 @@
 import socket
 import logging
+import time
 from typing import Optional
 from dataclasses import dataclass
 from .worker import WorkerPool
 from .handler import RequestHandler
 
+logger = logging.getLogger(__name__)
+
 @dataclass
 class ServerConfig:
     """Конфигурация сервера"""
@@ -12,8 +15,12 @@ class ServerConfig:
     port: int
     thread_count: int
     enable_logging: bool = False
-    socket_backlog: int = 5
+    socket_backlog: int = 128
     socket_reuse_addr: bool = True
+    # Несколько процессов слушают один порт, соединения распределяет ядро
+    socket_reuse_port: bool = False
+    # Максимальное число запросов, ожидающих свободного исполнителя
+    queue_size: int = 128
 
 class TCPServer:
     """TCP сервер для обработки клиентских соединений"""
@@ -22,8 +29,13 @@ class TCPServer:
         self.config = config
         self.request_handler = request_handler
         self.server_socket: Optional[socket.socket] = None
-        self.worker_pool = WorkerPool(config.thread_count, request_handler)
+        self.worker_pool = WorkerPool(config.thread_count, request_handler, config.queue_size)
         self.running = False
+        request_handler.register_stats_provider("queue", self.worker_pool.stats)
+        self.accept_seconds = request_handler.stage_histogram("accept")
+        self.accepted_connections = request_handler.metrics.counter(
+            "connections_total", "Accepted client connections"
+        )
     
     def start(self) -> None:
         """Запускает сервер"""
@@ -41,9 +53,7 @@ class TCPServer:
     
     def shutdown(self) -> None:
         """Завершает работу сервера"""
-        print("Shutting down server")
-        if self.config.enable_logging:
-            logging.info("Shutting down server")
+        logger.info("Shutting down server")
         
         self.running = False
         if self.server_socket:
@@ -56,6 +66,8 @@ class TCPServer:
         
         if self.config.socket_reuse_addr:
             self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.config.socket_reuse_port:
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         
         self.server_socket.bind((self.config.host, self.config.port))
         self.server_socket.listen(self.config.socket_backlog)
@@ -63,19 +75,15 @@ class TCPServer:
     def _log_startup(self) -> None:
         """Логирует информацию о запуске сервера"""
         startup_message = f"Starting server on {self.config.host}:{self.config.port} with {self.config.thread_count} threads"
-        print(startup_message)
-        
-        if self.config.enable_logging:
-            logging.info(startup_message)
+        logger.info(startup_message)
     
     def _accept_connections(self) -> None:
         """Принимает входящие соединения"""
         while self.running:
             client_socket, client_address = self.server_socket.accept()
-            connection_message = f"Connection from {client_address}"
-            print(connection_message)
-            
-            if self.config.enable_logging:
-                logging.info(connection_message)
+            accepted_at = time.perf_counter()
+            self.accepted_connections.inc()
+            logger.info("Connection from %s", client_address)
             
-            self.worker_pool.add_task(client_socket)
\ No newline at end of file
+            self.worker_pool.add_task(client_socket)
+            self.accept_seconds.observe(time.perf_counter() - accepted_at)
\ No newline at end of file
@@ -0,0 +1,430 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from .directory_scanner import DirectoryScanner, TraversalOptions
+from .metrics import REGISTRY, MetricsRegistry
+from .signature_checker import is_match
+
+logger = logging.getLogger(__name__)
+
+# Фабрика проверки задания: по параметрам задания возвращает функцию
+# проверки одного файла и версию сигнатур (меняется вместе с базой
+# сигнатур и параметрами, влияющими на результат)
+CheckFactory = Callable[[Dict[str, Any]], Tuple[Callable[[str], Dict[str, Any]], str]]
+
+# Идентичность файла: устройство, inode, размер, mtime_ns
+FileIdentity = Tuple[int, int, int, int]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    name TEXT PRIMARY KEY,
+    params TEXT NOT NULL,
+    interval REAL NOT NULL,
+    next_run REAL NOT NULL,
+    passes INTEGER NOT NULL DEFAULT 0,
+    last_pass TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    job TEXT NOT NULL,
+    path TEXT NOT NULL,
+    dev INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    version TEXT NOT NULL,
+    result TEXT NOT NULL,
+    matched INTEGER NOT NULL,
+    pass INTEGER NOT NULL,
+    PRIMARY KEY (job, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_matched ON files (job, matched);
+"""
+
+@dataclass
+class WatchConfig:
+    """Конфигурация заданий повторной проверки"""
+    # Файл индекса SQLite с заданиями и результатами проверки файлов
+    index_path: str
+    # Выполнять задания в этом процессе (в режиме --processes - только в одном)
+    run_jobs: bool = True
+    # Период повторной проверки по умолчанию, секунды
+    default_interval: float = 300.0
+    # Период, с которым планировщик проверяет задания, секунды
+    poll_interval: float = 1.0
+    # Число записей индекса, сохраняемых одной транзакцией
+    batch_size: int = 500
+
+@dataclass
+class WatchJob:
+    """Задание повторной проверки дерева файлов"""
+    name: str
+    params: Dict[str, Any]
+    interval: float
+    next_run: float
+    passes: int
+    last_pass: Optional[Dict[str, Any]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "interval": self.interval,
+            "next_run": self.next_run,
+            "passes": self.passes,
+            "last_pass": self.last_pass
+        }
+
+class WatchIndex:
+    """
+    Индекс заданий и результатов проверки файлов в SQLite
+
+    Для каждого файла задания хранятся его идентичность (устройство, inode,
+    размер, mtime_ns), версия сигнатур и результат последней проверки.
+    Файл, у которого все это совпадает, при следующем проходе не читается.
+    База открывается в режиме WAL, поэтому чтение из потоков запросов и
+    других процессов сервера не блокируется записью прохода.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def save_job(self, name: str, params: Dict[str, Any], interval: float) -> None:
+        """Создает задание или заменяет его параметры; проход начнется сразу"""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO jobs (name, params, interval, next_run) VALUES (?, ?, ?, 0) "
+                "ON CONFLICT (name) DO UPDATE SET params = excluded.params, "
+                "interval = excluded.interval, next_run = 0",
+                (name, json.dumps(params), interval)
+            )
+
+    def remove_job(self, name: str, drop_files: bool = True) -> bool:
+        """Удаляет задание и (по умолчанию) записи его файлов"""
+        with self._lock, self._connection:
+            removed = self._connection.execute("DELETE FROM jobs WHERE name = ?", (name,)).rowcount
+            if drop_files:
+                self._connection.execute("DELETE FROM files WHERE job = ?", (name,))
+        return bool(removed)
+
+    def jobs(self, due_before: Optional[float] = None) -> List[WatchJob]:
+        """Возвращает задания (только те, чей проход должен начаться до due_before)"""
+        query = "SELECT name, params, interval, next_run, passes, last_pass FROM jobs"
+        args: Tuple[Any, ...] = ()
+        if due_before is not None:
+            query += " WHERE next_run <= ?"
+            args = (due_before,)
+        with self._lock:
+            rows = self._connection.execute(query + " ORDER BY next_run", args).fetchall()
+        return [
+            WatchJob(name, json.loads(params), interval, next_run, passes, json.loads(last_pass) if last_pass else None)
+            for name, params, interval, next_run, passes, last_pass in rows
+        ]
+
+    def job_exists(self, name: str) -> bool:
+        with self._lock:
+            row = self._connection.execute("SELECT 1 FROM jobs WHERE name = ?", (name,)).fetchone()
+        return row is not None
+
+    def schedule(self, name: str, next_run: float) -> None:
+        """Назначает время следующего прохода задания"""
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE jobs SET next_run = ? WHERE name = ?", (next_run, name))
+
+    def finish_pass(self, name: str, passes: int, summary: Dict[str, Any]) -> None:
+        """Сохраняет итог прохода"""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE jobs SET passes = ?, last_pass = ? WHERE name = ?",
+                (passes, json.dumps(summary), name)
+            )
+
+    def lookup(self, job: str, path: str) -> Optional[Tuple[FileIdentity, str]]:
+        """Возвращает идентичность файла и версию сигнатур последней проверки"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT dev, inode, size, mtime_ns, version FROM files WHERE job = ? AND path = ?",
+                (job, path)
+            ).fetchone()
+        if row is None:
+            return None
+        return tuple(row[:4]), row[4]
+
+    def touch(self, job: str, paths: List[str], pass_number: int) -> None:
+        """Отмечает неизмененные файлы как найденные в проходе pass_number"""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "UPDATE files SET pass = ? WHERE job = ? AND path = ?",
+                [(pass_number, job, path) for path in paths]
+            )
+
+    def store(self, job: str, rows: List[Tuple[str, FileIdentity, str, Dict[str, Any], bool]], pass_number: int) -> None:
+        """
+        Сохраняет результаты проверки: (путь, идентичность, версия, результат, совпадение)
+
+        Записи сохраняются, только если задание еще существует: проверка
+        выполняется в той же транзакции, поэтому удаленное параллельно
+        задание не оставляет записей в индексе.
+        """
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO files "
+                "(job, path, dev, inode, size, mtime_ns, version, result, matched, pass) "
+                "SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM jobs WHERE name = ?)",
+                [
+                    (job, path, *identity, version, json.dumps(result), int(matched), pass_number, job)
+                    for path, identity, version, result, matched in rows
+                ]
+            )
+
+    def remove_unseen(self, job: str, pass_number: int) -> int:
+        """Удаляет записи файлов, не найденных в проходе pass_number"""
+        with self._lock, self._connection:
+            return self._connection.execute(
+                "DELETE FROM files WHERE job = ? AND pass < ?", (job, pass_number)
+            ).rowcount
+
+    def counts(self, job: str) -> Tuple[int, int]:
+        """Возвращает число файлов задания в индексе и число файлов с совпадениями"""
+        with self._lock:
+            files, matched = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(matched), 0) FROM files WHERE job = ?", (job,)
+            ).fetchone()
+        return files, matched
+
+    def results(self, job: str, matched_only: bool, limit: int, offset: int) -> List[Dict[str, Any]]:
+        """Возвращает сохраненные результаты проверки файлов задания"""
+        query = "SELECT path, result FROM files WHERE job = ?"
+        if matched_only:
+            query += " AND matched = 1"
+        with self._lock:
+            rows = self._connection.execute(
+                query + " ORDER BY path LIMIT ? OFFSET ?", (job, limit, offset)
+            ).fetchall()
+        return [{"file_path": path, **json.loads(result)} for path, result in rows]
+
+class WatchManager:
+    """
+    Задания периодической повторной проверки деревьев файлов
+
+    Задание (каталоги, фильтры обхода, сигнатуры, период) хранится в
+    индексе, поэтому переживает перезапуск сервера. На каждом проходе
+    дерево обходится заново, но проверяются только новые и измененные
+    файлы, а также все файлы после смены версии сигнатур; для остальных
+    выполняется только stat и поиск в индексе. Стоимость прохода поэтому
+    определяется числом изменений, а не размером дерева. Записи исчезнувших
+    файлов удаляются в конце прохода.
+
+    Если в задании включен карантин, файлы с совпадениями сразу
+    перемещаются в карантин (см. CheckAndQuarantine) и в индекс не
+    записываются; файлы с ошибкой проверки тоже не записываются и
+    проверяются снова на следующем проходе.
+    """
+
+    def __init__(
+        self,
+        config: WatchConfig,
+        directory_scanner: DirectoryScanner,
+        metrics: Optional[MetricsRegistry] = None
+    ) -> None:
+        self.config = config
+        self.directory_scanner = directory_scanner
+        self.index = WatchIndex(config.index_path)
+        self.check_factory: Optional[CheckFactory] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.current_job: Optional[str] = None
+
+        metrics = metrics or REGISTRY
+        self.pass_seconds = metrics.histogram("watch_pass_seconds", "Duration of watch rescan passes")
+        self.scanned_files = metrics.counter("watch_files_total", "Files seen by watch passes", {"outcome": "scanned"})
+        self.unchanged_files = metrics.counter("watch_files_total", "Files seen by watch passes", {"outcome": "unchanged"})
+
+    def start(self, check_factory: CheckFactory) -> None:
+        """Запускает планировщик заданий (если задания выполняются в этом процессе)"""
+        self.check_factory = check_factory
+        if not self.config.run_jobs:
+            return
+        self.thread = threading.Thread(target=self._run, name="WatchScheduler", daemon=True)
+        self.thread.start()
+
+    def close(self) -> None:
+        """Останавливает планировщик, прерывая текущий проход"""
+        self._stop.set()
+        self._wake.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.index.close()
+
+    def add_job(self, name: str, params: Dict[str, Any], interval: float) -> None:
+        """Создает или заменяет задание; первый проход начинается сразу"""
+        self.index.save_job(name, params, interval)
+        self._wake.set()
+
+    def remove_job(self, name: str, drop_files: bool = True) -> bool:
+        """Удаляет задание; текущий проход задания прерывается"""
+        return self.index.remove_job(name, drop_files)
+
+    def status(self, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Возвращает состояние заданий: параметры последнего прохода и размер индекса"""
+        jobs = []
+        for job in self.index.jobs():
+            if name is not None and job.name != name:
+                continue
+            files, matched = self.index.counts(job.name)
+            jobs.append({**job.to_dict(), "running": job.name == self.current_job, "files": files, "matched": matched})
+        return jobs
+
+    def stats(self) -> Dict[str, Any]:
+        """Раздел watch команды Stats"""
+        return {"jobs": len(self.index.jobs()), "running": self.current_job}
+
+    def _run(self) -> None:
+        """Цикл планировщика: выполняет проходы заданий, срок которых наступил"""
+        while not self._stop.is_set():
+            for job in self.index.jobs(due_before=time.time()):
+                if self._stop.is_set():
+                    return
+                self.current_job = job.name
+                try:
+                    self._run_pass(job)
+                except Exception:
+                    logger.exception("Watch pass of job %s failed", job.name)
+                    self.index.finish_pass(job.name, job.passes, {"error": "Pass failed"})
+                finally:
+                    self.current_job = None
+            self._wake.wait(self.config.poll_interval)
+            self._wake.clear()
+
+    def _run_pass(self, job: WatchJob) -> None:
+        """Выполняет один проход задания"""
+        started = time.time()
+        pass_number = job.passes + 1
+        # Следующий проход назначается заранее: если задание заменят во
+        # время прохода, WatchStart сбросит время, и новый проход начнется сразу
+        self.index.schedule(job.name, started + job.interval)
+        summary = {
+            "pass": pass_number,
+            "started": started,
+            "files": 0,
+            "unchanged": 0,
+            "scanned": 0,
+            "matched": 0,
+            "quarantined": 0,
+            "errors": 0,
+            "removed": 0
+        }
+
+        try:
+            check, version = self.check_factory(job.params)
+        except (TypeError, ValueError) as e:
+            summary["error"] = str(e)
+            self.index.finish_pass(job.name, pass_number, summary)
+            return
+
+        paths = job.params.get("paths") or []
+        if isinstance(paths, str):
+            paths = [paths]
+        if job.params.get("root"):
+            paths = [job.params["root"], *paths]
+        options = TraversalOptions.from_params(job.params)
+
+        # Идентичность файлов, отправленных на проверку, по пути
+        identities: Dict[str, Optional[FileIdentity]] = {}
+        # Накопленные записи: результаты проверенных и пути неизмененных файлов
+        rows: List[Tuple[str, FileIdentity, str, Dict[str, Any], bool]] = []
+        unchanged: List[str] = []
+        aborted = False
+
+        def flush() -> bool:
+            """Сохраняет накопленные записи; False - проход прерван, ничего не записано"""
+            nonlocal aborted
+            if aborted or self._cancelled(job.name):
+                aborted = True
+                return False
+            self.index.store(job.name, rows, pass_number)
+            self.index.touch(job.name, unchanged, pass_number)
+            rows.clear()
+            unchanged.clear()
+            return True
+
+        def changed_files() -> Iterator[str]:
+            for file_path in self.directory_scanner.iter_files(paths, options):
+                summary["files"] += 1
+                if aborted or (summary["files"] % self.config.batch_size == 0 and self._cancelled(job.name)):
+                    return
+
+                try:
+                    file_stat = os.stat(file_path)
+                    identity = (file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+                except OSError:
+                    # Ошибку доступа к файлу сообщит проверка
+                    identity = None
+
+                if identity is not None and self.index.lookup(job.name, file_path) == (identity, version):
+                    summary["unchanged"] += 1
+                    unchanged.append(file_path)
+                    if len(unchanged) >= self.config.batch_size and not flush():
+                        return
+                    continue
+
+                identities[file_path] = identity
+                yield file_path
+
+        results = self.directory_scanner.scan(changed_files(), check)
+        try:
+            for file_path, result in results:
+                identity = identities.pop(file_path, None)
+                summary["scanned"] += 1
+                if "error" in result or identity is None:
+                    summary["errors"] += 1
+                    continue
+
+                matched = is_match(result)
+                summary["matched"] += matched
+                if "quarantined" in result:
+                    if result["quarantined"]:
+                        summary["quarantined"] += 1
+                    if matched:
+                        # Файл перемещен в карантин или будет перемещен на следующем проходе
+                        continue
+                    result = {key: value for key, value in result.items() if key != "quarantined"}
+
+                rows.append((file_path, identity, version, result, matched))
+                if len(rows) >= self.config.batch_size and not flush():
+                    break
+        finally:
+            results.close()
+
+        self.scanned_files.inc(summary["scanned"])
+        self.unchanged_files.inc(summary["unchanged"])
+        # После остановки сервера или удаления задания в индекс ничего не пишется
+        if not flush():
+            return
+
+        summary["removed"] = self.index.remove_unseen(job.name, pass_number)
+        summary["seconds"] = time.time() - started
+        self.pass_seconds.observe(summary["seconds"])
+        self.index.finish_pass(job.name, pass_number, summary)
+        logger.info(
+            "Watch job %s pass %d: %d files, %d scanned, %d matched, %d removed in %.2fs",
+            job.name, pass_number, summary["files"], summary["scanned"], summary["matched"],
+            summary["removed"], summary["seconds"]
+        )
+
+    def _cancelled(self, name: str) -> bool:
+        """Проход прерывается при остановке сервера или удалении задания"""
+        return self._stop.is_set() or not self.index.job_exists(name)
@@ -1,29 +1,232 @@
+import logging
+import selectors
 import threading
-from queue import Queue
-from typing import Optional
+import time
+from collections import deque
+from queue import Queue, Empty
+from typing import Any, Callable, Dict, Optional, Tuple
 from dataclasses import dataclass
 import socket
 from .handler import RequestHandler
+from .protocol import FRAME_HEADER, is_framed_connection
+
+logger = logging.getLogger(__name__)
+
+# Ответ при переполнении очереди. Кадрированному соединению он отправляется
+# одним кадром, одиночному запросу - как есть
+BUSY_RESPONSE = b'{"error": "Server busy", "busy": true}'
+FRAMED_BUSY_RESPONSE = FRAME_HEADER.pack(len(BUSY_RESPONSE)) + BUSY_RESPONSE
 
 @dataclass
 class WorkerPoolConfig:
     """Конфигурация пула потоков"""
     thread_count: int
     daemon_threads: bool = True
+    # Максимальное число соединений, ожидающих свободного потока
+    queue_size: int = 128
+
+class AdmissionStats:
+    """Потокобезопасные счетчики очереди допуска: глубина, ожидание, отказы"""
+    
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+    
+    def record_accepted(self, depth: int) -> None:
+        """Учитывает поставленную в очередь задачу и текущую глубину очереди"""
+        with self._lock:
+            self.accepted += 1
+            if depth > self.max_depth:
+                self.max_depth = depth
+    
+    def record_rejected(self) -> None:
+        """Учитывает отклоненную задачу"""
+        with self._lock:
+            self.rejected += 1
+    
+    def record_wait(self, wait: float) -> None:
+        """Учитывает время ожидания задачи в очереди"""
+        with self._lock:
+            self.wait_count += 1
+            self.wait_total += wait
+            if wait > self.wait_max:
+                self.wait_max = wait
+    
+    def snapshot(self, depth: int, capacity: int) -> Dict[str, Any]:
+        """Возвращает текущие значения счетчиков"""
+        with self._lock:
+            return {
+                "depth": depth,
+                "capacity": capacity,
+                "max_depth": self.max_depth,
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "wait_avg_ms": self.wait_total / self.wait_count * 1000 if self.wait_count else 0.0,
+                "wait_max_ms": self.wait_max * 1000
+            }
+
+class IdleConnections:
+    """
+    Постоянные соединения в ожидании следующего запроса
+    
+    Простаивающее соединение не занимает рабочий поток: оно ждет данных в
+    селекторе отдельного потока и, когда клиент присылает запрос, снова
+    передается пулу через on_ready (или через функцию, переданную в add).
+    Соединения, простаивающие дольше idle_timeout секунд, закрываются.
+    """
+    
+    # Период проверки простаивающих соединений на истечение таймаута, секунды
+    EXPIRY_CHECK_INTERVAL = 1.0
+    
+    def __init__(self, on_ready: Callable[[socket.socket], None], idle_timeout: Optional[float]) -> None:
+        self.on_ready = on_ready
+        self.idle_timeout = idle_timeout
+        self.selector = selectors.DefaultSelector()
+        # Соединение -> момент, после которого оно закрывается
+        self.deadlines: Dict[socket.socket, float] = {}
+        # Селектор используется только потоком монитора, остальные потоки
+        # добавляют соединения через очередь и пробуждают его
+        self._pending: deque = deque()
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+        self.selector.register(self._wakeup_reader, selectors.EVENT_READ)
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+    
+    def start(self) -> None:
+        """Запускает поток ожидания"""
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="IdleConnections", daemon=True)
+        self.thread.start()
+    
+    def add(
+        self,
+        client_socket: socket.socket,
+        on_ready: Optional[Callable[[socket.socket], None]] = None
+    ) -> None:
+        """
+        Откладывает соединение до прихода следующего запроса
+
+        Args:
+            client_socket: Соединение
+            on_ready: Вызывается в потоке монитора, когда на соединение
+                пришли данные (по умолчанию - on_ready монитора)
+        """
+        if not self.running:
+            client_socket.close()
+            return
+        self._pending.append((client_socket, on_ready or self.on_ready))
+        self._wake()
+    
+    def count(self) -> int:
+        """Число простаивающих соединений"""
+        return len(self.deadlines) + len(self._pending)
+    
+    def stop(self) -> None:
+        """Останавливает поток и закрывает простаивающие соединения"""
+        self.running = False
+        self._wake()
+        if self.thread is not None:
+            self.thread.join()
+        self._register_pending()
+        for client_socket in list(self.deadlines):
+            self.selector.unregister(client_socket)
+            client_socket.close()
+        self.deadlines.clear()
+        self.selector.close()
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+    
+    def _wake(self) -> None:
+        try:
+            self._wakeup_writer.send(b"\0")
+        except (BlockingIOError, OSError):
+            # Буфер полон - поток и так будет разбужен
+            pass
+    
+    def _run(self) -> None:
+        next_expiry_check = time.monotonic() + self.EXPIRY_CHECK_INTERVAL
+        while self.running:
+            for key, _ in self.selector.select(self.EXPIRY_CHECK_INTERVAL):
+                if key.fileobj is self._wakeup_reader:
+                    self._drain_wakeups()
+                    continue
+                client_socket = key.fileobj
+                self.selector.unregister(client_socket)
+                del self.deadlines[client_socket]
+                key.data(client_socket)
+            self._register_pending()
+            
+            now = time.monotonic()
+            if now >= next_expiry_check:
+                next_expiry_check = now + self.EXPIRY_CHECK_INTERVAL
+                self._close_expired(now)
+    
+    def _drain_wakeups(self) -> None:
+        try:
+            while self._wakeup_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+    
+    def _register_pending(self) -> None:
+        deadline = float("inf") if self.idle_timeout is None else time.monotonic() + self.idle_timeout
+        while self._pending:
+            client_socket, on_ready = self._pending.popleft()
+            try:
+                self.selector.register(client_socket, selectors.EVENT_READ, on_ready)
+            except (ValueError, OSError):
+                # Соединение уже закрыто
+                client_socket.close()
+                continue
+            self.deadlines[client_socket] = deadline
+    
+    def _close_expired(self, now: float) -> None:
+        expired = [client_socket for client_socket, deadline in self.deadlines.items() if deadline <= now]
+        for client_socket in expired:
+            self.selector.unregister(client_socket)
+            del self.deadlines[client_socket]
+            client_socket.close()
 
 class WorkerPool:
     """Класс для управления пулом рабочих потоков"""
     
-    def __init__(self, thread_count: int, request_handler: RequestHandler) -> None:
-        self.config = WorkerPoolConfig(thread_count)
+    def __init__(
+        self,
+        thread_count: int,
+        request_handler: RequestHandler,
+        queue_size: int = WorkerPoolConfig.queue_size
+    ) -> None:
+        self.config = WorkerPoolConfig(thread_count, queue_size=queue_size)
         self.request_handler = request_handler
-        self.queue: Queue[Optional[socket.socket]] = Queue()
+        # Очередь задач: (сокет, время постановки, продолжение постоянного
+        # соединения). Новые соединения при заполненной очереди сразу
+        # получают отказ, а не копятся в памяти; запросы уже принятых
+        # постоянных соединений ставятся в очередь всегда, иначе клиент
+        # получил бы отказ посреди кадрированного обмена
+        self.queue: Queue[Optional[Tuple[socket.socket, float, bool]]] = Queue()
+        self.idle_connections = IdleConnections(self._resume, request_handler.config.idle_timeout)
         self.threads: list[threading.Thread] = []
         self.running = False
+        self.admission_stats = AdmissionStats()
+        # Соединения, обрабатываемые в данный момент
+        self.active_sockets: set[socket.socket] = set()
+        self._active_lock = threading.Lock()
+        metrics = request_handler.metrics
+        self.queue_wait_seconds = request_handler.stage_histogram("queue_wait")
+        self.active_workers = metrics.gauge("active_workers", "Workers busy with a connection or request")
+        self.rejected_connections = metrics.counter("rejected_total", "Requests rejected because the queue was full")
     
     def start(self) -> None:
         """Запускает пул потоков"""
         self.running = True
+        self.idle_connections.start()
         for i in range(self.config.thread_count):
             thread = threading.Thread(
                 target=self._worker,
@@ -33,14 +236,61 @@ class WorkerPool:
             thread.start()
             self.threads.append(thread)
     
-    def add_task(self, client_socket: socket.socket) -> None:
-        """Добавляет задачу в очередь"""
-        if self.running:
-            self.queue.put(client_socket)
+    def add_task(self, client_socket: socket.socket) -> bool:
+        """
+        Добавляет задачу в очередь
+        
+        Returns:
+            bool: False, если очередь переполнена и соединению отказано
+        """
+        if not self.running:
+            client_socket.close()
+            return False
+        
+        if self.queue.qsize() >= self.config.queue_size:
+            self.admission_stats.record_rejected()
+            self.rejected_connections.inc()
+            # Формат ответа зависит от первого байта запроса, поэтому отказ
+            # отправляется, когда клиент начнет передавать запрос
+            self.idle_connections.add(client_socket, self._reject)
+            return False
+        
+        self.queue.put((client_socket, time.monotonic(), False))
+        self.admission_stats.record_accepted(self.queue.qsize())
+        return True
+    
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает метрики очереди и пула потоков"""
+        stats = self.admission_stats.snapshot(self.queue.qsize(), self.config.queue_size)
+        with self._active_lock:
+            stats["active"] = len(self.active_sockets)
+        stats["idle"] = self.idle_connections.count()
+        stats["threads"] = self.config.thread_count
+        return stats
     
     def stop(self) -> None:
         """Останавливает пул потоков"""
         self.running = False
+        self.idle_connections.stop()
+        
+        # Прерываем обработку запросов на открытых соединениях
+        with self._active_lock:
+            for client_socket in self.active_sockets:
+                try:
+                    client_socket.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        
+        # Закрываем соединения, так и не дождавшиеся обработки,
+        # чтобы освободить место для сигналов завершения
+        while True:
+            try:
+                task = self.queue.get_nowait()
+            except Empty:
+                break
+            if task is not None:
+                task[0].close()
+            self.queue.task_done()
         
         # Отправляем сигнал завершения всем потокам
         for _ in range(self.config.thread_count):
@@ -50,19 +300,74 @@ class WorkerPool:
         for thread in self.threads:
             thread.join()
     
+    def _resume(self, client_socket: socket.socket) -> None:
+        """Возвращает в очередь постоянное соединение, на которое пришел запрос"""
+        if not self.running:
+            client_socket.close()
+            return
+        self.queue.put((client_socket, time.monotonic(), True))
+    
+    @staticmethod
+    def _reject(client_socket: socket.socket) -> None:
+        """
+        Отправляет ответ о перегрузке и закрывает соединение
+
+        Вызывается, когда от клиента пришли данные: ответ кадрируется так
+        же, как кадрировался бы ответ на запрос.
+        """
+        framed = False
+        try:
+            client_socket.setblocking(False)
+            framed = is_framed_connection(client_socket)
+            # Непрочитанный запрос при закрытии вызвал бы RST, и клиент мог
+            # бы не получить ответ
+            while client_socket.recv(65536):
+                pass
+        except BlockingIOError:
+            pass
+        except OSError:
+            client_socket.close()
+            return
+        try:
+            client_socket.send(FRAMED_BUSY_RESPONSE if framed else BUSY_RESPONSE)
+            client_socket.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        finally:
+            client_socket.close()
+    
     def _worker(self) -> None:
         """Рабочий поток"""
         while self.running:
-            client_socket = self.queue.get()
+            task = self.queue.get()
             
-            if client_socket is None:
+            if task is None:
                 break
             
+            client_socket, enqueued_at, resumed = task
+            wait = time.monotonic() - enqueued_at
+            self.admission_stats.record_wait(wait)
+            self.queue_wait_seconds.observe(wait)
+            
+            with self._active_lock:
+                self.active_sockets.add(client_socket)
+            self.active_workers.inc()
+            keep_open = False
             try:
-                self.request_handler.handle_request(client_socket)
+                if resumed:
+                    keep_open = self.request_handler.serve_framed_requests(client_socket)
+                else:
+                    keep_open = self.request_handler.handle_request(client_socket)
             except Exception as e:
                 # Логируем ошибку, но не останавливаем поток
-                print(f"Error in worker thread: {e}")
+                logger.exception("Error in worker thread: %s", e)
             finally:
-                client_socket.close()
+                self.active_workers.dec()
+                with self._active_lock:
+                    self.active_sockets.discard(client_socket)
+                # Ожидание следующего запроса не занимает поток
+                if keep_open and self.running:
+                    self.idle_connections.add(client_socket)
+                else:
+                    client_socket.close()
                 self.queue.task_done()
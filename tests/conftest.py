@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Пакет сервера запускается из каталога src (python3 -m server.app)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,97 @@
+import json
+import socket
+import threading
+import pytest
+from server.async_server import AsyncTCPServer
+from server.handler import RequestHandler
+from server.protocol import read_message, write_message
+from server.quarantine import QuarantineManager
+from server.signature_checker import SignatureChecker
+from server.tcp_server import ServerConfig, TCPServer
+
+
+class _BlockingChecker(SignatureChecker):
+    """Проверка, которая занимает исполнителя, пока ее не отпустят"""
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def check_file_signature(self, file_path, signature_hex, options=None):
+        self.started.set()
+        self.release.wait(10)
+        return {"offsets": "not found"}
+
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def _connect(port):
+    for _ in range(100):
+        try:
+            return socket.create_connection(("127.0.0.1", port), timeout=5)
+        except ConnectionRefusedError:
+            threading.Event().wait(0.05)
+    raise AssertionError("server did not start")
+
+
+def _request(path):
+    return json.dumps({"CheckLocalFile": {"file_path": path, "signature": "00"}}).encode()
+
+
+@pytest.fixture(params=[TCPServer, AsyncTCPServer])
+def busy_server(request, tmp_path):
+    """Сервер с одним исполнителем без очереди, занятым долгой проверкой"""
+    checker = _BlockingChecker()
+    handler = RequestHandler(checker, QuarantineManager(str(tmp_path / "quarantine")))
+    port = _free_port()
+    server = request.param(ServerConfig("127.0.0.1", port, thread_count=1, queue_size=0), handler)
+    thread = threading.Thread(target=server.start, daemon=True)
+    thread.start()
+
+    target = tmp_path / "file.bin"
+    target.write_bytes(b"\0")
+    blocker = _connect(port)
+    if request.param is AsyncTCPServer:
+        # Многопоточный сервер без очереди отказывает сразу, асинхронному
+        # нужен занятый исполнитель
+        write_message(blocker, _request(str(target)))
+        assert checker.started.wait(5)
+
+    yield port, str(target)
+
+    checker.release.set()
+    blocker.close()
+    server.shutdown()
+    # Закрытие сокета из другого потока не прерывает accept - будим его соединением
+    try:
+        socket.create_connection(("127.0.0.1", port), timeout=1).close()
+    except OSError:
+        pass
+    thread.join(10)
+    assert not thread.is_alive()
+
+
+def test_framed_client_gets_framed_busy_response(busy_server):
+    port, path = busy_server
+    with _connect(port) as client:
+        write_message(client, _request(path))
+        response = json.loads(read_message(client, 1024))
+    assert response["busy"] is True
+
+
+def test_legacy_client_gets_plain_busy_response(busy_server):
+    port, path = busy_server
+    with _connect(port) as client:
+        client.sendall(_request(path))
+        data = b""
+        while True:
+            chunk = client.recv(1024)
+            if not chunk:
+                break
+            data += chunk
+    assert json.loads(data)["busy"] is True
@@ -0,0 +1,50 @@
+import pytest
+from server import signature_checker
+from server.signature_checker import MultiSignatureMatcher, ScanOptions, SignatureChecker, parse_signatures
+
+# Сигнатура 00 00 встречается в файле на каждой позиции, ff ee dd - ни разу
+SIGNATURES = {"zeros": "0000", "absent": "ffeedd", "masked": "00 ?? 00"}
+
+
+class _BoundedResults(signature_checker._SetResults):
+    """Проверяет, что число вхождений сигнатуры не превышает предел ни в какой момент"""
+
+    def add(self, signature_id, offset):
+        accepting = super().add(signature_id, offset)
+        found = self.found[signature_id]
+        assert (found if self.count_only else len(found)) <= self.limit
+        return accepting
+
+
+@pytest.fixture
+def zero_file(tmp_path):
+    path = tmp_path / "zeros.bin"
+    path.write_bytes(bytes(256 * 1024))
+    return str(path)
+
+
+@pytest.mark.parametrize("find_max", [signature_checker.FIND_SEARCH_MAX_SIGNATURES, 0])
+@pytest.mark.parametrize("params", [{"count_only": True, "max_offsets": 1}, {"max_offsets": 1}, {"first_only": True}])
+def test_multi_scan_stops_at_limit(monkeypatch, zero_file, find_max, params):
+    monkeypatch.setattr(signature_checker, "_SetResults", _BoundedResults)
+    # find_max = 0 - набор ищется автоматом Ахо-Корасик
+    monkeypatch.setattr(signature_checker, "FIND_SEARCH_MAX_SIGNATURES", find_max)
+    options = ScanOptions.from_params(params)
+    matcher = MultiSignatureMatcher(parse_signatures(SIGNATURES))
+
+    with open(zero_file, "rb") as file:
+        results = matcher.scan(file, 4096, options)
+
+    if options.count_only:
+        assert results == {"zeros": 1, "masked": 1}
+    else:
+        assert results == {"zeros": [0], "masked": [0]}
+    result = options.make_multi_result(results)
+    assert result["truncated"] is True
+    assert "absent" not in result["counts" if options.count_only else "offsets"]
+
+
+def test_multi_count_only_without_limit(zero_file):
+    checker = SignatureChecker(chunk_size=4096)
+    result = checker.check_file_signatures(zero_file, SIGNATURES, ScanOptions(count_only=True))
+    assert result == {"counts": {"zeros": 256 * 1024 - 1, "masked": 256 * 1024 - 2}}